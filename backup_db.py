@@ -0,0 +1,105 @@
+# backup_db.py
+
+"""
+Резервные копии базы бота (database/backup.py).
+
+Примеры:
+    python backup_db.py create                 # копия всех файлов базы (можно при работающем боте)
+    python backup_db.py list
+    python backup_db.py verify backups/kpg_malibu_bvb.20250129-030000.db.gz
+    python backup_db.py restore backups/kpg_malibu_bvb.20250129-030000.db.gz \\
+        database/kpg_malibu_bvb.db --force    # только при остановленном боте
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+
+from config.config import BotConfig
+from database.backup import (backup_databases, list_snapshots, restore_snapshot,
+                             verify_snapshot)
+from database.sharding import database_files
+
+
+def print_verify(snapshot: str, report: dict) -> None:
+    print(f"{snapshot}: integrity_check {report['integrity_check']}, "
+          f"user_version {report['user_version']}")
+    for table, rows in report['tables'].items():
+        print(f"  {table}: {rows} rows")
+
+
+def create(args: argparse.Namespace) -> int:
+    settings = dict(BotConfig.BACKUP, pages=args.pages, pause=args.pause)
+    for report in backup_databases(database_files(args.db, args.shards), args.dir, settings):
+        print(f"{report['path']}: {report['size'] // 1024} KB -> {report['compressed'] // 1024} KB, "
+              f"copy {report['duration']:.2f} s in {report['steps']} steps "
+              f"(longest {report['longest_step'] * 1000:.1f} ms, {report['restarts']} restarts"
+              f"{', single step' if report['single_step'] else ''}), "
+              f"gzip {report['compress_time']:.2f} s, {len(report['removed'])} old removed")
+    return 0
+
+
+def show_list(args: argparse.Namespace) -> int:
+    snapshots = list_snapshots(args.dir)
+    if not snapshots:
+        print(f"No snapshots in {args.dir}")
+    for path, stem, taken in snapshots:
+        print(f"{taken:%Y-%m-%d %H:%M:%S}  {os.path.getsize(path) // 1024:>8} KB  {path}")
+    return 0
+
+
+def verify(args: argparse.Namespace) -> int:
+    failed = 0
+    for snapshot in args.snapshots:
+        report = verify_snapshot(snapshot)
+        print_verify(snapshot, report)
+        failed += report['integrity_check'] != 'ok'
+    return 1 if failed else 0
+
+
+def restore(args: argparse.Namespace) -> int:
+    if os.path.exists(args.target) and not args.force:
+        print(f"{args.target} exists; stop the bot and pass --force to overwrite it")
+        return 1
+    try:
+        report = restore_snapshot(args.snapshot, args.target)
+    except sqlite3.DatabaseError as e:
+        print(f"Not restored: {e}")
+        return 1
+    print_verify(args.snapshot, report)
+    print(f"Restored into {args.target}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Database backups: create, list, verify, restore')
+    parser.add_argument('--dir', default=BotConfig.BACKUP['dir'], help='snapshot directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    create_parser = commands.add_parser('create', help='snapshot the database files')
+    create_parser.add_argument('--db', default=f"{BotConfig.DATABASE['path']}{BotConfig.DATABASE['name']}")
+    create_parser.add_argument('--shards', type=int, default=BotConfig.DATABASE['shards'])
+    create_parser.add_argument('--pages', type=int, default=BotConfig.BACKUP['pages'],
+                               help='pages per backup step')
+    create_parser.add_argument('--pause', type=float, default=BotConfig.BACKUP['pause'],
+                               help='seconds between steps')
+    create_parser.set_defaults(func=create)
+
+    commands.add_parser('list', help='list snapshots').set_defaults(func=show_list)
+
+    verify_parser = commands.add_parser('verify', help='integrity_check of snapshots')
+    verify_parser.add_argument('snapshots', nargs='+')
+    verify_parser.set_defaults(func=verify)
+
+    restore_parser = commands.add_parser('restore', help='restore a snapshot (bot stopped)')
+    restore_parser.add_argument('snapshot')
+    restore_parser.add_argument('target', help='database file to write')
+    restore_parser.add_argument('--force', action='store_true', help='overwrite an existing file')
+    restore_parser.set_defaults(func=restore)
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+    sys.exit(args.func(args))
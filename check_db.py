@@ -1,62 +1,247 @@
 # check_db.py
 
+"""
+Просмотр таблиц базы бота без нагрузки на работающий бот.
+
+База открывается только для чтения (URI mode=ro), строки читаются курсором
+по одной и сразу выводятся - в памяти не держится вся таблица. Вывод идёт
+страницами по --limit строк по возрастанию ID: следующая страница - с --after
+<последний ID> (keyset, без OFFSET), --all читает все страницы подряд, каждую
+отдельной короткой транзакцией чтения. Для шардированной базы (--shards)
+сессии и регистрации читаются из файлов шардов по очереди: ID шардов не
+пересекаются и растут с номером шарда.
+
+Примеры:
+    python check_db.py sessions --from 2025-01-29 --chat -1001234567890
+    python check_db.py registrations --player "Ivan Petrov" --format csv --all > ivan.csv
+    python check_db.py players --limit 100 --after 4200 --format json
+"""
+
+import argparse
+import csv
+import json
+import os
 import sqlite3
-from datetime import datetime
+import sys
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config.config import BotConfig
+from database.database import NAME_KEY_MATCH, name_key_params
+from database.encoding import decode_date, decode_datetime, decode_time, encode_date
+from database.models import STATUS_BY_CODE
+from database.sharding import database_files
+
+Column = Tuple[str, Optional[Callable[[Any], Any]]]
+
+
+def show(value, decode):
+    """Decoded value of an integer column (a database not yet converted keeps text)"""
+    return decode(value) if isinstance(value, int) else value
+
+
+def status_name(code: int) -> str:
+    return STATUS_BY_CODE[code].value
+
+
+# Колонки вывода: (имя, декодер значения из базы)
+COLUMNS: Dict[str, List[Column]] = {
+    'players': [('id', None), ('full_name', None), ('telegram_id', None),
+                ('created_at', decode_datetime), ('guest_of', None)],
+    'sessions': [('id', None), ('date', decode_date), ('time_start', decode_time),
+                 ('time_end', decode_time), ('max_players', None), ('message_id', None),
+                 ('chat_id', None)],
+    'registrations': [('id', None), ('session_id', None), ('date', decode_date),
+                      ('time_start', decode_time), ('chat_id', None), ('player_id', None),
+                      ('full_name', None), ('status', status_name),
+                      ('registration_time', decode_datetime), ('registered_by_id', None),
+                      ('registered_by_name', None)],
+}
+
+SELECTS = {
+    'players': 'SELECT p.id, p.full_name, p.telegram_id, p.created_at, p.guest_of FROM players p',
+    'sessions': 'SELECT s.* FROM sessions s',
+    'registrations': '''
+        SELECT r.id, r.session_id, s.date, s.time_start, s.chat_id, r.player_id, p.full_name,
+               r.status, r.registration_time, r.registered_by_id, r.registered_by_name
+        FROM registrations r
+        JOIN sessions s ON s.id = r.session_id
+        JOIN players p ON p.id = r.player_id
+    ''',
+}
+
+# Псевдоним таблицы, по ID которой идёт пагинация
+KEY_ALIAS = {'players': 'p', 'sessions': 's', 'registrations': 'r'}
+
+
+def connect_readonly(path: str) -> sqlite3.Connection:
+    """Соединение только для чтения: не берёт блокировку записи и не создаёт файл"""
+    return sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+
+
+def build_filters(args: argparse.Namespace) -> Tuple[List[str], List[Any]]:
+    """Условия WHERE (кроме пагинации) и их параметры"""
+    conditions, params = [], []
+    if args.table in ('sessions', 'registrations'):
+        if args.date_from:
+            conditions.append('s.date >= ?')
+            params.append(encode_date(args.date_from))
+        if args.date_to:
+            conditions.append('s.date <= ?')
+            params.append(encode_date(args.date_to))
+        if args.chat is not None:
+            conditions.append('s.chat_id = ?')
+            params.append(args.chat)
+    if args.player and args.table in ('players', 'registrations'):
+        if args.player.lstrip('-').isdigit():
+            # ID игрока или его telegram_id
+            conditions.append('(p.id = ? OR p.telegram_id = ?)')
+            params.extend([int(args.player)] * 2)
+        else:
+            conditions.append(NAME_KEY_MATCH.replace('name_key', 'p.name_key'))
+            params.extend(name_key_params(args.player))
+    return conditions, params
+
+
+def iter_page(conn: sqlite3.Connection, table: str, conditions: Sequence[str],
+              params: Sequence[Any], after: Optional[int], limit: int) -> Iterator[tuple]:
+    """Строки одной страницы по возрастанию ID, курсором без fetchall"""
+    key = f"{KEY_ALIAS[table]}.id"
+    where = list(conditions)
+    page_params = list(params)
+    if after is not None:
+        where.append(f"{key} > ?")
+        page_params.append(after)
+    sql = SELECTS[table]
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += f" ORDER BY {key} LIMIT ?"
+    yield from conn.execute(sql, (*page_params, limit))
 
-def check_database():
-    """Check database content"""
-    try:
-        # Connect to database
-        conn = sqlite3.connect('database/kpg_malibu_bvb.db')
-        cursor = conn.cursor()
-
-        # Check sessions
-        print("\nChecking sessions table:")
-        cursor.execute('SELECT * FROM sessions')
-        sessions = cursor.fetchall()
-        print(f"Found {len(sessions)} sessions:")
-        for session in sessions:
-            print(f"ID: {session[0]}")
-            print(f"Date: {session[1]}")
-            print(f"Time: {session[2]} - {session[3]}")
-            print(f"Max players: {session[4]}")
-            print(f"Message ID: {session[5]}")
-            print(f"Chat ID: {session[6]}\n")
-
-        # Check players
-        print("\nChecking players table:")
-        cursor.execute('SELECT * FROM players')
-        players = cursor.fetchall()
-        print(f"Found {len(players)} players:")
-        for player in players:
-            print(f"ID: {player[0]}")
-            print(f"Name: {player[1]}")
-            print(f"Telegram ID: {player[2]}")
-            print(f"Created at: {player[3]}\n")
-
-        # Check registrations
-        print("\nChecking registrations table:")
-        cursor.execute('''
-            SELECT r.*, p.full_name 
-            FROM registrations r 
-            JOIN players p ON r.player_id = p.id
-        ''')
-        registrations = cursor.fetchall()
-        print(f"Found {len(registrations)} registrations:")
-        for reg in registrations:
-            print(f"ID: {reg[0]}")
-            print(f"Session ID: {reg[1]}")
-            print(f"Player: {reg[4]} (ID: {reg[2]})")
-            print(f"Status: {reg[3]}")
-            print(f"Registration time: {reg[3]}\n")
 
+def iter_rows(files: List[str], args: argparse.Namespace) -> Iterator[tuple]:
+    """
+    Строки по всем файлам: страница --limit строк, с --all - все страницы.
+    Соединение открывается на каждую страницу - транзакция чтения не держится
+    между страницами (не мешает checkpoint WAL)
+    """
+    conditions, params = build_filters(args)
+    after = args.after
+    remaining = None if args.all else args.limit
+    for path in files:
+        while remaining is None or remaining > 0:
+            page = args.limit if remaining is None else min(args.limit, remaining)
+            conn = connect_readonly(path)
+            try:
+                count = 0
+                for row in iter_page(conn, args.table, conditions, params, after, page):
+                    count += 1
+                    after = row[0]
+                    yield row
+            finally:
+                conn.close()
+            if remaining is not None:
+                remaining -= count
+            if count < page:
+                break
+
+
+def decoded(table: str, row: tuple) -> Dict[str, Any]:
+    return {name: show(value, decode) if decode and value is not None else value
+            for (name, decode), value in zip(COLUMNS[table], row)}
+
+
+def write_rows(rows: Iterator[tuple], table: str, output_format: str, out) -> Tuple[int, Optional[int]]:
+    """
+    Вывод строк по мере чтения
+
+    Returns:
+        (сколько строк выведено, ID последней строки)
+    """
+    names = [name for name, _ in COLUMNS[table]]
+    writer = csv.writer(out) if output_format == 'csv' else None
+    if writer:
+        writer.writerow(names)
+    elif output_format == 'text':
+        print('\t'.join(names), file=out)
+
+    count, last_id = 0, None
+    for row in rows:
+        record = decoded(table, row)
+        if output_format == 'json':
+            print(json.dumps(record, default=str, ensure_ascii=False), file=out)
+        elif writer:
+            writer.writerow(['' if value is None else value for value in record.values()])
+        else:
+            print('\t'.join('' if value is None else str(value) for value in record.values()), file=out)
+        count += 1
+        last_id = row[0]
+    return count, last_id
+
+
+def check_database(table: str = 'sessions', date_from: Optional[date] = None,
+                   limit: int = 50, path: Optional[str] = None) -> None:
+    """Первая страница таблицы в текстовом виде (для db_maintenance.py)"""
+    args = build_parser().parse_args([table, '--limit', str(limit)] +
+                                     (['--from', date_from.isoformat()] if date_from else []) +
+                                     (['--db', path] if path else []))
+    run(args)
+
+
+def run(args: argparse.Namespace) -> int:
+    if args.table == 'players' and (args.date_from or args.date_to or args.chat is not None):
+        print("--from, --to and --chat filter sessions and registrations", file=sys.stderr)
+        return 2
+    if args.table == 'sessions' and args.player:
+        print("--player filters players and registrations", file=sys.stderr)
+        return 2
+    if args.limit <= 0:
+        print("--limit must be positive", file=sys.stderr)
+        return 2
+
+    files = database_files(args.db, args.shards)
+    if args.table != 'players' and args.shards:
+        # Сессии и регистрации - только в шардах
+        files = files[1:]
+    elif args.table == 'players':
+        files = files[:1]
+
+    missing = [path for path in files if not os.path.exists(path)]
+    if missing:
+        print(f"Database not found: {', '.join(missing)}", file=sys.stderr)
+        return 1
+
+    try:
+        count, last_id = write_rows(iter_rows(files, args), args.table, args.format, sys.stdout)
     except sqlite3.Error as e:
-        print(f"Database error: {e}")
-    except Exception as e:
-        print(f"Error: {e}")
-    finally:
-        if conn:
-            conn.close()
+        print(f"Database error: {e}", file=sys.stderr)
+        return 1
+    if not args.all and count == args.limit:
+        print(f"-- {count} rows, next page: --after {last_id}", file=sys.stderr)
+    else:
+        print(f"-- {count} rows", file=sys.stderr)
+    return 0
+
+
+def parse_date(value: str) -> date:
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Read-only, paginated view of the bot database')
+    parser.add_argument('table', choices=sorted(COLUMNS))
+    parser.add_argument('--db', default=f"{BotConfig.DATABASE['path']}{BotConfig.DATABASE['name']}")
+    parser.add_argument('--shards', type=int, default=BotConfig.DATABASE['shards'])
+    parser.add_argument('--from', dest='date_from', type=parse_date, help='session date from (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='date_to', type=parse_date, help='session date to, inclusive')
+    parser.add_argument('--chat', type=int, help='chat ID')
+    parser.add_argument('--player', help='player ID, Telegram ID or name')
+    parser.add_argument('--limit', type=int, default=50, help='rows per page')
+    parser.add_argument('--after', type=int, help='continue after this row ID')
+    parser.add_argument('--all', action='store_true', help='all pages')
+    parser.add_argument('--format', choices=('text', 'json', 'csv'), default='text')
+    return parser
+
 
 if __name__ == '__main__':
-    check_database()
+    sys.exit(run(build_parser().parse_args()))
@@ -13,10 +13,75 @@ class BotConfig:
     # Токен бота (должен быть установлен через переменную окружения)
     TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
     
+    # Адрес Bot API (по умолчанию api.telegram.org). Позволяет направить бота
+    # на локальную замену API, например loadtest/fake_bot_api.py:
+    # TELEGRAM_API_BASE_URL=http://127.0.0.1:8081/bot
+    API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL')
+    API_BASE_FILE_URL = os.getenv('TELEGRAM_API_BASE_FILE_URL')
+
+    # Получение обновлений через webhook вместо long polling. Включается заданием
+    # публичного адреса WEBHOOK_URL (например https://bot.example.com/telegram);
+    # без него или без tornado (python-telegram-bot[webhooks]) бот работает через polling.
+    WEBHOOK = {
+        'url': os.getenv('WEBHOOK_URL'),
+        'listen': os.getenv('WEBHOOK_LISTEN', '127.0.0.1'),
+        'port': int(os.getenv('WEBHOOK_PORT', '8443')),
+        'path': os.getenv('WEBHOOK_PATH'),            # по умолчанию - путь из WEBHOOK_URL
+        'secret_token': os.getenv('WEBHOOK_SECRET'),  # если не задан - генерируется при запуске
+        'max_connections': 40,
+    }
+
+    # HTTP-соединения с Bot API: отдельные пулы для getUpdates и исходящих вызовов
+    # (sendMessage, editMessageText, ...). Статистика пулов - /netstats.
+    # http_version '2' требует python-telegram-bot[http2], иначе используется 1.1.
+    HTTP = {
+        'updates': {
+            'pool_size': 1,            # одновременных соединений
+            'keepalive': 1,            # простаивающих соединений держать открытыми
+            'keepalive_expiry': 60,    # секунды
+            'connect_timeout': 5,
+            'read_timeout': 5,         # к нему добавляется timeout long polling
+            'write_timeout': 5,
+            'pool_timeout': 1,         # ожидание свободного соединения в пуле
+            'http_version': '1.1',
+        },
+        'outbound': {
+            'pool_size': 32,
+            'keepalive': 8,
+            'keepalive_expiry': 30,
+            'connect_timeout': 5,
+            'read_timeout': 5,
+            'write_timeout': 5,
+            'pool_timeout': 3,
+            'http_version': os.getenv('TELEGRAM_HTTP_VERSION', '1.1'),
+        },
+        'stats_window': 1000,  # по скольким последним запросам считать перцентили
+    }
+
+    # Очередь входящих обновлений
+    UPDATES = {
+        'queue_size': int(os.getenv('UPDATE_QUEUE_SIZE', '0')),  # 0 - без ограничения
+        'drain_timeout': 10,  # сколько секунд дообрабатывать очередь при остановке
+    }
+
+    # Несколько процессов бота с одной базой: задачи по расписанию (автопубликация)
+    # выполняет только лидер, в режиме polling getUpdates вызывает тоже только он,
+    # остальные ждут, пока аренда лидера не истечёт. В режиме webhook обновления
+    # принимают все процессы - WEBHOOK_SECRET должен быть у всех одинаковым.
+    LEADER_ELECTION = {
+        'enabled': os.getenv('LEADER_ELECTION', '').lower() in ('1', 'true', 'yes'),
+        'ttl': float(os.getenv('LEADER_TTL', '30')),                       # секунды
+        'renew_interval': float(os.getenv('LEADER_RENEW_INTERVAL', '10')),  # секунды
+    }
+
     # Настройки базы данных
     DATABASE = {
         'name': 'kpg_malibu_bvb.db',
-        'path': 'database/'
+        'path': 'database/',
+        # Шардирование по чатам: сессии и регистрации чатов раскладываются по
+        # shards файлам kpg_malibu_bvb.shardN.db (0 - одна база). Число шардов
+        # нельзя менять без переноса данных.
+        'shards': int(os.getenv('DB_SHARDS', '0')),
     }
     
     # Стандартные временные слоты для игр
@@ -30,9 +95,89 @@ class BotConfig:
         (time(12, 0), time(14, 0))   # 12:00 - 14:00
     ]
     
-    # Время автоматической публикации списка (19:00)
+    # Время автоматической публикации списка (19:00) для новых чатов.
+    # Расписание каждого чата хранится в базе (таблица chats, команда /schedule)
     AUTOPOST_TIME: time = time(19, 0)
     
+    # Слоты по умолчанию для нового чата: (начало, конец, максимум игроков).
+    # Слоты каждого чата хранятся в базе (таблица chat_slots, команда /slots)
+    DEFAULT_CHAT_SLOTS: List[Tuple[time, time, int]] = [
+        (time(14, 0), time(16, 0), 6),
+        (time(16, 0), time(18, 0), 8),
+    ]
+    
+    # Расписание сессий (utils/schedule.py): сессии создаются заранее на
+    # horizon_days дней вперёд одной транзакцией, списки публикуются в AUTOPOST_TIME чата
+    SCHEDULE = {
+        'horizon_days': 7,                # на сколько дней вперёд, начиная с завтра
+        'pregenerate_time': time(3, 0),   # ежедневное создание сессий
+        'first': 30,                      # первое создание после запуска, секунды
+        # Шаблоны по дням недели (0 - понедельник): (начало, конец) из DEFAULT_SESSIONS
+        # и ADDITIONAL_SESSIONS, например {5: DEFAULT_SESSIONS + ADDITIONAL_SESSIONS}.
+        # Шаблон дня заменяет слоты чата; без шаблона и слотов - DEFAULT_SESSIONS
+        'weekdays': {},
+        # Максимум игроков по времени начала (шаблоны, DEFAULT_SESSIONS, /create_session
+        # с временем не из слотов чата); остальные - SESSION_SETTINGS['default_max_players']
+        'capacity': {time(16, 0): 8},
+        'post_lease': 60,   # секунды: список даты публикует только один процесс
+    }
+
+    # Автопубликация по всем чатам
+    AUTOPOST = {
+        'concurrency': 10,       # сколько чатов публикуются одновременно
+        'catchup_minutes': 30,   # опубликовать пропущенное (например, после рестарта) в пределах окна
+    }
+    
+    # Личные сообщения игрокам (например, о переводе из резерва в основной состав)
+    NOTIFICATIONS = {
+        'concurrency': 5,    # сколько сообщений отправляются одновременно
+        'per_second': 20,    # не больше сообщений в секунду (лимит Telegram - около 30)
+    }
+    
+    # Периодическая проверка базы: PRAGMA quick_check и удаление строк-сирот
+    INTEGRITY = {
+        'interval': 6 * 3600,   # период, секунды
+        'first': 300,           # первая проверка после запуска, секунды
+        'batch_size': 500,      # сирот за одну транзакцию
+        'pause': 0.05,          # пауза между транзакциями, секунды
+    }
+    
+    # Обслуживание базы в тихие часы (database/maintenance.py): incremental_vacuum
+    # шагами, ANALYZE и PRAGMA optimize, checkpoint WAL
+    MAINTENANCE = {
+        'time': time(4, 30),      # ежедневный запуск
+        'vacuum_pages': 256,      # страниц за шаг incremental_vacuum
+        'pause': 0.05,            # пауза между шагами, секунды
+        'max_vacuum': 60,         # не дольше стольких секунд на освобождение страниц
+        'analysis_limit': 1000,   # строк выборки ANALYZE на индекс (0 - все строки)
+        'checkpoint': 'TRUNCATE', # режим PRAGMA wal_checkpoint
+        'busy_timeout': 5,        # ожидание блокировки базы, секунды
+    }
+    
+    # Резервные копии базы на работающем боте (database/backup.py, backup_db.py):
+    # backup API по шагам, проверка, gzip, ротация
+    BACKUP = {
+        'enabled': os.getenv('BACKUP', '1').lower() in ('1', 'true', 'yes'),
+        'dir': os.getenv('BACKUP_DIR', 'backups'),
+        'interval': 6 * 3600,   # период, секунды
+        'first': 900,           # первая копия после запуска, секунды
+        'pages': 256,           # страниц за шаг копирования (шаг - одна короткая транзакция чтения)
+        'pause': 0.02,          # пауза между шагами, секунды
+        'max_restarts': 3,      # перезапусков из-за записи в базу, затем копия одним шагом
+        'compress_level': 6,    # уровень gzip
+        'keep': 8,              # сколько последних копий хранить
+        'keep_daily': 14,       # и по последней копии за каждый из стольких дней
+    }
+    
+    # Групповой commit записей на сессии: запросы одновременных обработчиков
+    # применяются пакетом одной транзакцией (database/group_commit.py)
+    GROUP_COMMIT = {
+        'enabled': os.getenv('GROUP_COMMIT', '').lower() in ('1', 'true', 'yes'),
+        'max_batch': 64,      # максимум записей в одной транзакции
+        'max_delay': 0.005,   # ожидание следующих записей после первой, секунды
+        'concurrent_updates': 64,  # сколько обновлений обрабатывать одновременно
+    }
+    
     # Настройки игровых сессий
     SESSION_SETTINGS = {
         'default_max_players': 6,  # Стандартное максимальное количество игроков
@@ -40,6 +185,49 @@ class BotConfig:
         'allow_multiple_sessions': False,  # Разрешать ли запись на несколько сессий
     }
     
+    # Запись входящих обновлений для воспроизведения нагрузки (loadtest/replay.py)
+    WORKLOAD_CAPTURE = {
+        'enabled': os.getenv('WORKLOAD_CAPTURE', '').lower() in ('1', 'true', 'yes'),
+        'path': 'logs/workload.jsonl',
+    }
+    
+    # Сторож event loop: фиксирует блокировки loop дольше порога (/stalls)
+    LOOP_WATCHDOG = {
+        'enabled': os.getenv('LOOP_WATCHDOG', '').lower() in ('1', 'true', 'yes'),
+        'threshold': 0.1,   # секунды
+        'interval': 0.05,   # период контрольного таймера, секунды
+        'keep_worst': 20,   # сколько самых долгих блокировок хранить
+    }
+    
+    # Профилирование по команде /profile (результаты пишутся в output_dir)
+    PROFILER = {
+        'output_dir': 'logs',
+        'interval': 0.01,         # период сэмплирования стеков, секунды
+        'default_duration': 30,   # секунды
+        'max_duration': 300,      # секунды
+        'top_n': 15,              # строк в сводке
+        'tracemalloc_frames': 10, # глубина трасс tracemalloc
+    }
+
+    # Выгрузка посещений по команде /export (utils/export.py): строки пишутся во
+    # временный файл пачками в рабочем потоке, файл отправляется документом
+    EXPORT = {
+        'batch_size': 500,              # строк за одно чтение из базы
+        'default_days': 30,             # период без дат в команде: последние N дней
+        'compress_level': 6,            # уровень gzip для /export ... gz
+        'max_size': 50 * 1024 * 1024,   # лимит Bot API на отправку файла, байт
+        'dir': None,                    # каталог временных файлов (None - системный)
+    }
+    
+    # Раскладка списка сессий (utils/board.py): сессии даты делятся на несколько
+    # сообщений, если полные составы не поместятся в одно
+    BOARD_LAYOUT = {
+        'message_limit': 4096,   # лимит Telegram на текст сообщения после разбора HTML
+        'buttons_per_row': 4,    # кнопок записи в одном ряду клавиатуры
+        'entry_length': 32,      # оценка длины строки игрока при раскладке, символов
+        'reserve_share': 0.5,    # оценка резерва при раскладке, доля от max_players
+    }
+
     # Форматирование сообщений
     FORMAT_SETTINGS = {
         'date_format': '%d %B, %A',  # Например: "29 January, Wednesday"
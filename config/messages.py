@@ -59,13 +59,21 @@ class Messages:
         'help': """Available commands:
 /join time - Join session (e.g., /join 14:00)
 /leave time - Leave session
-/sessions - Show today's sessions
+/sessions [week] - Show today's (or this week's) sessions
+/my - Show your upcoming sign-ups
 
 Admin commands:
 /create_session time_range max_players - Create new session
 /add_players time player1, player2 - Add multiple players
 /remove_player time player_name - Remove player
 /toggle_bot [on|off] - Enable/disable bot
+/schedule [on|off|HH:MM] - Autopost schedule of this chat
+/slots [14:00-16:00=6 ...] - Default sessions of this chat
+/capacity time max_players - Change max players of tomorrow's session
 /stats [player_name] - Show statistics
+/export [from] [to] [gz] - Attendance CSV (dates YYYY-MM-DD)
+/stalls [reset] - Show event loop stalls
+/profile [cpu seconds|mem start|snap|stop] - Profile the running bot
+/netstats [reset] - Show Bot API connection pool statistics
 """,
     }
@@ -1,4 +1,9 @@
 # database/__init__.py
 
 from .database import Database
-from .models import Player, Session, Registration, PlayerStatus
+from .sharding import ShardedDatabase, open_database
+from .group_commit import GroupCommitWriter
+from .registration_index import RegistrationIndex
+from .roster_cache import RosterCache
+from .models import (Player, Session, Registration, PlayerStatus, Chat, ChatSlot,
+                     JoinOutcome, JoinRequest)
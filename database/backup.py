@@ -0,0 +1,262 @@
+# database/backup.py
+
+"""
+Резервные копии базы на работающем боте.
+
+Копия снимается через SQLite backup API (sqlite3.Connection.backup) по pages
+страниц за шаг с паузой между шагами: каждый шаг - короткая транзакция чтения,
+и запись обработчиков ждёт (в режиме rollback journal) не дольше одного шага.
+Если базу между шагами меняет другое соединение, SQLite начинает копию заново;
+после max_restarts перезапусков копия снимается одним шагом (в режиме WAL
+чтение одним шагом запись не блокирует).
+
+Копия проверяется (PRAGMA quick_check), сжимается gzip и сохраняется как
+<имя базы>.<ГГГГММДД-ЧЧММСС>.db.gz; старые копии удаляются по политике хранения.
+"""
+
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+STAMP_FORMAT = '%Y%m%d-%H%M%S'
+SNAPSHOT_NAME = re.compile(r'^(?P<stem>.+)\.(?P<stamp>\d{8}-\d{6})\.db\.gz$')
+
+
+class _Restarted(Exception):
+    """Копию слишком часто начинали заново из-за записи в базу"""
+
+
+def copy_database(source: str, target: str, pages: int = 256, pause: float = 0.02,
+                  max_restarts: int = 3) -> Dict[str, Any]:
+    """
+    Копия базы source в файл target через backup API по шагам
+
+    Returns:
+        dict: duration, steps, longest_step (самая долгая транзакция чтения, секунды),
+              restarts, single_step (копия снята одним шагом), pages
+    """
+    report = {'steps': 0, 'longest_step': 0.0, 'restarts': 0, 'single_step': False, 'pages': 0}
+    started = time.perf_counter()
+    src = sqlite3.connect(f"file:{os.path.abspath(source)}?mode=ro", uri=True)
+    try:
+        mark = time.perf_counter()
+        last_remaining = None
+
+        def progress(status: int, remaining: int, total: int) -> None:
+            nonlocal mark, last_remaining
+            report['steps'] += 1
+            report['longest_step'] = max(report['longest_step'], time.perf_counter() - mark)
+            report['pages'] = total
+            # Перезапуск копирует заново первые страницы: шаг без продвижения (занятая
+            # база - SQLITE_BUSY/SQLITE_LOCKED - перезапуском не считается)
+            if status == sqlite3.SQLITE_OK and last_remaining is not None and remaining >= last_remaining:
+                report['restarts'] += 1
+                if report['restarts'] > max_restarts:
+                    raise _Restarted()
+            last_remaining = remaining
+            if remaining:
+                time.sleep(pause)
+            mark = time.perf_counter()
+
+        try:
+            _backup(src, target, pages, progress)
+        except _Restarted:
+            # База меняется чаще, чем успевает копироваться - одним шагом
+            report['single_step'] = True
+            mark = time.perf_counter()
+            _backup(src, target, -1, progress)
+    finally:
+        src.close()
+    report['duration'] = time.perf_counter() - started
+    return report
+
+
+def _backup(src: sqlite3.Connection, target: str, pages: int, progress) -> None:
+    if os.path.exists(target):
+        os.remove(target)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst, pages=pages, progress=progress)
+    finally:
+        dst.close()
+
+
+def quick_check(path: str) -> List[str]:
+    """PRAGMA quick_check файла базы: пустой список, если ошибок нет"""
+    conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    try:
+        problems = [row[0] for row in conn.execute('PRAGMA quick_check').fetchall()]
+    finally:
+        conn.close()
+    return [] if problems == ['ok'] else problems
+
+
+def snapshot_stem(db_path: str) -> str:
+    """Имя копий файла базы: kpg_malibu_bvb.db -> kpg_malibu_bvb"""
+    name = os.path.basename(db_path)
+    return name[:-3] if name.endswith('.db') else name
+
+
+def create_snapshot(db_path: str, backup_dir: str, pages: int = 256, pause: float = 0.02,
+                    max_restarts: int = 3, compress_level: int = 6,
+                    now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Сжатая проверенная копия файла базы в backup_dir
+
+    Returns:
+        dict: отчёт copy_database, а также path, size (байт базы), compressed (байт
+              копии), compress_time (секунды)
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    name = f"{snapshot_stem(db_path)}.{(now or datetime.now()).strftime(STAMP_FORMAT)}.db.gz"
+    path = os.path.join(backup_dir, name)
+    copy_path = os.path.join(backup_dir, f".{name[:-3]}.tmp")
+    partial_path = f"{path}.tmp"
+    try:
+        report = copy_database(db_path, copy_path, pages, pause, max_restarts)
+        problems = quick_check(copy_path)
+        if problems:
+            raise sqlite3.DatabaseError(f"Backup of {db_path} failed quick_check: {problems[:5]}")
+
+        started = time.perf_counter()
+        with open(copy_path, 'rb') as src, \
+                gzip.open(partial_path, 'wb', compresslevel=compress_level) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(partial_path, path)
+        report.update(path=path, size=os.path.getsize(copy_path),
+                      compressed=os.path.getsize(path),
+                      compress_time=time.perf_counter() - started)
+        return report
+    finally:
+        for leftover in (copy_path, partial_path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+
+def list_snapshots(backup_dir: str, stem: Optional[str] = None) -> List[Tuple[str, str, datetime]]:
+    """
+    Копии в backup_dir (только базы stem, если задано)
+
+    Returns:
+        List[Tuple[str, str, datetime]]: (путь, имя базы, время) от старых к новым
+    """
+    if not os.path.isdir(backup_dir):
+        return []
+    snapshots = []
+    for name in os.listdir(backup_dir):
+        match = SNAPSHOT_NAME.match(name)
+        if match and (stem is None or match['stem'] == stem):
+            snapshots.append((os.path.join(backup_dir, name), match['stem'],
+                              datetime.strptime(match['stamp'], STAMP_FORMAT)))
+    return sorted(snapshots, key=lambda snapshot: (snapshot[1], snapshot[2]))
+
+
+def rotate_snapshots(backup_dir: str, stem: str, keep: int, keep_daily: int,
+                     now: Optional[datetime] = None) -> List[str]:
+    """
+    Удаление старых копий базы stem: остаются keep последних и последняя
+    копия каждого из keep_daily последних дней
+
+    Returns:
+        List[str]: удалённые файлы
+    """
+    snapshots = list_snapshots(backup_dir, stem)
+    first_day = (now or datetime.now()).date() - timedelta(days=keep_daily - 1)
+    kept = {path for path, _, _ in snapshots[-keep:]} if keep > 0 else set()
+    last_of_day: Dict[Any, str] = {}
+    for path, _, taken in snapshots:
+        if taken.date() >= first_day:
+            last_of_day[taken.date()] = path
+    kept.update(last_of_day.values())
+
+    removed = []
+    for path, _, _ in snapshots:
+        if path not in kept:
+            os.remove(path)
+            removed.append(path)
+    return removed
+
+
+def backup_databases(files: List[str], backup_dir: str, settings: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Копии всех файлов базы с одной отметкой времени и ротация (настройки BACKUP).
+    Файлы шардов копируются по очереди - это не общий снимок на один момент.
+
+    Returns:
+        List[dict]: отчёты create_snapshot с ключом removed (удалённые старые копии)
+    """
+    now = datetime.now()
+    reports = []
+    for db_path in files:
+        report = create_snapshot(db_path, backup_dir, settings['pages'], settings['pause'],
+                                 settings['max_restarts'], settings['compress_level'], now)
+        report['removed'] = rotate_snapshots(backup_dir, snapshot_stem(db_path),
+                                             settings['keep'], settings['keep_daily'], now)
+        reports.append(report)
+    return reports
+
+
+def _unpack(snapshot: str, directory: str) -> str:
+    path = os.path.join(directory, os.path.basename(snapshot)[:-3])
+    with gzip.open(snapshot, 'rb') as src, open(path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    return path
+
+
+def verify_snapshot(snapshot: str) -> Dict[str, Any]:
+    """
+    Проверка копии: распаковка, PRAGMA integrity_check и число строк таблиц
+
+    Returns:
+        dict: integrity_check ('ok' или список ошибок), user_version, tables (имя -> строк)
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            path = _unpack(snapshot, directory)
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                problems = [row[0] for row in conn.execute('PRAGMA integrity_check').fetchall()]
+                tables = [row[0] for row in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+                )]
+                return {
+                    'integrity_check': 'ok' if problems == ['ok'] else problems,
+                    'user_version': conn.execute('PRAGMA user_version').fetchone()[0],
+                    'tables': {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+                               for table in tables},
+                }
+            finally:
+                conn.close()
+        except (sqlite3.DatabaseError, OSError, EOFError) as e:
+            # Не gzip, обрезанный файл или не база SQLite
+            return {'integrity_check': [str(e)], 'user_version': None, 'tables': {}}
+
+
+def restore_snapshot(snapshot: str, target: str) -> Dict[str, Any]:
+    """
+    Восстановление копии в файл базы target (бот должен быть остановлен).
+    Копия проверяется до записи; запись идёт через backup API, так что файлы
+    -wal и -shm target остаются согласованными.
+
+    Returns:
+        dict: отчёт verify_snapshot
+    """
+    report = verify_snapshot(snapshot)
+    if report['integrity_check'] != 'ok':
+        raise sqlite3.DatabaseError(f"Snapshot {snapshot} failed integrity_check: "
+                                    f"{report['integrity_check'][:5]}")
+    with tempfile.TemporaryDirectory() as directory:
+        src = sqlite3.connect(_unpack(snapshot, directory))
+        dst = sqlite3.connect(target)
+        try:
+            src.backup(dst)
+        finally:
+            src.close()
+            dst.close()
+    return report
@@ -1,16 +1,25 @@
 # database/database.py
 
 import sqlite3
+import threading
+import time as time_module
 from datetime import datetime, date, time
-from typing import List, Optional, Tuple, Dict
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 import logging
 import os
+from contextlib import contextmanager
 from dataclasses import asdict
 
 try:
-    from .models import Player, Session, Registration, PlayerStatus
+    from .models import (Player, Session, Registration, PlayerStatus, Chat, ChatSlot,
+                         JoinOutcome, JoinRequest, STATUS_CODES)
+    from .encoding import (encode_date, encode_datetime, encode_time, parse_time,
+                           decode_date, legacy_date, legacy_datetime, legacy_time)
 except ImportError:
-    from models import Player, Session, Registration, PlayerStatus
+    from models import (Player, Session, Registration, PlayerStatus, Chat, ChatSlot,
+                        JoinOutcome, JoinRequest, STATUS_CODES)
+    from encoding import (encode_date, encode_datetime, encode_time, parse_time,
+                          decode_date, legacy_date, legacy_datetime, legacy_time)
 
 class BotConfig:
     """Основной класс конфигурации бота."""
@@ -24,6 +33,178 @@ class BotConfig:
         'path': 'database/'  # Путь относительно корня проекта
     }
 
+# Состав сессии: (игрок, регистрация) в порядке регистрации
+Roster = List[Tuple[Player, Registration]]
+
+# Колонки players в порядке полей Player
+PLAYER_COLUMNS = 'id, full_name, telegram_id, created_at, guest_of, name_key'
+
+
+def normalize_player_name(name: str) -> str:
+    """Ключ имени для сравнения: без лишних пробелов и регистра"""
+    return ' '.join(name.split()).casefold()
+
+
+# Игроки с именем: ключ "имя" или "имя#ID" (однофамильцы-гости одного записавшего)
+NAME_KEY_MATCH = "(name_key = ? OR (name_key > ? AND name_key < ?))"
+
+
+def name_key_params(name: str) -> Tuple[str, str, str]:
+    """Параметры для NAME_KEY_MATCH"""
+    key = normalize_player_name(name)
+    return key, f"{key}#", f"{key}$"
+
+
+# Версия формата данных (PRAGMA user_version):
+#   1 - даты, время и статус хранятся целыми числами (database/encoding.py)
+SCHEMA_VERSION = 1
+
+# PRAGMA auto_vacuum: 2 - INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Таблицы, которые пересоздаются миграциями; {name} - имя создаваемой таблицы
+PLAYERS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        full_name TEXT NOT NULL,
+        telegram_id INTEGER UNIQUE,
+        created_at INTEGER,
+        guest_of INTEGER,
+        name_key TEXT
+    )
+'''
+
+SESSIONS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date INTEGER NOT NULL,
+        time_start INTEGER NOT NULL,
+        time_end INTEGER NOT NULL,
+        max_players INTEGER NOT NULL,
+        message_id INTEGER,
+        chat_id INTEGER
+    )
+'''
+
+# registered_by_id хранит telegram_id записавшего, поэтому внешнего ключа у него нет
+REGISTRATIONS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        player_id INTEGER NOT NULL,
+        status INTEGER NOT NULL,
+        registration_time INTEGER,
+        registered_by_id INTEGER,
+        registered_by_name TEXT,
+        FOREIGN KEY (session_id) REFERENCES sessions (id) ON DELETE CASCADE,
+        FOREIGN KEY (player_id) REFERENCES players (id) ON DELETE CASCADE
+    )
+'''
+
+CHAT_SLOTS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL,
+        time_start TIME NOT NULL,
+        time_end TIME NOT NULL,
+        max_players INTEGER NOT NULL,
+        FOREIGN KEY (chat_id) REFERENCES chats (chat_id) ON DELETE CASCADE,
+        UNIQUE (chat_id, time_start)
+    )
+'''
+
+# Счётчик изменений сессий и составов по (чат, дата): триггеры увеличивают его при
+# любом изменении сессии или регистрации, в том числе из другого процесса
+# (get_range_version, кэш RosterCache)
+BOARD_VERSIONS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS board_versions (
+        chat_id INTEGER NOT NULL,
+        date INTEGER NOT NULL,
+        version INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, date)
+    ) WITHOUT ROWID
+'''
+
+_BUMP_BOARD = '''
+        INSERT INTO board_versions (chat_id, date, version)
+        SELECT chat_id, date, 1 FROM sessions WHERE id = {row}.session_id AND chat_id IS NOT NULL
+        ON CONFLICT (chat_id, date) DO UPDATE SET version = version + 1;
+'''
+
+_BUMP_SESSION = '''
+        INSERT INTO board_versions (chat_id, date, version)
+        SELECT {row}.chat_id, {row}.date, 1 WHERE {row}.chat_id IS NOT NULL
+        ON CONFLICT (chat_id, date) DO UPDATE SET version = version + 1;
+'''
+
+# Триггеры пересоздаваемых таблиц удаляются вместе с таблицей - create_tables
+# создаёт их после миграций
+BOARD_VERSION_TRIGGERS = {
+    'trg_board_registration_insert': ('AFTER INSERT ON registrations', _BUMP_BOARD.format(row='NEW')),
+    'trg_board_registration_update': ('AFTER UPDATE ON registrations', _BUMP_BOARD.format(row='NEW')),
+    # При удалении сессии каскадом её строки уже нет - счётчик увеличит триггер сессии
+    'trg_board_registration_delete': ('AFTER DELETE ON registrations', _BUMP_BOARD.format(row='OLD')),
+    'trg_board_session_insert': ('AFTER INSERT ON sessions', _BUMP_SESSION.format(row='NEW')),
+    'trg_board_session_update': ('AFTER UPDATE ON sessions',
+                                 _BUMP_SESSION.format(row='OLD') + _BUMP_SESSION.format(row='NEW')),
+    'trg_board_session_delete': ('AFTER DELETE ON sessions', _BUMP_SESSION.format(row='OLD')),
+}
+
+# Строки-сироты: (таблица, запрос ID с параметром LIMIT)
+ORPHAN_QUERIES = {
+    'registrations_without_session': ('registrations', '''
+        SELECT r.id FROM registrations r
+        LEFT JOIN sessions s ON s.id = r.session_id
+        WHERE s.id IS NULL LIMIT ?
+    '''),
+    'registrations_without_player': ('registrations', '''
+        SELECT r.id FROM registrations r
+        LEFT JOIN players p ON p.id = r.player_id
+        WHERE p.id IS NULL LIMIT ?
+    '''),
+    'slots_without_chat': ('chat_slots', '''
+        SELECT cs.id FROM chat_slots cs
+        LEFT JOIN chats c ON c.chat_id = cs.chat_id
+        WHERE c.chat_id IS NULL LIMIT ?
+    '''),
+}
+
+
+# Фабрики строк (cursor.row_factory): модели строятся прямо из строки выборки,
+# значения колонок декодируются при первом чтении поля
+
+def player_row(cursor: sqlite3.Cursor, row: tuple) -> Player:
+    """Колонки PLAYER_COLUMNS"""
+    return Player(*row)
+
+
+def session_row(cursor: sqlite3.Cursor, row: tuple) -> Session:
+    """Все колонки sessions"""
+    return Session(*row)
+
+
+def roster_row(cursor: sqlite3.Cursor, row: tuple) -> Tuple[Player, Registration]:
+    """p.id, p.full_name, p.telegram_id, p.created_at, r.*"""
+    return Player(*row[:4]), Registration(*row[4:])
+
+
+def session_registration_row(cursor: sqlite3.Cursor, row: tuple) -> Tuple[Session, Registration]:
+    """s.*, r.*"""
+    return Session(*row[:7]), Registration(*row[7:])
+
+
+def board_row(cursor: sqlite3.Cursor, row: tuple) -> Tuple[Session, Optional[Tuple[Player, Registration]]]:
+    """s.*, p.id, p.full_name, p.telegram_id, p.created_at, r.* (LEFT JOIN: без регистрации - None)"""
+    if row[11] is None:
+        return Session(*row[:7]), None
+    return Session(*row[:7]), (Player(*row[7:11]), Registration(*row[11:]))
+
+
+def attendance_row(cursor: sqlite3.Cursor, row: tuple) -> Tuple[Session, Player, Registration]:
+    """s.*, p.id, p.full_name, p.telegram_id, p.created_at, r.*"""
+    return Session(*row[:7]), Player(*row[7:11]), Registration(*row[11:])
+
+
 class Database:
     """Класс для работы с базой данных"""
     
@@ -36,172 +217,539 @@ class Database:
         """
         self.db_path = db_path
         self.logger = logging.getLogger('kpg_malibu_bvb')
+        self._version_conn: Optional[sqlite3.Connection] = None
+        self._version_lock = threading.Lock()
         self.create_tables()
     
+    def _connect(self, **kwargs) -> sqlite3.Connection:
+        """Соединение с базой с проверкой внешних ключей (удаление каскадом)"""
+        conn = sqlite3.connect(self.db_path, **kwargs)
+        conn.execute('PRAGMA foreign_keys = ON')
+        return conn
+
     def create_tables(self) -> None:
         """Создание необходимых таблиц в базе данных"""
+        # Без проверки внешних ключей: миграции пересоздают таблицы
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             
             # Таблица игроков
+            cursor.execute(PLAYERS_SCHEMA.format(name='players'))
+            
+            # Таблица сессий
+            cursor.execute(SESSIONS_SCHEMA.format(name='sessions'))
+            
+            # Таблица регистраций с новыми полями
+            cursor.execute(REGISTRATIONS_SCHEMA.format(name='registrations'))
+            
+            # Таблица настроек
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS players (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    full_name TEXT NOT NULL,
-                    telegram_id INTEGER UNIQUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                CREATE TABLE IF NOT EXISTS settings (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
                 )
             ''')
             
-            # Таблица сессий
+            # Чаты и их расписание автопубликации
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS sessions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    date DATE NOT NULL,
-                    time_start TIME NOT NULL,
-                    time_end TIME NOT NULL,
-                    max_players INTEGER NOT NULL,
-                    message_id INTEGER,
-                    chat_id INTEGER
+                CREATE TABLE IF NOT EXISTS chats (
+                    chat_id INTEGER PRIMARY KEY,
+                    title TEXT,
+                    autopost_time TIME NOT NULL,
+                    autopost_enabled INTEGER NOT NULL DEFAULT 1,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
             
-            # Таблица регистраций с новыми полями
+            # Слоты по умолчанию для каждого чата
+            cursor.execute(CHAT_SLOTS_SCHEMA.format(name='chat_slots'))
+            
+            # Аренда ролей между процессами бота (лидер для задач по расписанию)
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS registrations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id INTEGER NOT NULL,
-                    player_id INTEGER NOT NULL,
-                    status TEXT NOT NULL,
-                    registration_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    registered_by_id INTEGER,
-                    registered_by_name TEXT,
-                    FOREIGN KEY (session_id) REFERENCES sessions (id),
-                    FOREIGN KEY (player_id) REFERENCES players (id),
-                    FOREIGN KEY (registered_by_id) REFERENCES players (id)
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    holder TEXT NOT NULL,
+                    expires_at REAL NOT NULL
                 )
             ''')
             
-            # Таблица настроек
+            # Все запросы к сессиям идут по (chat_id, date); уникальность ключа
+            # не даёт двум процессам создать одну и ту же сессию дважды
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS settings (
-                    key TEXT PRIMARY KEY,
-                    value TEXT NOT NULL
-                )
+                SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_sessions_chat_date_start'
+            ''')
+            if not cursor.fetchone():
+                self._merge_duplicate_sessions(cursor)
+                cursor.execute('DROP INDEX IF EXISTS idx_sessions_chat_date')
+                cursor.execute('''
+                    CREATE UNIQUE INDEX idx_sessions_chat_date_start
+                    ON sessions (chat_id, date, time_start)
+                ''')
+            
+            # Удаление сессий, игроков и чатов удаляет их регистрации и слоты
+            self._add_cascades(cursor)
+            
+            # Даты, время и статус - целыми числами вместо текста
+            cursor.execute('PRAGMA user_version')
+            if cursor.fetchone()[0] < SCHEMA_VERSION:
+                self._encode_columns(conn)
+            
+            # Регистрации пользователя (get_user_registrations) без просмотра всей таблицы
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_registrations_player
+                ON registrations (player_id, session_id)
+            ''')
+            
+            # Составы сессий в порядке регистрации (списки, /export) без просмотра
+            # всей таблицы на каждую сессию и без сортировки
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_registrations_session
+                ON registrations (session_id, registration_time)
             ''')
             
+            # Один игрок-гость на записавшего и имя
+            cursor.execute('''
+                SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_players_guest'
+            ''')
+            if not cursor.fetchone():
+                self._migrate_guest_players(cursor)
+            
+            # Счётчики изменений дат чатов для кэша списков сессий
+            cursor.execute(BOARD_VERSIONS_SCHEMA)
+            for name, (event, body) in BOARD_VERSION_TRIGGERS.items():
+                cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END')
+            
             conn.commit()
+            
+            # WAL: чтение не блокирует запись, когда с базой работают несколько процессов
+            # (режим меняется только вне транзакции)
+            cursor.execute('PRAGMA journal_mode=WAL').fetchone()
+            
+            # Свободные страницы возвращаются файловой системе по частям
+            # (PRAGMA incremental_vacuum, database/maintenance.py)
+            if cursor.execute('PRAGMA auto_vacuum').fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+                self._enable_incremental_vacuum(conn)
+
+    def _enable_incremental_vacuum(self, conn: sqlite3.Connection) -> None:
+        """
+        auto_vacuum = INCREMENTAL. У базы с таблицами режим меняется только
+        полным VACUUM (один раз; база заблокирована на время перестройки)
+        """
+        started = time_module.perf_counter()
+        conn.execute(f'PRAGMA auto_vacuum = {AUTO_VACUUM_INCREMENTAL}')
+        try:
+            conn.execute('VACUUM')
+        except sqlite3.OperationalError as e:
+            # Базу держит другой процесс - попробуем при следующем запуске
+            self.logger.warning(f"auto_vacuum not enabled for {self.db_path}: {e}")
+            return
+        self.logger.info(f"Enabled incremental auto_vacuum for {self.db_path} "
+                         f"in {time_module.perf_counter() - started:.2f} s")
 
-    def add_player(self, full_name: str, telegram_id: Optional[int] = None) -> Player:
+    def _merge_duplicate_sessions(self, cursor: sqlite3.Cursor) -> None:
         """
-        Добавление нового игрока или получение существующего
+        Слияние сессий с одинаковыми (chat_id, date, time_start): остаётся
+        сессия с меньшим ID, регистрации дубликатов переносятся в неё
+        """
+        cursor.execute('''
+            SELECT chat_id, date, time_start, MIN(id) FROM sessions
+            GROUP BY chat_id, date, time_start
+            HAVING COUNT(*) > 1
+        ''')
+        for chat_id, session_date, time_start, keep_id in cursor.fetchall():
+            cursor.execute('''
+                SELECT id FROM sessions
+                WHERE chat_id IS ? AND date = ? AND time_start = ? AND id != ?
+            ''', (chat_id, session_date, time_start, keep_id))
+            duplicates = [row[0] for row in cursor.fetchall()]
+            placeholders = ','.join('?' * len(duplicates))
+            cursor.execute(f'UPDATE registrations SET session_id = ? WHERE session_id IN ({placeholders})',
+                           (keep_id, *duplicates))
+            cursor.execute(f'DELETE FROM sessions WHERE id IN ({placeholders})', duplicates)
+            self.logger.warning(f"Merged duplicate sessions {duplicates} into {keep_id} "
+                                f"(chat {chat_id}, {session_date} {time_start})")
+
+    def _migrate_guest_players(self, cursor: sqlite3.Cursor) -> None:
+        """
+        Одноразовая миграция игроков-гостей (без telegram_id): нормализованное
+        имя, записавший их пользователь и слияние дубликатов. Раньше каждая
+        запись гостя "Ivan" создавала нового игрока.
+        """
+        cursor.execute('PRAGMA table_info(players)')
+        columns = {row[1] for row in cursor.fetchall()}
+        if 'guest_of' not in columns:
+            cursor.execute('ALTER TABLE players ADD COLUMN guest_of INTEGER')
+        if 'name_key' not in columns:
+            cursor.execute('ALTER TABLE players ADD COLUMN name_key TEXT')
+
+        cursor.execute('SELECT id, full_name FROM players WHERE name_key IS NULL')
+        cursor.executemany('UPDATE players SET name_key = ? WHERE id = ?',
+                           [(normalize_player_name(name), player_id)
+                            for player_id, name in cursor.fetchall()])
+
+        # Гость принадлежит тому, кто записал его первым (0 - неизвестно)
+        cursor.execute('''
+            UPDATE players SET guest_of = COALESCE((
+                SELECT r.registered_by_id FROM registrations r
+                WHERE r.player_id = players.id AND r.registered_by_id IS NOT NULL
+                ORDER BY r.registration_time LIMIT 1
+            ), 0)
+            WHERE telegram_id IS NULL AND guest_of IS NULL
+        ''')
+
+        cursor.execute('''
+            SELECT p.id, p.guest_of, p.name_key, GROUP_CONCAT(r.session_id)
+            FROM players p
+            LEFT JOIN registrations r ON r.player_id = p.id
+            WHERE p.telegram_id IS NULL
+            GROUP BY p.id
+            ORDER BY p.id
+        ''')
+        # Для каждого (записавший, имя) - список разных людей: гости с одним
+        # именем, побывавшие в одной сессии, - разные люди, второй и следующие
+        # получают ключ "имя#ID"
+        people: Dict[Tuple[int, str], List[Tuple[int, Set[str]]]] = {}
+        merged = 0
+        for player_id, guest_of, name_key, session_ids in cursor.fetchall():
+            sessions = set(session_ids.split(',')) if session_ids else set()
+            slots = people.setdefault((guest_of, name_key), [])
+            target = next((slot for slot in slots if not slot[1] & sessions), None)
+            if target is None:
+                if slots:
+                    cursor.execute('UPDATE players SET name_key = ? WHERE id = ?',
+                                   (f"{name_key}#{player_id}", player_id))
+                slots.append((player_id, sessions))
+                continue
+            keep_id, keep_sessions = target
+            cursor.execute('UPDATE registrations SET player_id = ? WHERE player_id = ?',
+                           (keep_id, player_id))
+            cursor.execute('DELETE FROM players WHERE id = ?', (player_id,))
+            keep_sessions |= sessions
+            merged += 1
+        if merged:
+            self.logger.warning(f"Merged {merged} duplicate guest players")
+
+        cursor.execute('''
+            CREATE UNIQUE INDEX idx_players_guest
+            ON players (guest_of, name_key) WHERE telegram_id IS NULL
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_players_name_key ON players (name_key)')
+
+    def _add_cascades(self, cursor: sqlite3.Cursor) -> None:
+        """
+        Пересоздание registrations и chat_slots с ON DELETE CASCADE: внешние
+        ключи в SQLite меняются только пересозданием таблицы. Сироты, которые
+        не пройдут проверку ключей, удаляются до копирования.
+        """
+        for table, schema, orphans in (
+            ('registrations', REGISTRATIONS_SCHEMA,
+             ('registrations_without_session', 'registrations_without_player')),
+            ('chat_slots', CHAT_SLOTS_SCHEMA, ('slots_without_chat',)),
+        ):
+            cursor.execute(f'PRAGMA foreign_key_list({table})')
+            keys = cursor.fetchall()
+            if keys and all(key[6] == 'CASCADE' for key in keys) \
+                    and 'registered_by_id' not in {key[3] for key in keys}:
+                continue
+
+            removed = 0
+            for name in orphans:
+                _, query = ORPHAN_QUERIES[name]
+                cursor.execute(f'DELETE FROM {table} WHERE id IN ({query})', (-1,))
+                removed += cursor.rowcount
+
+            self._rebuild_table(cursor, table, schema)
+            self.logger.warning(f"Rebuilt {table} with ON DELETE CASCADE, removed {removed} orphan rows")
+
+    def _rebuild_table(self, cursor: sqlite3.Cursor, table: str, schema: str,
+                       convert: Optional[Dict[str, str]] = None) -> None:
+        """
+        Пересоздание таблицы по schema с копированием строк по именам колонок
+        (convert - SQL-функция, через которую копируется значение колонки).
+        Индексы таблицы и счётчик AUTOINCREMENT сохраняются.
+        """
+        convert = convert or {}
+        cursor.execute(f'PRAGMA table_info({table})')
+        names = [row[1] for row in cursor.fetchall()]
+        columns = ', '.join(names)
+        values = ', '.join(f'{convert[name]}({name})' if name in convert else name
+                           for name in names)
+        cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,))
+        sequence = cursor.fetchone()
+        cursor.execute('''
+            SELECT sql FROM sqlite_master
+            WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL
+        ''', (table,))
+        indexes = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(schema.format(name=f'{table}_new'))
+        cursor.execute(f'INSERT INTO {table}_new ({columns}) SELECT {values} FROM {table}')
+        cursor.execute(f'DROP TABLE {table}')
+        cursor.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+        for sql in indexes:
+            cursor.execute(sql)
+        # Диапазон ID шарда (reserve_id_range) должен сохраниться
+        if sequence:
+            cursor.execute('DELETE FROM sqlite_sequence WHERE name = ?', (table,))
+            cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)',
+                           (table, sequence[0]))
+
+    def _encode_columns(self, conn: sqlite3.Connection) -> None:
+        """
+        Миграция на версию 1: registration_time и created_at - микросекунды от
+        1970-01-01, sessions.date - дни, time_start/time_end - минуты от полуночи,
+        status - код STATUS_CODES. Таблицы пересоздаются с колонками INTEGER:
+        у прежних TEXT/TIMESTAMP другое сродство типов.
+        """
+        # Второй процесс ждёт окончания миграции первого и не повторяет её
+        conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+            return
+
+        conn.create_function('legacy_datetime', 1, legacy_datetime, deterministic=True)
+        conn.create_function('legacy_date', 1, legacy_date, deterministic=True)
+        conn.create_function('legacy_time', 1, legacy_time, deterministic=True)
+        conn.create_function('legacy_status', 1, lambda value: STATUS_CODES[PlayerStatus(value)]
+                             if isinstance(value, str) else value, deterministic=True)
+
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM registrations')
+        rows = cursor.fetchone()[0]
+        for table, schema, convert in (
+            ('players', PLAYERS_SCHEMA, {'created_at': 'legacy_datetime'}),
+            ('sessions', SESSIONS_SCHEMA, {'date': 'legacy_date', 'time_start': 'legacy_time',
+                                           'time_end': 'legacy_time'}),
+            ('registrations', REGISTRATIONS_SCHEMA, {'status': 'legacy_status',
+                                                     'registration_time': 'legacy_datetime'}),
+        ):
+            self._rebuild_table(cursor, table, schema, convert)
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        if rows:
+            self.logger.warning(f"Converted dates, times and statuses to integers ({rows} registrations)")
+
+    def check_integrity(self, batch_size: int = 500, pause: float = 0.05) -> dict:
+        """
+        Проверка базы (PRAGMA quick_check) и удаление строк-сирот.
+        Сироты удаляются пачками по batch_size, каждая пачка - отдельная короткая
+        транзакция, между пачками пауза: запись обработчиков не ждёт всю проверку.
+        
+        Returns:
+            dict: quick_check ('ok' или список ошибок), orphans (сколько удалено по видам)
+        """
+        with self._connect() as conn:
+            problems = [row[0] for row in conn.execute('PRAGMA quick_check').fetchall()]
+
+        orphans = {}
+        for name, (table, query) in ORPHAN_QUERIES.items():
+            removed = 0
+            while True:
+                with self._immediate_transaction('check_integrity') as cursor:
+                    cursor.execute(f'DELETE FROM {table} WHERE id IN ({query})', (batch_size,))
+                    deleted = cursor.rowcount
+                removed += deleted
+                if deleted < batch_size:
+                    break
+                time_module.sleep(pause)
+            orphans[name] = removed
+
+        return {
+            'quick_check': 'ok' if problems == ['ok'] else problems,
+            'orphans': orphans,
+        }
+
+    def add_player(self, full_name: str, telegram_id: Optional[int] = None,
+                   guest_of: Optional[int] = None) -> Player:
+        """
+        Добавление нового игрока или получение существующего.
+        Гость (без telegram_id) один на записавшего его пользователя и
+        нормализованное имя: повторная запись "Ivan" возвращает того же игрока.
         
         Args:
             full_name: полное имя игрока
             telegram_id: ID пользователя в Telegram (опционально)
+            guest_of: telegram_id пользователя, записавшего гостя
             
         Returns:
             Player: объект игрока
         """
-        with sqlite3.connect(self.db_path) as conn:
+        name_key = normalize_player_name(full_name)
+        with self._connect() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = player_row
             
-            if telegram_id:
-                # Проверяем, существует ли игрок
-                cursor.execute(
-                    'SELECT * FROM players WHERE telegram_id = ?',
-                    (telegram_id,)
-                )
-                player = cursor.fetchone()
-                
-                if player:
-                    return Player(
-                        id=player[0],
-                        full_name=player[1],
-                        telegram_id=player[2],
-                        created_at=datetime.fromisoformat(player[3])
-                    )
+            if not telegram_id:
+                now = datetime.now()
+                cursor.execute('''
+                    INSERT OR IGNORE INTO players (full_name, telegram_id, created_at, guest_of, name_key)
+                    VALUES (?, NULL, ?, ?, ?)
+                ''', (full_name, encode_datetime(now), guest_of or 0, name_key))
+                cursor.execute(f'''
+                    SELECT {PLAYER_COLUMNS} FROM players
+                    WHERE telegram_id IS NULL AND guest_of = ? AND name_key = ?
+                ''', (guest_of or 0, name_key))
+                return cursor.fetchone()
+            
+            # Проверяем, существует ли игрок
+            cursor.execute(
+                f'SELECT {PLAYER_COLUMNS} FROM players WHERE telegram_id = ?',
+                (telegram_id,)
+            )
+            player = cursor.fetchone()
+            
+            if player:
+                return player
             
             # Создаем нового игрока
             now = datetime.now()
             cursor.execute(
-                'INSERT INTO players (full_name, telegram_id, created_at) VALUES (?, ?, ?)',
-                (full_name, telegram_id, now.isoformat())
+                'INSERT INTO players (full_name, telegram_id, created_at, name_key) VALUES (?, ?, ?, ?)',
+                (full_name, telegram_id, encode_datetime(now), name_key)
             )
             
             return Player(
                 id=cursor.lastrowid,
                 full_name=full_name,
                 telegram_id=telegram_id,
-                created_at=now
+                created_at=now,
+                name_key=name_key
             )
 
+    def get_player(self, player_id: int) -> Optional[Player]:
+        """Получение игрока по ID"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = player_row
+            cursor.execute(f'SELECT {PLAYER_COLUMNS} FROM players WHERE id = ?', (player_id,))
+            return cursor.fetchone()
+
+    def replicate_player(self, player: Player) -> None:
+        """
+        Копия игрока с тем же ID (для шардов, где хранятся его регистрации).
+        Ключ имени копируется как есть: у однофамильца-гостя он "имя#ID", и
+        пересчитанный ключ совпал бы с ключом другого гостя того же записавшего
+        (idx_players_guest)
+        """
+        name_key = player.name_key or normalize_player_name(player.full_name)
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT OR IGNORE INTO players (id, full_name, telegram_id, created_at, guest_of, name_key) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (player.id, player.full_name, player.telegram_id, encode_datetime(player.created_at),
+                 player.guest_of, name_key)
+            )
+            conn.commit()
+
+    def reserve_id_range(self, start: int) -> None:
+        """
+        Новые ID сессий и регистраций выдаются начиная с start
+        (у каждого шарда свой диапазон)
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            for table in ('sessions', 'registrations'):
+                cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,))
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)',
+                                   (table, start))
+                elif row[0] < start:
+                    cursor.execute('UPDATE sqlite_sequence SET seq = ? WHERE name = ?',
+                                   (start, table))
+            conn.commit()
+
     def get_session(self, session_id: int) -> Optional[Session]:
         """Получение сессии по ID"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = session_row
             cursor.execute('SELECT * FROM sessions WHERE id = ?', (session_id,))
-            
-            session = cursor.fetchone()
-            if not session:
-                return None
-                
-            return Session(
-                id=session[0],
-                date=datetime.strptime(session[1], '%Y-%m-%d').date(),
-                time_start=datetime.strptime(session[2], '%H:%M').time(),
-                time_end=datetime.strptime(session[3], '%H:%M').time(),
-                max_players=session[4],
-                message_id=session[5],
-                chat_id=session[6]
-            )
+            return cursor.fetchone()
 
-    def create_session(self, date: date, time_start: time,
+    def create_session(self, chat_id: int, date: date, time_start: time,
                       time_end: time, max_players: int) -> Session:
-        """Создание новой игровой сессии"""
-        with sqlite3.connect(self.db_path) as conn:
+        """Создание новой игровой сессии в чате (или получение уже созданной)"""
+        return self.get_or_create_session(chat_id, date, time_start, time_end, max_players)[0]
+
+    def get_or_create_session(self, chat_id: int, date: date, time_start: time,
+                              time_end: time, max_players: int) -> Tuple[Session, bool]:
+        """
+        Создание сессии, если в чате ещё нет сессии с такими датой и временем начала
+        
+        Returns:
+            Tuple[Session, bool]: сессия и признак того, что она создана этим вызовом
+        """
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                INSERT INTO sessions (date, time_start, time_end, max_players)
-                VALUES (?, ?, ?, ?)
-            ''', (date.isoformat(), time_start.strftime('%H:%M'), 
-                 time_end.strftime('%H:%M'), max_players))
+                INSERT OR IGNORE INTO sessions (date, time_start, time_end, max_players, chat_id)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (encode_date(date), encode_time(time_start),
+                 encode_time(time_end), max_players, chat_id))
             
-            return Session(
-                id=cursor.lastrowid,
-                date=date,
-                time_start=time_start,
-                time_end=time_end,
-                max_players=max_players
-            )
+            if cursor.rowcount:
+                return Session(
+                    id=cursor.lastrowid,
+                    date=date,
+                    time_start=time_start,
+                    time_end=time_end,
+                    max_players=max_players,
+                    chat_id=chat_id
+                ), True
+        
+        # Сессию уже создал другой процесс или предыдущий вызов
+        return self.get_session_by_time(chat_id, date, time_start.strftime('%H:%M')), False
 
-    def get_session_by_time(self, date: date, time_str: str) -> Optional[Session]:
-        """Получение сессии по дате и времени начала"""
-        with sqlite3.connect(self.db_path) as conn:
+    def sync_sessions(self, chat_ids: Iterable[int], first_day: date, last_day: date,
+                      sessions: List[Tuple[int, date, time, time, int]]) -> Tuple[int, int]:
+        """
+        Сессии чатов chat_ids с first_day по last_day приводятся к списку sessions
+        (chat_id, дата, начало, конец, максимум игроков) одной транзакцией:
+        недостающие создаются, а неопубликованные сессии без регистраций, которых
+        в списке нет (старые слоты, другой конец или максимум игроков), удаляются.
+        Опубликованные сессии и сессии с записями не меняются.
+        
+        Returns:
+            (сколько сессий создано, сколько удалено)
+        """
+        # Порядок сохраняется: ID новых сессий растут по порядку sessions
+        wanted = dict.fromkeys((chat_id, encode_date(day), encode_time(start), encode_time(end), max_players)
+                               for chat_id, day, start, end, max_players in sessions)
+        with self._immediate_transaction('sync_sessions') as cursor:
+            stale = []
+            for chat_id in set(chat_ids):
+                cursor.execute('''
+                    SELECT id, chat_id, date, time_start, time_end, max_players FROM sessions s
+                    WHERE chat_id = ? AND date BETWEEN ? AND ? AND message_id IS NULL
+                      AND NOT EXISTS (SELECT 1 FROM registrations r WHERE r.session_id = s.id)
+                ''', (chat_id, encode_date(first_day), encode_date(last_day)))
+                stale.extend((row[0],) for row in cursor.fetchall() if row[1:] not in wanted)
+            cursor.executemany('DELETE FROM sessions WHERE id = ?', stale)
+            if not wanted:
+                return 0, len(stale)
+            cursor.executemany('''
+                INSERT OR IGNORE INTO sessions (date, time_start, time_end, max_players, chat_id)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(day, start, end, max_players, chat_id)
+                  for chat_id, day, start, end, max_players in wanted])
+            return cursor.rowcount, len(stale)
+
+    def get_session_by_time(self, chat_id: int, date: date, time_str: str) -> Optional[Session]:
+        """Получение сессии чата по дате и времени начала"""
+        with self._connect() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = session_row
             cursor.execute('''
                 SELECT * FROM sessions 
-                WHERE date = ? AND time_start = ?
-            ''', (date.isoformat(), time_str))
-            
-            session = cursor.fetchone()
-            if not session:
-                return None
-                
-            return Session(
-                id=session[0],
-                date=datetime.strptime(session[1], '%Y-%m-%d').date(),
-                time_start=datetime.strptime(session[2], '%H:%M').time(),
-                time_end=datetime.strptime(session[3], '%H:%M').time(),
-                max_players=session[4],
-                message_id=session[5],
-                chat_id=session[6]
-            )
+                WHERE chat_id = ? AND date = ? AND time_start = ?
+            ''', (chat_id, encode_date(date), parse_time(time_str)))
+            return cursor.fetchone()
 
     def update_session_message(self, session_id: int, message_id: int, 
                              chat_id: int) -> None:
         """Обновление ID сообщения для сессии"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 UPDATE sessions 
@@ -214,7 +762,7 @@ class Database:
                        registered_by_id: Optional[int] = None, 
                        registered_by_name: Optional[str] = None) -> Registration:
         """Регистрация игрока на сессию"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             try:
                 cursor = conn.cursor()
                 now = datetime.now()
@@ -235,7 +783,7 @@ class Database:
                         SET status = ?, registration_time = ?, 
                             registered_by_id = ?, registered_by_name = ?
                         WHERE id = ?
-                    ''', (status.value, now.isoformat(), registered_by_id, 
+                    ''', (STATUS_CODES[status], encode_datetime(now), registered_by_id,
                           registered_by_name, existing[0]))
                     registration_id = existing[0]
                 else:
@@ -245,7 +793,7 @@ class Database:
                         (session_id, player_id, status, registration_time, 
                          registered_by_id, registered_by_name)
                         VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (session_id, player_id, status.value, now.isoformat(),
+                    ''', (session_id, player_id, STATUS_CODES[status], encode_datetime(now),
                           registered_by_id, registered_by_name))
                     registration_id = cursor.lastrowid
 
@@ -267,75 +815,115 @@ class Database:
                 conn.rollback()
                 raise
 
-    def get_session_players(self, session_id: int) -> List[Tuple[Player, Registration]]:
-        """Получение списка игроков для сессии"""
-        with sqlite3.connect(self.db_path) as conn:
+    @contextmanager
+    def _immediate_transaction(self, operation: str):
+        """
+        Транзакция с блокировкой записи с самого начала (BEGIN IMMEDIATE):
+        проверки и изменения видят одно и то же состояние, даже если в базу
+        пишут другие процессы
+        """
+        conn = self._connect(isolation_level=None)
+        try:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT p.*, r.* 
-                FROM players p
-                JOIN registrations r ON p.id = r.player_id
-                WHERE r.session_id = ? AND r.status = ?
-                ORDER BY r.registration_time
-            ''', (session_id, PlayerStatus.MAIN.value))
+            cursor.execute('BEGIN IMMEDIATE')
+            yield cursor
+            cursor.execute('COMMIT')
+        except sqlite3.Error as e:
+            self.logger.error(f"Database error in {operation}: {e}")
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def apply_joins(self, requests: List[JoinRequest]) -> List[JoinOutcome]:
+        """
+        Запись игроков на сессии одной транзакцией (один commit на весь пакет).
+        Запросы применяются по порядку: каждый видит места, занятые предыдущими.
+        
+        Args:
+            requests: запросы в порядке поступления
             
+        Returns:
+            List[JoinOutcome]: результат для каждого запроса
+        """
+        with self._immediate_transaction('apply_joins') as cursor:
+            sessions: Dict[int, Optional[tuple]] = {}
             results = []
-            for row in cursor.fetchall():
-                player = Player(
-                    id=row[0],
-                    full_name=row[1],
-                    telegram_id=row[2],
-                    created_at=datetime.fromisoformat(row[3])
-                )
-                registration = Registration(
-                    id=row[4],
-                    session_id=row[5],
-                    player_id=row[6],
-                    status=PlayerStatus(row[7]),
-                    registration_time=datetime.fromisoformat(row[8]),
-                    registered_by_id=row[9] if row[9] is not None else None,
-                    registered_by_name=row[10]
-                )
-                results.append((player, registration))
-            
-            return results
+            for request in requests:
+                if request.session_id not in sessions:
+                    cursor.execute('SELECT chat_id, date, max_players FROM sessions WHERE id = ?',
+                                   (request.session_id,))
+                    sessions[request.session_id] = cursor.fetchone()
+                session = sessions[request.session_id]
+                if session is None:
+                    results.append(JoinOutcome.INVALID_SESSION)
+                    continue
+                chat_id, session_date, max_players = session
 
-    def get_session_reserve(self, session_id: int) -> List[Tuple[Player, Registration]]:
-        """Получение списка резерва для сессии"""
-        with sqlite3.connect(self.db_path) as conn:
+                # Уже записан на эту сессию или (если так настроено) на другую в этот день
+                if request.one_session_per_day:
+                    cursor.execute('''
+                        SELECT r.session_id FROM registrations r
+                        JOIN sessions s ON s.id = r.session_id
+                        WHERE r.player_id = ? AND s.chat_id IS ? AND s.date = ?
+                    ''', (request.player_id, chat_id, session_date))
+                else:
+                    cursor.execute('''
+                        SELECT session_id FROM registrations
+                        WHERE player_id = ? AND session_id = ?
+                    ''', (request.player_id, request.session_id))
+                registered = {row[0] for row in cursor.fetchall()}
+                if request.session_id in registered:
+                    results.append(JoinOutcome.DUPLICATE)
+                    continue
+                if registered:
+                    results.append(JoinOutcome.OTHER_SESSION)
+                    continue
+
+                cursor.execute('''
+                    SELECT COUNT(*) FROM registrations
+                    WHERE session_id = ? AND status = ?
+                ''', (request.session_id, STATUS_CODES[PlayerStatus.MAIN]))
+                status = PlayerStatus.MAIN if cursor.fetchone()[0] < max_players \
+                    else PlayerStatus.RESERVE
+                cursor.execute('''
+                    INSERT INTO registrations 
+                    (session_id, player_id, status, registration_time, 
+                     registered_by_id, registered_by_name)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (request.session_id, request.player_id, STATUS_CODES[status],
+                      encode_datetime(request.requested_at), request.registered_by_id,
+                      request.registered_by_name))
+                results.append(JoinOutcome(status.value))
+
+        return results
+
+    def _roster(self, session_id: int, status: PlayerStatus) -> List[Tuple[Player, Registration]]:
+        """Игроки сессии с данным статусом в порядке регистрации"""
+        with self._connect() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = roster_row
             cursor.execute('''
-                SELECT p.*, r.* 
+                SELECT p.id, p.full_name, p.telegram_id, p.created_at, r.*
                 FROM players p
                 JOIN registrations r ON p.id = r.player_id
                 WHERE r.session_id = ? AND r.status = ?
                 ORDER BY r.registration_time
-            ''', (session_id, PlayerStatus.RESERVE.value))
-            
-            results = []
-            for row in cursor.fetchall():
-                player = Player(
-                    id=row[0],
-                    full_name=row[1],
-                    telegram_id=row[2],
-                    created_at=datetime.fromisoformat(row[3])
-                )
-                registration = Registration(
-                    id=row[4],
-                    session_id=row[5],
-                    player_id=row[6],
-                    status=PlayerStatus(row[7]),
-                    registration_time=datetime.fromisoformat(row[8]),
-                    registered_by_id=row[9] if row[9] is not None else None,
-                    registered_by_name=row[10]
-                )
-                results.append((player, registration))
-            
-            return results
+            ''', (session_id, STATUS_CODES[status]))
+            return cursor.fetchall()
+
+    def get_session_players(self, session_id: int) -> List[Tuple[Player, Registration]]:
+        """Получение списка игроков для сессии"""
+        return self._roster(session_id, PlayerStatus.MAIN)
+
+    def get_session_reserve(self, session_id: int) -> List[Tuple[Player, Registration]]:
+        """Получение списка резерва для сессии"""
+        return self._roster(session_id, PlayerStatus.RESERVE)
 
     def is_player_registered(self, session_id: int, telegram_id: int) -> bool:
         """Проверка, зарегистрирован ли игрок на сессию"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             self.logger.info(f"Checking registration for session {session_id}, user {telegram_id}")
             
@@ -354,170 +942,480 @@ class Database:
                 
             return result is not None
 
-    def unregister_player(self, session_id: int, telegram_id: int) -> None:
-        """Отмена регистрации игрока"""
-        with sqlite3.connect(self.db_path) as conn:
-            try:
-                cursor = conn.cursor()
-                self.logger.info(f"Unregistering player with telegram_id {telegram_id} from session {session_id}")
-                
-                # Получаем игрока по telegram_id
-                cursor.execute('''
-                    SELECT id FROM players WHERE telegram_id = ?
-                ''', (telegram_id,))
-                
-                player_row = cursor.fetchone()
-                if not player_row:
-                    self.logger.error(f"Player with telegram_id {telegram_id} not found")
-                    return
-                    
-                player_id = player_row[0]
-                self.logger.info(f"Found player with id {player_id}")
-                
-                # Проверяем регистрацию
-                cursor.execute('''
-                    SELECT id, status FROM registrations 
-                    WHERE session_id = ? AND player_id = ?
-                ''', (session_id, player_id))
-                
-                registration = cursor.fetchone()
-                if not registration:
-                    self.logger.error(f"Registration not found for player {player_id} in session {session_id}")
-                    return
-                    
-                # Удаляем регистрацию
-                cursor.execute('''
-                    DELETE FROM registrations
-                    WHERE id = ?
-                ''', (registration[0],))
-                
-                deleted_count = cursor.rowcount
-                self.logger.info(f"Deleted {deleted_count} registration(s)")
-                conn.commit()
-                
-            except sqlite3.Error as e:
-                self.logger.error(f"Database error in unregister_player: {e}")
-                conn.rollback()
-                raise
-
-    def move_reserve_to_main(self, session_id: int) -> Optional[Player]:
-        """Перемещение первого игрока из резерва в основной состав"""
-        with sqlite3.connect(self.db_path) as conn:
+    def get_user_registrations(self, telegram_id: int, date: date,
+                               until: Optional[date] = None) -> List[Tuple[Session, Registration]]:
+        """
+        Регистрации пользователя на сессии за дату (или с date по until включительно)
+        одним запросом по индексу idx_registrations_player
+        
+        Returns:
+            List[Tuple[Session, Registration]]: по дате и времени начала
+        """
+        with self._connect() as conn:
             cursor = conn.cursor()
-            
-            # Сначала проверим количество игроков в основном составе
+            cursor.row_factory = session_registration_row
             cursor.execute('''
-                SELECT COUNT(*)
-                FROM registrations r
-                WHERE r.session_id = ? AND r.status = ?
-            ''', (session_id, PlayerStatus.MAIN.value))
-            
-            main_count = cursor.fetchone()[0]
-            
-            # Получим информацию о сессии для проверки максимального количества
-            cursor.execute('SELECT max_players FROM sessions WHERE id = ?', (session_id,))
-            max_players = cursor.fetchone()[0]
-            
-            if main_count >= max_players:
-                self.logger.info(f"Main list is full ({main_count}/{max_players})")
-                return None
-                
-            # Получаем первого игрока из резерва
-            cursor.execute('''
-                SELECT p.*, r.id as reg_id
+                SELECT s.*, r.*
                 FROM players p
-                JOIN registrations r ON p.id = r.player_id
-                WHERE r.session_id = ? AND r.status = ?
-                ORDER BY r.registration_time
-                LIMIT 1
-            ''', (session_id, PlayerStatus.RESERVE.value))
-            
-            result = cursor.fetchone()
-            if not result:
-                return None
-                    
-            player = Player(
-                id=result[0],
-                full_name=result[1],
-                telegram_id=result[2],
-                created_at=datetime.fromisoformat(result[3])
-            )
-            
-            # Обновляем статус
-            cursor.execute('''
-                UPDATE registrations
-                SET status = ?
-                WHERE id = ?
-            ''', (PlayerStatus.MAIN.value, result[4]))
-            
-            conn.commit()
-            return player
+                JOIN registrations r ON r.player_id = p.id
+                JOIN sessions s ON s.id = r.session_id
+                WHERE p.telegram_id = ? AND s.date BETWEEN ? AND ?
+                ORDER BY s.date, s.time_start
+            ''', (telegram_id, encode_date(date), encode_date(until or date)))
+            return cursor.fetchall()
 
-    def remove_player_by_name(self, session_id: int, player_name: str) -> bool:
-        """Удаление игрока по имени"""
-        with sqlite3.connect(self.db_path) as conn:
+    def get_registrations_by_user(self, date: date) -> Dict[int, List[Tuple[Session, Registration]]]:
+        """
+        Все регистрации пользователей Telegram на сессии даты, по telegram_id
+        (для RegistrationIndex)
+        """
+        with self._connect() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = lambda cursor, row: (row[0], session_registration_row(cursor, row[1:]))
+            cursor.execute('''
+                SELECT p.telegram_id, s.*, r.*
+                FROM sessions s
+                JOIN registrations r ON r.session_id = s.id
+                JOIN players p ON p.id = r.player_id
+                WHERE s.date = ? AND p.telegram_id IS NOT NULL
+                ORDER BY s.time_start
+            ''', (encode_date(date),))
+            rows = cursor.fetchall()
+
+        by_user: Dict[int, List[Tuple[Session, Registration]]] = {}
+        for telegram_id, item in rows:
+            by_user.setdefault(telegram_id, []).append(item)
+        return by_user
+
+    def data_version(self) -> int:
+        """
+        Счётчик изменений базы (PRAGMA data_version): меняется после каждого
+        commit другого соединения, в том числе из другого процесса. Все запросы
+        открывают свои соединения, поэтому виден любой commit.
+        """
+        with self._version_lock:
+            if self._version_conn is None:
+                self._version_conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            return self._version_conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def unregister_player(self, session_id: int, telegram_id: int) -> List[Player]:
+        """
+        Отмена регистрации игрока
+
+        Returns:
+            List[Player]: игроки, переведённые из резерва на освободившееся место
+        """
+        self.logger.info(f"Unregistering player with telegram_id {telegram_id} from session {session_id}")
+        with self._immediate_transaction('unregister_player') as cursor:
             cursor.execute('''
                 DELETE FROM registrations
                 WHERE session_id = ? AND player_id IN (
-                    SELECT id FROM players WHERE full_name = ?
+                    SELECT id FROM players WHERE telegram_id = ?
                 )
-            ''', (session_id, player_name))
-            
-            return cursor.rowcount > 0
+            ''', (session_id, telegram_id))
+            if cursor.rowcount == 0:
+                self.logger.error(f"Registration not found for telegram_id {telegram_id} in session {session_id}")
+                return []
+            return self._promote_reserve(cursor, session_id)
 
-    def get_sessions_for_date(self, date: date) -> List[Session]:
-        """Get all sessions for specific date"""
-        with sqlite3.connect(self.db_path) as conn:
+    def _promote_reserve(self, cursor: sqlite3.Cursor, session_id: int) -> List[Player]:
+        """
+        Перевод игроков из резерва на свободные места основного состава в порядке
+        регистрации. Вызывается внутри транзакции удаления или изменения состава.
+        """
+        cursor.execute('''
+            SELECT s.max_players - (
+                SELECT COUNT(*) FROM registrations
+                WHERE session_id = s.id AND status = ?
+            )
+            FROM sessions s WHERE s.id = ?
+        ''', (STATUS_CODES[PlayerStatus.MAIN], session_id))
+        row = cursor.fetchone()
+        if not row or row[0] <= 0:
+            return []
+
+        cursor.execute('''
+            SELECT r.id, p.id, p.full_name, p.telegram_id, p.created_at
+            FROM registrations r
+            JOIN players p ON p.id = r.player_id
+            WHERE r.session_id = ? AND r.status = ?
+            ORDER BY r.registration_time, r.id
+            LIMIT ?
+        ''', (session_id, STATUS_CODES[PlayerStatus.RESERVE], row[0]))
+        rows = cursor.fetchall()
+        if not rows:
+            return []
+
+        cursor.executemany('UPDATE registrations SET status = ? WHERE id = ?',
+                           [(STATUS_CODES[PlayerStatus.MAIN], r[0]) for r in rows])
+        promoted = [Player(id=r[1], full_name=r[2], telegram_id=r[3], created_at=r[4])
+                    for r in rows]
+        self.logger.info(f"Promoted {len(promoted)} player(s) from reserve in session {session_id}")
+        return promoted
+
+    def promote_reserve(self, session_id: int) -> List[Player]:
+        """
+        Заполнить свободные места основного состава игроками из резерва
+
+        Returns:
+            List[Player]: переведённые игроки в порядке регистрации
+        """
+        with self._immediate_transaction('promote_reserve') as cursor:
+            return self._promote_reserve(cursor, session_id)
+
+    def set_session_capacity(self, session_id: int, max_players: int) -> List[Player]:
+        """
+        Изменение максимального количества игроков сессии. При увеличении
+        игроки из резерва занимают новые места в той же транзакции.
+
+        Returns:
+            List[Player]: игроки, переведённые из резерва
+        """
+        with self._immediate_transaction('set_session_capacity') as cursor:
+            cursor.execute('UPDATE sessions SET max_players = ? WHERE id = ?',
+                           (max_players, session_id))
+            if cursor.rowcount == 0:
+                return []
+            return self._promote_reserve(cursor, session_id)
+
+    def remove_player_by_name(self, session_id: int, player_name: str) -> Tuple[bool, List[Player]]:
+        """
+        Удаление игрока по имени
+
+        Returns:
+            (удалён ли игрок, игроки, переведённые из резерва)
+        """
+        with self._immediate_transaction('remove_player_by_name') as cursor:
+            cursor.execute(f'''
+                DELETE FROM registrations
+                WHERE session_id = ? AND player_id IN (
+                    SELECT id FROM players WHERE {NAME_KEY_MATCH}
+                )
+            ''', (session_id, *name_key_params(player_name)))
+            if cursor.rowcount == 0:
+                return False, []
+            return True, self._promote_reserve(cursor, session_id)
+
+    def get_sessions_for_date(self, chat_id: int, date: date) -> List[Session]:
+        """Get all sessions of the chat for specific date"""
+        with self._connect() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = session_row
             cursor.execute('''
                 SELECT * FROM sessions 
-                WHERE date = ?
+                WHERE chat_id = ? AND date = ?
                 ORDER BY time_start
-            ''', (date.isoformat(),))
-            
-            sessions = []
-            for row in cursor.fetchall():
-                session = Session(
-                    id=row[0],
-                    date=datetime.strptime(row[1], '%Y-%m-%d').date(),
-                    time_start=datetime.strptime(row[2], '%H:%M').time(),
-                    time_end=datetime.strptime(row[3], '%H:%M').time(),
-                    max_players=row[4],
-                    message_id=row[5],
-                    chat_id=row[6]
-                )
+            ''', (chat_id, encode_date(date)))
+            return cursor.fetchall()
+
+    def get_sessions_in_range(self, start: date, end: date,
+                              chat_id: Optional[int] = None) -> List[Session]:
+        """
+        Сессии с start по end включительно (только чата chat_id, если задан)
+        
+        Returns:
+            List[Session]: по дате, чату и времени начала
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = session_row
+            cursor.execute(f'''
+                SELECT * FROM sessions
+                WHERE date BETWEEN ? AND ?{' AND chat_id = ?' if chat_id is not None else ''}
+                ORDER BY date, chat_id, time_start
+            ''', (encode_date(start), encode_date(end),
+                  *((chat_id,) if chat_id is not None else ())))
+            return cursor.fetchall()
+
+    def get_boards_in_range(self, chat_id: int, start: date,
+                            end: date) -> Tuple[List[Session], Dict[int, Tuple[Roster, Roster]]]:
+        """
+        Сессии чата с start по end включительно вместе с составами - одним запросом
+        
+        Returns:
+            (сессии по дате и времени начала,
+             session_id -> (основной состав, резерв) в порядке регистрации)
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = board_row
+            cursor.execute('''
+                SELECT s.*, p.id, p.full_name, p.telegram_id, p.created_at, r.*
+                FROM sessions s
+                LEFT JOIN registrations r ON r.session_id = s.id
+                LEFT JOIN players p ON p.id = r.player_id
+                WHERE s.chat_id = ? AND s.date BETWEEN ? AND ?
+                ORDER BY s.date, s.time_start, r.registration_time, r.id
+            ''', (chat_id, encode_date(start), encode_date(end)))
+            rows = cursor.fetchall()
+
+        sessions: List[Session] = []
+        rosters: Dict[int, Tuple[Roster, Roster]] = {}
+        for session, entry in rows:
+            roster = rosters.get(session.id)
+            if roster is None:
                 sessions.append(session)
-            
-            return sessions
+                roster = rosters[session.id] = ([], [])
+            if entry is not None:
+                roster[entry[1].status is PlayerStatus.RESERVE].append(entry)
+        return sessions, rosters
 
-    def has_sessions_for_date(self, date: date) -> bool:
+    def get_range_version(self, chat_id: int, start: date, end: date) -> int:
+        """
+        Версия сессий и составов чата с start по end: растёт при каждом их изменении
+        (триггеры BOARD_VERSION_TRIGGERS) и не меняется от изменений других дат и чатов
         """
-        Check if sessions list already exists for given date
+        with self._connect() as conn:
+            return conn.execute('''
+                SELECT COALESCE(SUM(version), 0) FROM board_versions
+                WHERE chat_id = ? AND date BETWEEN ? AND ?
+            ''', (chat_id, encode_date(start), encode_date(end))).fetchone()[0]
+
+    def iter_attendance(self, chat_id: int, start: date, end: date,
+                        batch_size: int = 500) -> Iterator[List[Tuple[Session, Player, Registration]]]:
+        """
+        Регистрации на сессии чата с start по end включительно - пачками по batch_size
+        строк (fetchmany), без загрузки всей истории в память. Все пачки читаются
+        одной транзакцией чтения (согласованный срез; в режиме WAL запись не ждёт).
+        Генератор нужно дочитать или закрыть в том же потоке.
+
+        Yields:
+            List[Tuple[Session, Player, Registration]]: по дате, времени начала сессии
+            и времени регистрации
+        """
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.row_factory = attendance_row
+            cursor.execute('''
+                SELECT s.*, p.id, p.full_name, p.telegram_id, p.created_at, r.*
+                FROM sessions s
+                JOIN registrations r ON r.session_id = s.id
+                JOIN players p ON p.id = r.player_id
+                WHERE s.chat_id = ? AND s.date BETWEEN ? AND ?
+                ORDER BY s.date, s.time_start, r.registration_time, r.id
+            ''', (chat_id, encode_date(start), encode_date(end)))
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield batch
+        finally:
+            conn.close()
+
+    def has_sessions_for_date(self, chat_id: int, date: date, posted: bool = False) -> bool:
+        """
+        Check if sessions list already exists in the chat for given date
         
         Args:
+            chat_id: chat to check
             date: date to check
+            posted: count only sessions already posted to the chat (message_id set)
             
         Returns:
             bool: True if sessions exist, False otherwise
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
-            self.logger.info(f"Checking for sessions on date: {date.isoformat()}")
+            self.logger.info(f"Checking for sessions in chat {chat_id} on date: {date.isoformat()}")
             
-            cursor.execute('''
+            cursor.execute(f'''
                 SELECT COUNT(*) 
                 FROM sessions 
-                WHERE date = ?
-            ''', (date.isoformat(),))
+                WHERE chat_id = ? AND date = ?{' AND message_id IS NOT NULL' if posted else ''}
+            ''', (chat_id, encode_date(date)))
             
             count = cursor.fetchone()[0]
             self.logger.info(f"Found {count} sessions for date {date.isoformat()}")
             return count > 0
+
+    def get_chats_with_sessions(self, date: date, posted: bool = False) -> Set[int]:
+        """Чаты, в которых уже есть сессии на дату (posted - только опубликованные)"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT DISTINCT chat_id FROM sessions
+                WHERE date = ? AND chat_id IS NOT NULL{' AND message_id IS NOT NULL' if posted else ''}
+            ''', (encode_date(date),))
+            return {row[0] for row in cursor.fetchall()}
+
+    def _chat_from_row(self, row) -> Chat:
+        return Chat(
+            chat_id=row[0],
+            title=row[1],
+            autopost_time=datetime.strptime(row[2], '%H:%M').time(),
+            autopost_enabled=bool(row[3])
+        )
+
+    def add_chat(self, chat_id: int, autopost_time: time, title: Optional[str] = None,
+                 slots: Optional[List[Tuple[time, time, int]]] = None,
+                 autopost_enabled: bool = True) -> Chat:
+        """
+        Регистрация чата (если его ещё нет) со слотами по умолчанию
+        
+        Args:
+            chat_id: ID чата Telegram
+            autopost_time: время автопубликации списка
+            title: название чата
+            slots: слоты (начало, конец, максимум игроков) для нового чата
+            autopost_enabled: включить ли автопубликацию для нового чата
+            
+        Returns:
+            Chat: существующий или созданный чат
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR IGNORE INTO chats (chat_id, title, autopost_time, autopost_enabled)
+                VALUES (?, ?, ?, ?)
+            ''', (chat_id, title, autopost_time.strftime('%H:%M'), int(autopost_enabled)))
             
+            if cursor.rowcount and slots:
+                cursor.executemany('''
+                    INSERT INTO chat_slots (chat_id, time_start, time_end, max_players)
+                    VALUES (?, ?, ?, ?)
+                ''', [(chat_id, start.strftime('%H:%M'), end.strftime('%H:%M'), max_players)
+                      for start, end, max_players in slots])
+                self.logger.info(f"Registered chat {chat_id} with {len(slots)} default slots")
+            
+            cursor.execute(
+                'SELECT chat_id, title, autopost_time, autopost_enabled FROM chats WHERE chat_id = ?',
+                (chat_id,)
+            )
+            return self._chat_from_row(cursor.fetchone())
+
+    def get_chat(self, chat_id: int) -> Optional[Chat]:
+        """Получение чата по ID"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT chat_id, title, autopost_time, autopost_enabled FROM chats WHERE chat_id = ?',
+                (chat_id,)
+            )
+            row = cursor.fetchone()
+            return self._chat_from_row(row) if row else None
+
+    def update_chat_schedule(self, chat_id: int, autopost_time: Optional[time] = None,
+                             autopost_enabled: Optional[bool] = None) -> None:
+        """Изменение времени и включение/выключение автопубликации"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            if autopost_time is not None:
+                cursor.execute(
+                    'UPDATE chats SET autopost_time = ? WHERE chat_id = ?',
+                    (autopost_time.strftime('%H:%M'), chat_id)
+                )
+            if autopost_enabled is not None:
+                cursor.execute(
+                    'UPDATE chats SET autopost_enabled = ? WHERE chat_id = ?',
+                    (int(autopost_enabled), chat_id)
+                )
+            conn.commit()
+
+    def get_chats_due(self, since: Optional[time], until: time) -> List[Chat]:
+        """
+        Чаты с включённой автопубликацией, время которой попадает в (since, until]
+        (since=None - с начала суток)
+        """
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT chat_id, title, autopost_time, autopost_enabled FROM chats
+                WHERE autopost_enabled = 1 AND autopost_time > ? AND autopost_time <= ?
+                ORDER BY autopost_time, chat_id
+            ''', (since.strftime('%H:%M') if since else '', until.strftime('%H:%M')))
+            return [self._chat_from_row(row) for row in cursor.fetchall()]
+
+    def get_chat_slots(self, chat_id: int) -> List[ChatSlot]:
+        """Слоты чата по умолчанию, по времени начала"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, chat_id, time_start, time_end, max_players FROM chat_slots
+                WHERE chat_id = ?
+                ORDER BY time_start
+            ''', (chat_id,))
+            return [
+                ChatSlot(
+                    id=row[0],
+                    chat_id=row[1],
+                    time_start=datetime.strptime(row[2], '%H:%M').time(),
+                    time_end=datetime.strptime(row[3], '%H:%M').time(),
+                    max_players=row[4]
+                )
+                for row in cursor.fetchall()
+            ]
+
+    def set_chat_slots(self, chat_id: int, slots: List[Tuple[time, time, int]]) -> None:
+        """Замена слотов чата по умолчанию"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM chat_slots WHERE chat_id = ?', (chat_id,))
+            cursor.executemany('''
+                INSERT INTO chat_slots (chat_id, time_start, time_end, max_players)
+                VALUES (?, ?, ?, ?)
+            ''', [(chat_id, start.strftime('%H:%M'), end.strftime('%H:%M'), max_players)
+                  for start, end, max_players in slots])
+            conn.commit()
+            
+    def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        """
+        Захват или продление аренды роли name на ttl секунд
+        
+        Args:
+            name: имя роли (например, scheduler)
+            holder: идентификатор процесса
+            ttl: срок аренды, секунды
+            
+        Returns:
+            bool: True, если роль принадлежит holder
+        """
+        now = time_module.time()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            # Продлить свою аренду или забрать истёкшую чужую - одним запросом
+            cursor.execute('''
+                INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE
+                SET holder = excluded.holder, expires_at = excluded.expires_at
+                WHERE leases.holder = excluded.holder OR leases.expires_at < ?
+            ''', (name, holder, now + ttl, now))
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def release_lease(self, name: str, holder: str) -> None:
+        """Освобождение аренды, если она принадлежит holder"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM leases WHERE name = ? AND holder = ?', (name, holder))
+            conn.commit()
+
+    def get_lease(self, name: str) -> Optional[Tuple[str, float]]:
+        """Текущий владелец аренды и время её окончания (unix time)"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT holder, expires_at FROM leases WHERE name = ?', (name,))
+            row = cursor.fetchone()
+            return (row[0], row[1]) if row else None
+
+    def get_setting(self, key: str) -> Optional[str]:
+        """Значение настройки или None"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT value FROM settings WHERE key = ?', (key,))
+            result = cursor.fetchone()
+            return result[0] if result else None
+
+    def set_setting(self, key: str, value: str) -> None:
+        """Сохранение настройки"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)', (key, value))
+            conn.commit()
+
     def set_bot_enabled(self, enabled: bool) -> None:
         """Включение/выключение бота"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT OR REPLACE INTO settings (key, value)
@@ -527,7 +1425,7 @@ class Database:
 
     def is_bot_enabled(self) -> bool:
         """Проверка, включен ли бот"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT value FROM settings WHERE key = ?
@@ -539,17 +1437,17 @@ class Database:
 
     def get_player_stats(self, player_name: str) -> Optional[dict]:
         """Получение статистики игрока"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
+            cursor.execute(f'''
                 SELECT 
                     COUNT(*) as total_games,
                     MAX(s.date) as last_game
                 FROM registrations r
                 JOIN players p ON r.player_id = p.id
                 JOIN sessions s ON r.session_id = s.id
-                WHERE p.full_name = ?
-            ''', (player_name,))
+                WHERE {NAME_KEY_MATCH}
+            ''', name_key_params(player_name))
             
             result = cursor.fetchone()
             if not result:
@@ -557,12 +1455,12 @@ class Database:
                 
             return {
                 'total_games': result[0],
-                'last_game': datetime.strptime(result[1], '%Y-%m-%d').date() if result[1] else None
+                'last_game': decode_date(result[1]) if result[1] is not None else None
             }
 
     def get_general_stats(self) -> dict:
         """Получение общей статистики"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             # Общее количество сессий
@@ -579,7 +1477,7 @@ class Database:
                 FROM players p
                 JOIN registrations r ON p.id = r.player_id
                 JOIN sessions s ON r.session_id = s.id
-                WHERE s.date >= date('now', '-1 month')
+                WHERE s.date >= CAST(strftime('%s', 'now', '-1 month') AS INTEGER) / 86400
             ''')
             active_players = cursor.fetchone()[0]
             
@@ -589,9 +1487,21 @@ class Database:
                 'active_players': active_players
             }
 
+    def get_active_player_ids(self) -> Set[int]:
+        """ID игроков, записывавшихся на игры за последний месяц"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT DISTINCT r.player_id
+                FROM registrations r
+                JOIN sessions s ON r.session_id = s.id
+                WHERE s.date >= CAST(strftime('%s', 'now', '-1 month') AS INTEGER) / 86400
+            ''')
+            return {row[0] for row in cursor.fetchall()}
+
     def get_player_registration(self, session_id: int, player_id: int) -> Optional[Registration]:
         """Get player's registration info for a session"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             self.logger.info(f"Getting registration info for player {player_id} in session {session_id}")
             
@@ -616,76 +1526,27 @@ class Database:
                 id=row[0],
                 session_id=row[1],
                 player_id=row[2],
-                status=PlayerStatus(row[3]),
-                registration_time=datetime.fromisoformat(row[4]),
+                status=row[3],
+                registration_time=row[4],
                 registered_by_id=row[5] if row[5] is not None else None,
                 registered_by_name=row[7] if row[7] is not None else None
             )
             self.logger.info(f"Created registration object: {reg}")
             return reg
 
-    def remove_player_by_id(self, session_id: int, player_id: int) -> bool:
-        """Remove player from session by player ID"""
-        with sqlite3.connect(self.db_path) as conn:
-            try:
-                cursor = conn.cursor()
-                self.logger.info(f"Removing player {player_id} from session {session_id}")
-                
-                # Сначала определяем статус удаляемого игрока
-                cursor.execute('''
-                    SELECT status FROM registrations
-                    WHERE session_id = ? AND player_id = ?
-                ''', (session_id, player_id))
-                
-                status_row = cursor.fetchone()
-                if not status_row:
-                    return False
-                    
-                # Удаляем игрока
-                cursor.execute('''
-                    DELETE FROM registrations
-                    WHERE session_id = ? AND player_id = ?
-                ''', (session_id, player_id))
-                
-                deleted = cursor.rowcount > 0
-                
-                if deleted:
-                    # Если удалили игрока из основного состава, проверяем резерв
-                    if status_row[0] == PlayerStatus.MAIN.value:
-                        # Получаем первого из резерва
-                        cursor.execute('''
-                            SELECT player_id
-                            FROM registrations
-                            WHERE session_id = ? AND status = ?
-                            ORDER BY registration_time
-                            LIMIT 1
-                        ''', (session_id, PlayerStatus.RESERVE.value))
-                        
-                        reserve_row = cursor.fetchone()
-                        if reserve_row:
-                            # Проверяем количество в основном составе
-                            cursor.execute('''
-                                SELECT COUNT(*) FROM registrations
-                                WHERE session_id = ? AND status = ?
-                            ''', (session_id, PlayerStatus.MAIN.value))
-                            
-                            main_count = cursor.fetchone()[0]
-                            
-                            cursor.execute('SELECT max_players FROM sessions WHERE id = ?', (session_id,))
-                            max_players = cursor.fetchone()[0]
-                            
-                            if main_count < max_players:
-                                # Переводим в основной состав
-                                cursor.execute('''
-                                    UPDATE registrations
-                                    SET status = ?
-                                    WHERE session_id = ? AND player_id = ?
-                                ''', (PlayerStatus.MAIN.value, session_id, reserve_row[0]))
-                
-                conn.commit()
-                return deleted
-                    
-            except sqlite3.Error as e:
-                self.logger.error(f"Database error in remove_player_by_id: {e}")
-                conn.rollback()
-                raise
\ No newline at end of file
+    def remove_player_by_id(self, session_id: int, player_id: int) -> Tuple[bool, List[Player]]:
+        """
+        Remove player from session by player ID
+
+        Returns:
+            (whether the player was removed, players promoted from reserve)
+        """
+        self.logger.info(f"Removing player {player_id} from session {session_id}")
+        with self._immediate_transaction('remove_player_by_id') as cursor:
+            cursor.execute('''
+                DELETE FROM registrations
+                WHERE session_id = ? AND player_id = ?
+            ''', (session_id, player_id))
+            if cursor.rowcount == 0:
+                return False, []
+            return True, self._promote_reserve(cursor, session_id)
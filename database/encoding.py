@@ -0,0 +1,78 @@
+# database/encoding.py
+
+"""
+Хранение дат и времени в базе целыми числами.
+
+  registration_time, created_at - микросекунды от 1970-01-01 00:00 по местным
+                                  часам (время не переводится в UTC, как и раньше
+                                  в ISO-строках);
+  sessions.date                 - дни от 1970-01-01;
+  time_start, time_end          - минуты от полуночи;
+  registrations.status          - STATUS_CODES (models).
+
+Целые занимают меньше места, сравниваются без разбора строк (ORDER BY
+registration_time, индекс по дате), а обратно в datetime/date/time
+переводятся только при чтении поля модели.
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Union
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_datetime(value: datetime) -> int:
+    """datetime -> микросекунды от EPOCH"""
+    return (value - EPOCH) // MICROSECOND
+
+
+def decode_datetime(value: int) -> datetime:
+    """Микросекунды от EPOCH -> datetime"""
+    return EPOCH + timedelta(microseconds=value)
+
+
+def encode_date(value: date) -> int:
+    """date -> дни от EPOCH"""
+    return value.toordinal() - EPOCH_ORDINAL
+
+
+def decode_date(value: int) -> date:
+    """Дни от EPOCH -> date"""
+    return date.fromordinal(value + EPOCH_ORDINAL)
+
+
+def encode_time(value: time) -> int:
+    """time -> минуты от полуночи"""
+    return value.hour * 60 + value.minute
+
+
+def decode_time(value: int) -> time:
+    """Минуты от полуночи -> time"""
+    return time(value // 60, value % 60)
+
+
+def parse_time(value: str) -> int:
+    """'HH:MM' -> минуты от полуночи"""
+    return encode_time(datetime.strptime(value, '%H:%M').time())
+
+
+# Перевод значений прежнего текстового формата (для миграции, функции SQL)
+
+def legacy_datetime(value: Union[str, int, None]) -> Optional[int]:
+    if value is None or isinstance(value, int):
+        return value
+    return encode_datetime(datetime.fromisoformat(value))
+
+
+def legacy_date(value: Union[str, int, None]) -> Optional[int]:
+    if value is None or isinstance(value, int):
+        return value
+    return encode_date(date.fromisoformat(value))
+
+
+def legacy_time(value: Union[str, int, None]) -> Optional[int]:
+    if value is None or isinstance(value, int):
+        return value
+    return encode_time(time.fromisoformat(value))
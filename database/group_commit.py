@@ -0,0 +1,169 @@
+# database/group_commit.py
+
+"""
+Групповой commit записей на сессии.
+
+Во время "записи в 19:00" каждая запись - отдельная транзакция со своим fsync.
+GroupCommitWriter собирает запросы от одновременно работающих обработчиков
+в очередь и применяет их пакетом одной транзакцией (Database.apply_joins) в
+отдельном потоке, не блокируя event loop. Пакет закрывается через max_delay
+после первого запроса или по достижении max_batch запросов; пока пакет
+записывается, следующий набирается в очереди. Внутри пакета запросы
+применяются в порядке requested_at (времени нажатия), поэтому порядок резерва
+совпадает с порядком нажатий, если обработчики доходят до очереди с разбросом
+меньше окна пакета. Если транзакция пакета не удалась, его запросы применяются
+по одному, и ошибку получает только тот обработчик, чей запрос её вызывает.
+
+Пакеты появляются, только если обработчики работают одновременно, поэтому
+при включённом GROUP_COMMIT бот обрабатывает обновления параллельно
+(ApplicationBuilder.concurrent_updates).
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from .models import JoinOutcome, JoinRequest
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """
+    Очередь записей на сессии с пакетным применением.
+
+    Args:
+        db: Database или ShardedDatabase
+        max_batch: максимум запросов в одной транзакции
+        max_delay: сколько ждать новых запросов после первого, секунды
+        logger: логгер
+    """
+
+    def __init__(self, db, max_batch: int = 64, max_delay: float = 0.005,
+                 logger: Optional[logging.Logger] = None):
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.logger = logger or logging.getLogger('kpg_malibu_bvb')
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.batches = 0
+        self.requests = 0
+        self.max_batch_seen = 0
+        self.fallbacks = 0  # пакетов, применённых по одному запросу после ошибки
+        self.commit_times: Deque[float] = deque(maxlen=1000)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Запуск (вызывать из работающего event loop)"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Применить уже поставленные запросы и остановиться"""
+        if not self.running:
+            return
+        self._queue.put_nowait(_STOP)
+        await self._task
+        self._task = None
+
+    def submit(self, request: JoinRequest) -> 'asyncio.Future[JoinOutcome]':
+        """Поставить запрос в очередь (в пакете запросы упорядочиваются по requested_at)"""
+        if not self.running:
+            raise RuntimeError("GroupCommitWriter is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((request, future))
+        return future
+
+    async def join(self, request: JoinRequest) -> JoinOutcome:
+        """Записать игрока и дождаться результата"""
+        return await self.submit(request)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch: List[Tuple[JoinRequest, asyncio.Future]] = [item]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    if self._queue.empty():
+                        item = await asyncio.wait_for(self._queue.get(),
+                                                      max(0.0, deadline - loop.time()))
+                    else:
+                        item = self._queue.get_nowait()
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._apply(batch)
+
+    async def _apply(self, batch: List[Tuple[JoinRequest, asyncio.Future]]) -> None:
+        # Обработчики доходят до очереди с разной задержкой - в пакете порядок по времени запроса
+        batch.sort(key=lambda item: item[0].requested_at)
+        started = time.monotonic()
+        try:
+            outcomes = await asyncio.to_thread(self.db.apply_joins, [r for r, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                self.logger.error(f"Group commit of 1 join failed: {e}", exc_info=True)
+                self._fail(batch[0][1], e)
+                return
+            # Один плохой запрос или временная блокировка не должны ронять весь пакет
+            self.logger.warning(f"Group commit of {len(batch)} joins failed, "
+                                f"retrying one by one: {e}")
+            self.fallbacks += 1
+            for request, future in batch:
+                await self._apply_one(request, future)
+            return
+
+        self.commit_times.append(time.monotonic() - started)
+        self.batches += 1
+        self.requests += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        for (_, future), outcome in zip(batch, outcomes):
+            if not future.done():
+                future.set_result(outcome)
+
+    async def _apply_one(self, request: JoinRequest, future: asyncio.Future) -> None:
+        started = time.monotonic()
+        try:
+            outcome, = await asyncio.to_thread(self.db.apply_joins, [request])
+        except Exception as e:
+            self.logger.error(f"Join of player {request.player_id} to session {request.session_id} "
+                              f"failed: {e}", exc_info=True)
+            self._fail(future, e)
+            return
+        self.commit_times.append(time.monotonic() - started)
+        self.batches += 1
+        self.requests += 1
+        self.max_batch_seen = max(self.max_batch_seen, 1)
+        if not future.done():
+            future.set_result(outcome)
+
+    @staticmethod
+    def _fail(future: asyncio.Future, error: Exception) -> None:
+        if not future.done():
+            future.set_exception(error)
+
+    def summary(self) -> str:
+        """Текстовая сводка"""
+        average = self.requests / self.batches if self.batches else 0.0
+        commit_ms = sorted(self.commit_times)
+        p50 = commit_ms[len(commit_ms) // 2] * 1000 if commit_ms else 0.0
+        return (f"Group commit: {self.requests} joins in {self.batches} transactions "
+                f"(avg {average:.1f}, max {self.max_batch_seen}), commit p50 {p50:.1f} ms, "
+                f"{self.fallbacks} batches retried one by one")
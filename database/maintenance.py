@@ -0,0 +1,99 @@
+# database/maintenance.py
+
+"""
+Обслуживание файлов базы по расписанию (настройки MAINTENANCE).
+
+  - PRAGMA incremental_vacuum шагами по vacuum_pages страниц с паузой: удаления
+    (db_maintenance.clean_old_sessions, отмены записей, удаление сирот) оставляют
+    свободные страницы, шаг возвращает их часть файловой системе и держит
+    блокировку записи недолго. Шаги идут, пока есть свободные страницы, но не
+    дольше max_vacuum секунд;
+  - ANALYZE с PRAGMA analysis_limit: статистика для планировщика запросов
+    (sqlite_stat1) по выборке строк, без полного просмотра таблиц;
+  - PRAGMA optimize;
+  - PRAGMA wal_checkpoint: перенос WAL в базу и усечение файла -wal.
+
+Для incremental_vacuum нужен auto_vacuum = INCREMENTAL - его включает
+Database.create_tables.
+"""
+
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List
+
+from .database import AUTO_VACUUM_INCREMENTAL
+
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+
+def file_stats(conn: sqlite3.Connection, db_path: str) -> Dict[str, int]:
+    """Размер файла базы и WAL (байт), число страниц и свободных страниц"""
+    wal_path = f"{db_path}-wal"
+    return {
+        'size': os.path.getsize(db_path),
+        'wal_size': os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+        'page_count': conn.execute('PRAGMA page_count').fetchone()[0],
+        'freelist_count': conn.execute('PRAGMA freelist_count').fetchone()[0],
+    }
+
+
+def maintain_database(db_path: str, settings: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Обслуживание одного файла базы
+
+    Returns:
+        dict: before, after (file_stats), vacuum_steps, pages_freed, longest_step
+              (самый долгий шаг incremental_vacuum, секунды), vacuum_time,
+              analyze_time, checkpoint ((busy, кадров WAL, перенесено кадров)),
+              incremental (включён ли auto_vacuum = INCREMENTAL), duration
+    """
+    if settings['checkpoint'] not in CHECKPOINT_MODES:
+        raise ValueError(f"Unknown checkpoint mode: {settings['checkpoint']}")
+
+    started = time.perf_counter()
+    # Без неявных транзакций: каждая PRAGMA - отдельная короткая транзакция
+    conn = sqlite3.connect(db_path, timeout=settings['busy_timeout'], isolation_level=None)
+    try:
+        report: Dict[str, Any] = {'before': file_stats(conn, db_path), 'vacuum_steps': 0,
+                                  'longest_step': 0.0}
+        report['incremental'] = conn.execute('PRAGMA auto_vacuum').fetchone()[0] == AUTO_VACUUM_INCREMENTAL
+
+        vacuum_started = time.perf_counter()
+        if report['incremental']:
+            while conn.execute('PRAGMA freelist_count').fetchone()[0]:
+                if time.perf_counter() - vacuum_started >= settings['max_vacuum']:
+                    break
+                step_started = time.perf_counter()
+                # execute() делает один шаг оператора - это одна страница;
+                # executescript выполняет PRAGMA до конца
+                conn.executescript(f"PRAGMA incremental_vacuum({int(settings['vacuum_pages'])});")
+                report['longest_step'] = max(report['longest_step'], time.perf_counter() - step_started)
+                report['vacuum_steps'] += 1
+                time.sleep(settings['pause'])
+        report['vacuum_time'] = time.perf_counter() - vacuum_started
+
+        analyze_started = time.perf_counter()
+        conn.execute(f"PRAGMA analysis_limit = {int(settings['analysis_limit'])}")
+        conn.execute('ANALYZE')
+        conn.execute('PRAGMA optimize')
+        report['analyze_time'] = time.perf_counter() - analyze_started
+
+        report['checkpoint'] = conn.execute(f"PRAGMA wal_checkpoint({settings['checkpoint']})").fetchone()
+        report['after'] = file_stats(conn, db_path)
+    finally:
+        conn.close()
+
+    report['pages_freed'] = report['before']['freelist_count'] - report['after']['freelist_count']
+    report['duration'] = time.perf_counter() - started
+    return report
+
+
+def maintain_databases(files: List[str], settings: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Обслуживание файлов базы по очереди; отчёты maintain_database с ключом path"""
+    reports = []
+    for db_path in files:
+        report = maintain_database(db_path, settings)
+        report['path'] = db_path
+        reports.append(report)
+    return reports
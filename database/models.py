@@ -1,33 +1,102 @@
 # database/models.py
 
 from dataclasses import dataclass
-from datetime import datetime, time
+from datetime import date, datetime, time
 from enum import Enum
-from typing import Optional
+from operator import attrgetter
+from typing import Callable, Optional, Tuple
+
+try:
+    from .encoding import decode_date, decode_datetime, decode_time
+except ImportError:
+    from encoding import decode_date, decode_datetime, decode_time
 
 class PlayerStatus(Enum):
     """Статус игрока в сессии"""
     MAIN = "main"       # В основном составе
     RESERVE = "reserve" # В резерве
 
-@dataclass
-class Player:
+# Код статуса в колонке registrations.status
+STATUS_CODES = {PlayerStatus.MAIN: 0, PlayerStatus.RESERVE: 1}
+STATUS_BY_CODE = {code: status for status, code in STATUS_CODES.items()}
+
+def _decoded(slot: str, decode: Callable[[int], object]) -> property:
+    """
+    Поле поверх слота со значением из базы как есть (целое число): оно
+    декодируется при первом чтении и остаётся в слоте. Готовые значения
+    (datetime, date, time, PlayerStatus) сохраняются без изменений.
+    """
+    raw = attrgetter(slot)
+
+    def get(self):
+        value = raw(self)
+        if type(value) is int:
+            value = decode(value)
+            setattr(self, slot, value)
+        return value
+
+    def set(self, value):
+        setattr(self, slot, value)
+
+    return property(get, set)
+
+class _Row:
+    """
+    Модель строки базы: поля в __slots__ (без __dict__ на объект), объекты
+    строятся прямо из строк выборки (фабрики строк в database.py)
+    """
+    __slots__ = ()
+    _fields: Tuple[str, ...] = ()
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self._fields)
+
+    __hash__ = None
+
+class Player(_Row):
     """Модель данных игрока"""
-    id: int
-    full_name: str
-    telegram_id: Optional[int]
-    created_at: datetime
+    __slots__ = ('id', 'full_name', 'telegram_id', '_created_at', 'guest_of', 'name_key')
+    _fields = ('id', 'full_name', 'telegram_id', 'created_at', 'guest_of')
 
-@dataclass
-class Session:
+    def __init__(self, id: int, full_name: str, telegram_id: Optional[int],
+                 created_at: datetime, guest_of: Optional[int] = None,
+                 name_key: Optional[str] = None):
+        self.id = id
+        self.full_name = full_name
+        self.telegram_id = telegram_id
+        self._created_at = created_at
+        self.guest_of = guest_of  # telegram_id записавшего гостя
+        # Ключ имени из базы ("имя" или "имя#ID" у однофамильцев-гостей); None,
+        # если выборка его не читала
+        self.name_key = name_key
+
+    created_at = _decoded('_created_at', decode_datetime)
+
+class Session(_Row):
     """Model for game session"""
-    id: int
-    date: datetime
-    time_start: time
-    time_end: time
-    max_players: int
-    message_id: Optional[int] = None
-    chat_id: Optional[int] = None
+    __slots__ = ('id', '_date', '_time_start', '_time_end', 'max_players', 'message_id', 'chat_id')
+    _fields = ('id', 'date', 'time_start', 'time_end', 'max_players', 'message_id', 'chat_id')
+
+    def __init__(self, id: int, date: date, time_start: time, time_end: time,
+                 max_players: int, message_id: Optional[int] = None,
+                 chat_id: Optional[int] = None):
+        self.id = id
+        self._date = date
+        self._time_start = time_start
+        self._time_end = time_end
+        self.max_players = max_players
+        self.message_id = message_id
+        self.chat_id = chat_id
+
+    date = _decoded('_date', decode_date)
+    time_start = _decoded('_time_start', decode_time)
+    time_end = _decoded('_time_end', decode_time)
 
     def __eq__(self, other):
         if not isinstance(other, Session):
@@ -41,14 +110,59 @@ class Session:
         if self.date != other.date:
             return self.date < other.date
         return self.time_start < other.time_start
-    
-@dataclass
-class Registration:
+
+class Registration(_Row):
     """Модель данных регистрации на игру"""
+    __slots__ = ('id', 'session_id', 'player_id', '_status', '_registration_time',
+                 'registered_by_id', 'registered_by_name')
+    _fields = ('id', 'session_id', 'player_id', 'status', 'registration_time',
+               'registered_by_id', 'registered_by_name')
+
+    def __init__(self, id: int, session_id: int, player_id: int, status: PlayerStatus,
+                 registration_time: datetime, registered_by_id: Optional[int] = None,
+                 registered_by_name: Optional[str] = None):
+        self.id = id
+        self.session_id = session_id
+        self.player_id = player_id
+        self._status = status
+        self._registration_time = registration_time
+        self.registered_by_id = registered_by_id
+        self.registered_by_name = registered_by_name
+
+    status = _decoded('_status', STATUS_BY_CODE.__getitem__)
+    registration_time = _decoded('_registration_time', decode_datetime)
+
+@dataclass
+class Chat:
+    """Чат, в котором работает бот, и его расписание автопубликации"""
+    chat_id: int
+    title: Optional[str]
+    autopost_time: time
+    autopost_enabled: bool = True
+
+@dataclass
+class ChatSlot:
+    """Слот по умолчанию, из которого создаётся сессия при автопубликации"""
     id: int
+    chat_id: int
+    time_start: time
+    time_end: time
+    max_players: int
+
+class JoinOutcome(Enum):
+    """Результат записи на сессию"""
+    MAIN = "main"                    # В основном составе
+    RESERVE = "reserve"              # В резерве
+    DUPLICATE = "duplicate"          # Уже записан на эту сессию
+    OTHER_SESSION = "other_session"  # Уже записан на другую сессию этого дня
+    INVALID_SESSION = "invalid_session"
+
+@dataclass
+class JoinRequest:
+    """Запрос на запись игрока, применяется вместе с другими одной транзакцией"""
     session_id: int
     player_id: int
-    status: PlayerStatus
-    registration_time: datetime
+    requested_at: datetime
     registered_by_id: Optional[int] = None
-    registered_by_name: Optional[str] = None
\ No newline at end of file
+    registered_by_name: Optional[str] = None
+    one_session_per_day: bool = True
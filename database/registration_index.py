@@ -0,0 +1,61 @@
+# database/registration_index.py
+
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from .models import Registration, Session
+
+
+class RegistrationIndex:
+    """
+    Индекс "пользователь -> его регистрации" по датам в памяти.
+
+    Регистрации даты загружаются одним запросом (get_registrations_by_user) при
+    первом обращении. Перед каждым обращением проверяется data_version базы:
+    после любого commit, в том числе из другого процесса, индекс сбрасывается
+    целиком, так что устаревших ответов не бывает.
+    """
+
+    def __init__(self, db, max_dates: int = 7):
+        """
+        Args:
+            db: Database или ShardedDatabase
+            max_dates: сколько дат держать в памяти
+        """
+        self.db = db
+        self.max_dates = max_dates
+        self._version: Optional[Hashable] = None
+        self._dates: 'OrderedDict[date, Dict[int, List[Tuple[Session, Registration]]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, telegram_id: int, day: date,
+            chat_id: Optional[int] = None) -> List[Tuple[Session, Registration]]:
+        """
+        Регистрации пользователя на сессии даты (только чата chat_id, если задан)
+        """
+        version = self.db.data_version()
+        with self._lock:
+            if version != self._version:
+                self._dates.clear()
+                self._version = version
+            by_user = self._dates.get(day)
+            if by_user is not None:
+                self.hits += 1
+
+        if by_user is None:
+            by_user = self.db.get_registrations_by_user(day)
+            with self._lock:
+                self.loads += 1
+                # Если база успела измениться, загруженное не сохраняем
+                if self._version == version:
+                    self._dates[day] = by_user
+                    while len(self._dates) > self.max_dates:
+                        self._dates.popitem(last=False)
+
+        return [(session, registration) for session, registration in by_user.get(telegram_id, [])
+                if chat_id is None or session.chat_id == chat_id]
@@ -0,0 +1,72 @@
+# database/roster_cache.py
+
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Hashable, List, Tuple
+
+from .database import Roster
+from .models import Session
+
+Board = Tuple[List[Session], Dict[int, Tuple[Roster, Roster]]]
+
+
+class RosterCache:
+    """
+    Сессии чата с составами по диапазонам дат в памяти (/sessions week).
+
+    Диапазон загружается одним запросом (get_boards_in_range) и хранится вместе
+    с версией диапазона (get_range_version). Пока data_version базы не менялся,
+    ответ берётся из памяти без запросов. После любого commit, в том числе из
+    другого процесса, сверяется только версия диапазона: изменения других дат
+    и чатов кэш не сбрасывают, изменения в диапазоне - загружают его заново.
+
+    Возвращаемые списки общие для всех вызовов - изменять их нельзя.
+    """
+
+    def __init__(self, db, max_ranges: int = 64):
+        """
+        Args:
+            db: Database или ShardedDatabase
+            max_ranges: сколько диапазонов держать в памяти
+        """
+        self.db = db
+        self.max_ranges = max_ranges
+        # (chat_id, start, end) -> (data_version, версия диапазона, сессии и составы)
+        self._ranges: 'OrderedDict[Tuple[int, date, date], Tuple[Hashable, int, Board]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.checks = 0
+        self.loads = 0
+
+    def get(self, chat_id: int, start: date, end: date) -> Board:
+        """Сессии чата с start по end включительно и их составы (session_id -> (основной, резерв))"""
+        key = (chat_id, start, end)
+        version = self.db.data_version()
+        with self._lock:
+            cached = self._ranges.get(key)
+            if cached is not None and cached[0] == version:
+                self._ranges.move_to_end(key)
+                self.hits += 1
+                return cached[2]
+
+        # Версия диапазона читается до загрузки: изменение между ними
+        # приведёт к повторной загрузке при следующем обращении
+        range_version = self.db.get_range_version(chat_id, start, end)
+        if cached is not None and cached[1] == range_version:
+            board = cached[2]
+            with self._lock:
+                self.checks += 1
+        else:
+            board = self.db.get_boards_in_range(chat_id, start, end)
+            with self._lock:
+                self.loads += 1
+
+        with self._lock:
+            self._ranges[key] = (version, range_version, board)
+            self._ranges.move_to_end(key)
+            while len(self._ranges) > self.max_ranges:
+                self._ranges.popitem(last=False)
+        return board
+
@@ -0,0 +1,362 @@
+# database/sharding.py
+
+"""
+Шардирование базы по чатам.
+
+Сессии и регистрации чата хранятся в файле шарда chat_id % shards, общие данные
+(игроки, чаты, расписания, настройки) - в основной базе-справочнике. Каждый шард -
+обычная база Database со своей блокировкой записи, поэтому записи в разных чатах
+не ждут друг друга.
+
+ID сессий и регистраций уникальны во всех шардах: шард k выдаёт ID начиная
+с k << SHARD_ID_BITS, и по ID сессии сразу видно, в каком шарде она лежит.
+Игроки создаются в справочнике, а в шард копируются с тем же ID при первой
+регистрации - запросы с JOIN по players работают внутри шарда без изменений.
+
+Число шардов фиксируется при первом запуске: чтобы изменить его, данные нужно
+перенести в новые файлы.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, TypeVar
+
+from .database import Database, Roster
+from .models import (Player, Session, Registration, PlayerStatus, Chat, ChatSlot,
+                     JoinOutcome, JoinRequest)
+
+# Под локальный ID в шарде отводится 40 бит
+SHARD_ID_BITS = 40
+
+T = TypeVar('T')
+
+
+def shard_path(db_path: str, index: int) -> str:
+    """Путь к файлу шарда: database/kpg_malibu_bvb.shard0.db"""
+    root, ext = os.path.splitext(db_path)
+    return f"{root}.shard{index}{ext or '.db'}"
+
+
+def database_files(db_path: str, shards: int = 0) -> List[str]:
+    """Файлы базы: основная (справочник) и шарды"""
+    return [db_path] + [shard_path(db_path, index) for index in range(shards)]
+
+
+class ShardedDatabase:
+    """
+    Маршрутизатор запросов по шардам с тем же интерфейсом, что и Database.
+
+    Запросы по чату идут в шард чата, запросы по сессии - в шард из её ID,
+    общая статистика собирается параллельно со всех шардов.
+    """
+
+    def __init__(self, db_path: str, shards: int):
+        """
+        Args:
+            db_path: путь к основной базе (справочнику)
+            shards: количество шардов
+        """
+        if shards < 1:
+            raise ValueError(f"Number of shards must be positive: {shards}")
+        self.db_path = db_path
+        self.logger = logging.getLogger('kpg_malibu_bvb')
+        self.directory = Database(db_path)
+        self._check_shard_count(shards)
+        if self.directory.get_general_stats()['total_sessions']:
+            self.logger.warning(f"{db_path} has sessions of unsharded mode, they are not visible "
+                                f"to sharded queries until moved to shard files")
+
+        self.shards: List[Database] = []
+        for index in range(shards):
+            shard = Database(shard_path(db_path, index))
+            shard.reserve_id_range(index << SHARD_ID_BITS)
+            self.shards.append(shard)
+
+        self._replicated: Set[Tuple[str, int]] = set()
+        self._replicated_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=shards, thread_name_prefix='db-shard')
+        self.logger.info(f"Sharded database: {db_path} + {shards} shards")
+
+    def _check_shard_count(self, shards: int) -> None:
+        stored = self.directory.get_setting('shards')
+        if stored is None:
+            self.directory.set_setting('shards', str(shards))
+        elif int(stored) != shards:
+            raise ValueError(
+                f"Database {self.db_path} was created with {stored} shards, not {shards}"
+            )
+
+    def close(self) -> None:
+        """Остановка потоков параллельных запросов"""
+        self._executor.shutdown(wait=False)
+
+    # Маршрутизация
+
+    def shard_for_chat(self, chat_id: int) -> Database:
+        return self.shards[chat_id % len(self.shards)]
+
+    def shard_for_session(self, session_id: int) -> Database:
+        index = session_id >> SHARD_ID_BITS
+        if not 0 <= index < len(self.shards):
+            raise ValueError(f"Session {session_id} does not belong to any shard")
+        return self.shards[index]
+
+    def _fan_out(self, func: Callable[[Database], T]) -> List[T]:
+        """Выполнить запрос на всех шардах параллельно"""
+        return list(self._executor.map(func, self.shards))
+
+    def _ensure_player(self, shard: Database, player_id: int) -> None:
+        key = (shard.db_path, player_id)
+        if key in self._replicated:
+            return
+        player = self.directory.get_player(player_id)
+        if player is None:
+            raise ValueError(f"Player {player_id} not found")
+        shard.replicate_player(player)
+        with self._replicated_lock:
+            self._replicated.add(key)
+
+    # Игроки, чаты и настройки - в справочнике
+
+    def add_player(self, full_name: str, telegram_id: Optional[int] = None,
+                   guest_of: Optional[int] = None) -> Player:
+        return self.directory.add_player(full_name, telegram_id, guest_of)
+
+    def get_player(self, player_id: int) -> Optional[Player]:
+        return self.directory.get_player(player_id)
+
+    def add_chat(self, chat_id: int, autopost_time: time, title: Optional[str] = None,
+                 slots: Optional[List[Tuple[time, time, int]]] = None,
+                 autopost_enabled: bool = True) -> Chat:
+        return self.directory.add_chat(chat_id, autopost_time, title, slots, autopost_enabled)
+
+    def get_chat(self, chat_id: int) -> Optional[Chat]:
+        return self.directory.get_chat(chat_id)
+
+    def update_chat_schedule(self, chat_id: int, autopost_time: Optional[time] = None,
+                             autopost_enabled: Optional[bool] = None) -> None:
+        self.directory.update_chat_schedule(chat_id, autopost_time, autopost_enabled)
+
+    def get_chats_due(self, since: Optional[time], until: time) -> List[Chat]:
+        return self.directory.get_chats_due(since, until)
+
+    def get_chat_slots(self, chat_id: int) -> List[ChatSlot]:
+        return self.directory.get_chat_slots(chat_id)
+
+    def set_chat_slots(self, chat_id: int, slots: List[Tuple[time, time, int]]) -> None:
+        self.directory.set_chat_slots(chat_id, slots)
+
+    def set_bot_enabled(self, enabled: bool) -> None:
+        self.directory.set_bot_enabled(enabled)
+
+    def is_bot_enabled(self) -> bool:
+        return self.directory.is_bot_enabled()
+
+    def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        return self.directory.acquire_lease(name, holder, ttl)
+
+    def release_lease(self, name: str, holder: str) -> None:
+        self.directory.release_lease(name, holder)
+
+    def get_lease(self, name: str) -> Optional[Tuple[str, float]]:
+        return self.directory.get_lease(name)
+
+    # Сессии чата - в шарде чата
+
+    def create_session(self, chat_id: int, date: date, time_start: time,
+                       time_end: time, max_players: int) -> Session:
+        return self.shard_for_chat(chat_id).create_session(
+            chat_id, date, time_start, time_end, max_players
+        )
+
+    def get_or_create_session(self, chat_id: int, date: date, time_start: time,
+                              time_end: time, max_players: int) -> Tuple[Session, bool]:
+        return self.shard_for_chat(chat_id).get_or_create_session(
+            chat_id, date, time_start, time_end, max_players
+        )
+
+    def get_session_by_time(self, chat_id: int, date: date, time_str: str) -> Optional[Session]:
+        return self.shard_for_chat(chat_id).get_session_by_time(chat_id, date, time_str)
+
+    def get_sessions_for_date(self, chat_id: int, date: date) -> List[Session]:
+        return self.shard_for_chat(chat_id).get_sessions_for_date(chat_id, date)
+
+    def has_sessions_for_date(self, chat_id: int, date: date, posted: bool = False) -> bool:
+        return self.shard_for_chat(chat_id).has_sessions_for_date(chat_id, date, posted)
+
+    def get_boards_in_range(self, chat_id: int, start: date,
+                            end: date) -> Tuple[List[Session], Dict[int, Tuple[Roster, Roster]]]:
+        return self.shard_for_chat(chat_id).get_boards_in_range(chat_id, start, end)
+
+    def get_range_version(self, chat_id: int, start: date, end: date) -> int:
+        return self.shard_for_chat(chat_id).get_range_version(chat_id, start, end)
+
+    def iter_attendance(self, chat_id: int, start: date, end: date,
+                        batch_size: int = 500) -> Iterator[List[Tuple[Session, Player, Registration]]]:
+        # Сессии чата и их регистрации - в одном шарде
+        return self.shard_for_chat(chat_id).iter_attendance(chat_id, start, end, batch_size)
+
+    def sync_sessions(self, chat_ids: Iterable[int], first_day: date, last_day: date,
+                      sessions: List[Tuple[int, date, time, time, int]]) -> Tuple[int, int]:
+        # Одна транзакция на шард
+        chats_by_shard: Dict[int, List[int]] = {}
+        for chat_id in chat_ids:
+            chats_by_shard.setdefault(chat_id % len(self.shards), []).append(chat_id)
+        rows_by_shard: Dict[int, List[Tuple[int, date, time, time, int]]] = {}
+        for row in sessions:
+            rows_by_shard.setdefault(row[0] % len(self.shards), []).append(row)
+        created = removed = 0
+        for index in chats_by_shard.keys() | rows_by_shard.keys():
+            shard_created, shard_removed = self.shards[index].sync_sessions(
+                chats_by_shard.get(index, []), first_day, last_day, rows_by_shard.get(index, [])
+            )
+            created += shard_created
+            removed += shard_removed
+        return created, removed
+
+    # Сессия и её регистрации - в шарде из ID сессии
+
+    def get_session(self, session_id: int) -> Optional[Session]:
+        return self.shard_for_session(session_id).get_session(session_id)
+
+    def update_session_message(self, session_id: int, message_id: int, chat_id: int) -> None:
+        self.shard_for_session(session_id).update_session_message(session_id, message_id, chat_id)
+
+    def register_player(self, session_id: int, player_id: int, status: PlayerStatus,
+                        registered_by_id: Optional[int] = None,
+                        registered_by_name: Optional[str] = None) -> Registration:
+        shard = self.shard_for_session(session_id)
+        self._ensure_player(shard, player_id)
+        return shard.register_player(session_id, player_id, status,
+                                     registered_by_id, registered_by_name)
+
+    def apply_joins(self, requests: List[JoinRequest]) -> List[JoinOutcome]:
+        # Одна транзакция на шард; порядок запросов внутри шарда сохраняется
+        by_shard: Dict[int, List[int]] = {}
+        for i, request in enumerate(requests):
+            by_shard.setdefault(request.session_id >> SHARD_ID_BITS, []).append(i)
+
+        results: List[Optional[JoinOutcome]] = [None] * len(requests)
+        for index, positions in by_shard.items():
+            if not 0 <= index < len(self.shards):
+                for i in positions:
+                    results[i] = JoinOutcome.INVALID_SESSION
+                continue
+            shard = self.shards[index]
+            for i in positions:
+                self._ensure_player(shard, requests[i].player_id)
+            outcomes = shard.apply_joins([requests[i] for i in positions])
+            for i, outcome in zip(positions, outcomes):
+                results[i] = outcome
+        return results
+
+    def get_session_players(self, session_id: int) -> List[Tuple[Player, Registration]]:
+        return self.shard_for_session(session_id).get_session_players(session_id)
+
+    def get_session_reserve(self, session_id: int) -> List[Tuple[Player, Registration]]:
+        return self.shard_for_session(session_id).get_session_reserve(session_id)
+
+    def is_player_registered(self, session_id: int, telegram_id: int) -> bool:
+        return self.shard_for_session(session_id).is_player_registered(session_id, telegram_id)
+
+    def unregister_player(self, session_id: int, telegram_id: int) -> List[Player]:
+        return self.shard_for_session(session_id).unregister_player(session_id, telegram_id)
+
+    def promote_reserve(self, session_id: int) -> List[Player]:
+        return self.shard_for_session(session_id).promote_reserve(session_id)
+
+    def set_session_capacity(self, session_id: int, max_players: int) -> List[Player]:
+        return self.shard_for_session(session_id).set_session_capacity(session_id, max_players)
+
+    def remove_player_by_name(self, session_id: int,
+                              player_name: str) -> Tuple[bool, List[Player]]:
+        return self.shard_for_session(session_id).remove_player_by_name(session_id, player_name)
+
+    def remove_player_by_id(self, session_id: int, player_id: int) -> Tuple[bool, List[Player]]:
+        return self.shard_for_session(session_id).remove_player_by_id(session_id, player_id)
+
+    def get_player_registration(self, session_id: int, player_id: int) -> Optional[Registration]:
+        return self.shard_for_session(session_id).get_player_registration(session_id, player_id)
+
+    # Запросы по всем шардам
+
+    def get_chats_with_sessions(self, date: date, posted: bool = False) -> Set[int]:
+        return set().union(*self._fan_out(lambda shard: shard.get_chats_with_sessions(date, posted)))
+
+    def get_sessions_in_range(self, start: date, end: date,
+                              chat_id: Optional[int] = None) -> List[Session]:
+        if chat_id is not None:
+            return self.shard_for_chat(chat_id).get_sessions_in_range(start, end, chat_id)
+        results = self._fan_out(lambda shard: shard.get_sessions_in_range(start, end))
+        return sorted((session for chunk in results for session in chunk),
+                      key=lambda session: (session.date, session.chat_id, session.time_start))
+
+    def get_active_player_ids(self) -> Set[int]:
+        return set().union(*self._fan_out(lambda shard: shard.get_active_player_ids()))
+
+    def get_user_registrations(self, telegram_id: int, date: date,
+                               until: Optional[date] = None) -> List[Tuple[Session, Registration]]:
+        results = self._fan_out(lambda shard: shard.get_user_registrations(telegram_id, date, until))
+        return sorted((item for chunk in results for item in chunk),
+                      key=lambda item: (item[0].date, item[0].time_start))
+
+    def get_registrations_by_user(self, date: date) -> Dict[int, List[Tuple[Session, Registration]]]:
+        by_user: Dict[int, List[Tuple[Session, Registration]]] = {}
+        for chunk in self._fan_out(lambda shard: shard.get_registrations_by_user(date)):
+            for telegram_id, items in chunk.items():
+                by_user.setdefault(telegram_id, []).extend(items)
+        for items in by_user.values():
+            items.sort(key=lambda item: item[0].time_start)
+        return by_user
+
+    def data_version(self) -> Tuple[int, ...]:
+        return tuple(shard.data_version() for shard in self.shards)
+
+    def get_player_stats(self, player_name: str) -> Optional[dict]:
+        results = [s for s in self._fan_out(lambda shard: shard.get_player_stats(player_name)) if s]
+        if not results:
+            return None
+        last_games = [s['last_game'] for s in results if s['last_game']]
+        return {
+            'total_games': sum(s['total_games'] for s in results),
+            'last_game': max(last_games) if last_games else None
+        }
+
+    def get_general_stats(self) -> dict:
+        def shard_stats(shard: Database) -> Tuple[int, Set[int]]:
+            return shard.get_general_stats()['total_sessions'], shard.get_active_player_ids()
+
+        results = self._fan_out(shard_stats)
+        return {
+            'total_sessions': sum(sessions for sessions, _ in results),
+            'total_players': self.directory.get_general_stats()['total_players'],
+            'active_players': len(set().union(*(active for _, active in results)))
+        }
+
+
+    def check_integrity(self, batch_size: int = 500, pause: float = 0.05) -> dict:
+        # По очереди, а не параллельно: проверка не должна отнимать диск у обработчиков
+        reports = [db.check_integrity(batch_size, pause) for db in [self.directory, *self.shards]]
+        problems = [problem for report in reports if report['quick_check'] != 'ok'
+                    for problem in report['quick_check']]
+        return {
+            'quick_check': problems or 'ok',
+            'orphans': {name: sum(report['orphans'][name] for report in reports)
+                        for name in reports[0]['orphans']},
+        }
+
+
+def open_database(db_path: str, shards: int = 0):
+    """
+    Database для одного файла или ShardedDatabase, если задано число шардов
+
+    Args:
+        db_path: путь к основной базе
+        shards: количество шардов (0 - без шардирования)
+    """
+    if shards:
+        return ShardedDatabase(db_path, shards)
+    return Database(db_path)
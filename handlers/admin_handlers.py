@@ -1,26 +1,35 @@
 # handlers/admin_handlers.py
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import asyncio
+import os
+import secrets
+import socket
+import threading
+
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Message
 from telegram.ext import ContextTypes
-from datetime import datetime, timedelta
-from typing import List
+from datetime import datetime, date, time, timedelta
+from typing import List, Optional, Set, Tuple
 
 try:
     from .common import CommandHandler
 except ImportError:
     from handlers.common import CommandHandler
 
-from database.models import PlayerStatus
-from utils.validators import parse_time_range
-from utils.formatting import (
-    format_players_list, 
-    format_reserve_list, 
-    create_session_buttons
-)
+from database.models import PlayerStatus, Session
+from utils.validators import parse_time_range, validate_session_time
+from utils.profiler import MemoryProfiler, SamplingProfiler
+from utils.schedule import ScheduleEngine
+from utils.export import export_attendance
 class AdminCommandHandler(CommandHandler):  
     # Теперь методы базового класса доступны через self
     """Handler for admin commands"""
 
+    def __init__(self, database, logger):
+        super().__init__(database, logger)
+        # Слоты дат и создание сессий заранее
+        self.schedule_engine = ScheduleEngine(database, self.config, logger)
+
  # handlers/admin_handlers.py
 
     async def create_session(self, update: Update, 
@@ -33,9 +42,10 @@ class AdminCommandHandler(CommandHandler):
             return
 
         tomorrow = datetime.now().date() + timedelta(days=1)
+        chat_id = update.effective_chat.id
 
         # Check if sessions list already exists
-        if self.db.has_sessions_for_date(tomorrow):
+        if self.db.has_sessions_for_date(chat_id, tomorrow, posted=True):
             await update.message.reply_text(
                 f"Sessions list for {tomorrow.strftime(self.config.FORMAT_SETTINGS['date_format'])} already exists!"
             )
@@ -43,72 +53,161 @@ class AdminCommandHandler(CommandHandler):
 
         sessions_to_create = []
         # If no arguments, create default sessions
-        if not context.args:
-            sessions_to_create = [
-                ("14:00-16:00", 6),  # First session: 14-16, 6 players
-                ("16:00-18:00", 8)   # Second session: 16-18, 8 players
-            ]
-        else:
+        if context.args:
             # Parse arguments for specified sessions
+            slots = self.schedule_engine.slots_for(chat_id, tomorrow)
             time_ranges = context.args[0].split(',')
             for time_range in time_ranges:
                 time_range = time_range.strip()
-                max_players = 8 if time_range.startswith('16:') else 6
+                times = parse_time_range(time_range)
+                # Неверное время сообщит post_sessions_list
+                max_players = (self.schedule_engine.capacity(times[0], slots) if times
+                               else self.config.SESSION_SETTINGS['default_max_players'])
                 sessions_to_create.append((time_range, max_players))
 
-        created_sessions = []
-        # Create each session
-        for time_range, max_players in sessions_to_create:
-            times = parse_time_range(time_range)
-            if not times:
-                await update.message.reply_text(f"Invalid time format: {time_range}")
-                continue
+        created_sessions = await self.post_sessions_list(
+            context, update.effective_chat.id, tomorrow, sessions_to_create, update.message
+        )
 
-            start_time, end_time = times
-            
-            session = self.db.create_session(
-                date=tomorrow,
-                time_start=start_time,
-                time_end=end_time,
-                max_players=max_players
-            )
-            created_sessions.append(session)
+        # Log command
+        if created_sessions:
+            self.log_command_usage(update, 'create_session')
 
-        # Add date header once
-        full_message = f"<b>📅 Date:</b> {tomorrow.strftime(self.config.FORMAT_SETTINGS['date_format'])}\n\n"
-        
-        # Add each session without date
-        for i, session in enumerate(created_sessions, 1):
-            session_message = f"""<b>⏰ Session {i}:</b> <i>{session.time_start.strftime(self.config.FORMAT_SETTINGS['time_format'])} – {session.time_end.strftime(self.config.FORMAT_SETTINGS['time_format'])}</i>
-👥 Max players: {session.max_players}
-<b>Players:</b>  
-{format_players_list([], session.max_players)}
-
-<b>Reserve:</b>
-{format_reserve_list([])}\n\n"""
-
-            full_message += session_message
-
-        # Send message with sessions and buttons
-        buttons = create_session_buttons(created_sessions)
-        sent_message = await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text=full_message,
-            reply_markup=buttons,
-            parse_mode='HTML'
-        )
+    async def post_daily_sessions(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> None:
+        """Post default sessions list for tomorrow (used by the daily job)"""
+        tomorrow = datetime.now().date() + timedelta(days=1)
 
-        # Save message ID for all sessions
-        for session in created_sessions:
-            self.db.update_session_message(
-                session.id, 
-                sent_message.message_id,
-                update.effective_chat.id
-            )
+        if self.db.has_sessions_for_date(chat_id, tomorrow, posted=True):
+            self.logger.info(f"Sessions list for {tomorrow} already exists in chat {chat_id}, skipping autopost")
+            return
 
-        # Log command
-        self.logger.info(f"Updated message info for session {session.id}: message_id={sent_message.message_id}, chat_id={update.effective_chat.id}")
-        self.log_command_usage(update, 'create_session')
+        await self.post_sessions_list(context, chat_id, tomorrow)
+
+    async def post_sessions_list(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int,
+                                 session_date: date,
+                                 sessions_to_create: Optional[List[Tuple[str, int]]] = None,
+                                 message: Optional[Message] = None) -> List[Session]:
+        """
+        Create sessions for the date and post the sessions list to the chat.
+        Публикуются ещё не опубликованные сессии слотов даты (или явного
+        sessions_to_create), в том числе созданные заранее (ScheduleEngine.pregenerate)
+        """
+        if sessions_to_create:
+            slots = []
+            for time_range, max_players in sessions_to_create:
+                times = parse_time_range(time_range)
+                if not times:
+                    if message:
+                        await message.reply_text(f"Invalid time format: {time_range}")
+                    continue
+                slots.append((*times, max_players))
+        else:
+            # Template of the weekday, chat's slots or global defaults
+            slots = self.schedule_engine.slots_for(chat_id, session_date)
+
+        if not slots:
+            return []
+
+        # Список даты публикует один процесс (и один вызов в процессе)
+        lease = f"board:{chat_id}:{session_date.isoformat()}"
+        holder = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(3)}"
+        if not self.db.acquire_lease(lease, holder, self.config.SCHEDULE['post_lease']):
+            self.logger.info(f"Sessions list for {session_date} in chat {chat_id} is being posted elsewhere")
+            return []
+
+        try:
+            # Уже созданные сессии пропускаются - добавятся только недостающие; заранее
+            # созданные сессии не из этих слотов (без записей) удаляются
+            self.db.sync_sessions([chat_id], session_date, session_date,
+                                  [(chat_id, session_date, start, end, max_players)
+                                   for start, end, max_players in slots])
+
+            # Публикуются только сессии этих слотов (явный список админа или слоты
+            # даты): заранее созданные сессии других слотов, на которые уже
+            # записались, остаются неопубликованными
+            starts = {start for start, _, _ in slots}
+            parts, new_parts = self._pending_board(context, chat_id, session_date, starts)
+
+            # Another bot process has already posted this list
+            if not new_parts:
+                self.logger.info(f"Sessions for {session_date} in chat {chat_id} already posted")
+                if message:
+                    await message.reply_text(
+                        f"Sessions list for {session_date.strftime(self.config.FORMAT_SETTINGS['date_format'])} already exists!"
+                    )
+                return []
+
+            # Заранее созданные сессии могли получить записи до публикации -
+            # составы всех сессий даты читаются одним запросом
+            _, rosters = self.db.get_boards_in_range(chat_id, session_date, session_date)
+
+            # Большая дата - несколько сообщений, у каждой сессии свой message_id
+            posted_sessions = []
+            for index in new_parts:
+                part = parts[index]
+                sent_message = await context.bot.send_message(
+                    chat_id=chat_id,
+                    text=self.render_board(context, parts, index, rosters=rosters),
+                    reply_markup=self.board_keyboard(part),
+                    parse_mode='HTML'
+                )
+
+                # Save message ID for the sessions of this message
+                for session in part:
+                    self.db.update_session_message(
+                        session.id,
+                        sent_message.message_id,
+                        chat_id
+                    )
+                    session.message_id = sent_message.message_id
+                posted_sessions.extend(part)
+
+                self.logger.info(f"Posted sessions {[session.id for session in part]} for {session_date}: "
+                                 f"message_id={sent_message.message_id}, chat_id={chat_id}")
+            return posted_sessions
+        finally:
+            self.db.release_lease(lease, holder)
+
+    def _pending_board(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, session_date: date,
+                       starts: Optional[Set[time]] = None) -> Tuple[List[List[Session]], List[int]]:
+        """
+        Board messages of the date with not yet posted sessions (only those
+        starting at `starts`, if given) laid out into new messages: (все части,
+        индексы новых частей). Новым частям назначаются временные отрицательные
+        message_id - нумерация сессий и частей та же, что и при последующих
+        обновлениях списка
+        """
+        sessions = self.db.get_sessions_for_date(chat_id, session_date)
+        pending = [session for session in sessions if not session.message_id
+                   and (starts is None or session.time_start in starts)]
+        if not pending:
+            return [], []
+        for placeholder, part in enumerate(self.layout_board(context, pending), 1):
+            for session in part:
+                session.message_id = -placeholder
+        parts = self.posted_parts(sessions)
+        return parts, [i for i, part in enumerate(parts) if part[0].message_id < 0]
+
+    def prerender_boards(self, context: ContextTypes.DEFAULT_TYPE, chat_ids: List[int],
+                         session_date: date) -> int:
+        """
+        Собрать заранее тексты ещё не опубликованных списков даты: при
+        публикации блоки сессий берутся из кэша BoardRenderer
+
+        Returns:
+            int: сколько сообщений собрано
+        """
+        rendered = 0
+        for chat_id in chat_ids:
+            starts = {start for start, _, _ in self.schedule_engine.slots_for(chat_id, session_date)}
+            parts, new_parts = self._pending_board(context, chat_id, session_date, starts)
+            if not new_parts:
+                continue
+            _, rosters = self.db.get_boards_in_range(chat_id, session_date, session_date)
+            for index in new_parts:
+                self.render_board(context, parts, index, rosters=rosters)
+                rendered += 1
+        return rendered
 
     async def toggle_bot(self, update: Update, 
                         context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -139,6 +238,156 @@ class AdminCommandHandler(CommandHandler):
         # Логируем команду
         self.log_command_usage(update, 'toggle_bot')
 
+    def _schedule_text(self, chat_id: int) -> str:
+        """Описание расписания чата"""
+        chat = self.db.get_chat(chat_id)
+        if not chat:
+            return "Autopost is not set up for this chat. Use /schedule on to enable it."
+
+        time_format = self.config.FORMAT_SETTINGS['time_format']
+        lines = [
+            f"Autopost: {'on' if chat.autopost_enabled else 'off'} "
+            f"at {chat.autopost_time.strftime(time_format)}",
+            "Slots:",
+        ]
+        slots = self.db.get_chat_slots(chat_id)
+        for slot in slots:
+            lines.append(f"  {slot.time_start.strftime(time_format)}-{slot.time_end.strftime(time_format)}"
+                         f" ({slot.max_players} players)")
+        if not slots:
+            lines.append("  default")
+        return '\n'.join(lines)
+
+    def _ensure_chat(self, update: Update, autopost_enabled: bool = True) -> None:
+        """Регистрация текущего чата с настройками по умолчанию"""
+        chat = update.effective_chat
+        self.db.add_chat(
+            chat.id,
+            autopost_time=self.config.AUTOPOST_TIME,
+            title=chat.title or chat.full_name,
+            slots=self.config.DEFAULT_CHAT_SLOTS,
+            autopost_enabled=autopost_enabled
+        )
+
+    async def schedule(self, update: Update, 
+                       context: ContextTypes.DEFAULT_TYPE) -> None:
+        """
+        Расписание автопубликации списка в этом чате
+        Пример: /schedule, /schedule on, /schedule off, /schedule 19:00
+        """
+        if not update.message:
+            return
+
+        if not await self.check_admin(update, context):
+            return
+
+        chat_id = update.effective_chat.id
+        args = context.args or []
+        if args:
+            arg = args[0].lower()
+            if arg in ('on', 'off'):
+                self._ensure_chat(update)
+                self.db.update_chat_schedule(chat_id, autopost_enabled=(arg == 'on'))
+            elif validate_session_time(arg):
+                self._ensure_chat(update)
+                self.db.update_chat_schedule(
+                    chat_id, autopost_time=datetime.strptime(arg, '%H:%M').time()
+                )
+            else:
+                await update.message.reply_text("Usage: /schedule [on|off|HH:MM]")
+                return
+            self.logger.info(f"Chat {chat_id} schedule changed: {arg}")
+
+        await update.message.reply_text(self._schedule_text(chat_id))
+
+        # Логируем команду
+        self.log_command_usage(update, 'schedule')
+
+    async def slots(self, update: Update, 
+                    context: ContextTypes.DEFAULT_TYPE) -> None:
+        """
+        Слоты по умолчанию для автопубликации в этом чате
+        Пример: /slots 14:00-16:00=6 16:00-18:00=8
+        """
+        if not update.message:
+            return
+
+        if not await self.check_admin(update, context):
+            return
+
+        chat_id = update.effective_chat.id
+        if context.args:
+            new_slots = []
+            for item in ' '.join(context.args).replace(',', ' ').split():
+                time_range, _, max_players = item.partition('=')
+                times = parse_time_range(time_range)
+                if not times or (max_players and not max_players.isdigit()):
+                    await update.message.reply_text(
+                        f"Invalid slot: {item}\nUsage: /slots 14:00-16:00=6 16:00-18:00=8"
+                    )
+                    return
+                capacity = int(max_players) if max_players else \
+                    self.config.SESSION_SETTINGS['default_max_players']
+                new_slots.append((times[0], times[1], capacity))
+
+            # Новый чат регистрируется без автопубликации - её включает /schedule on
+            if not self.db.get_chat(chat_id):
+                self._ensure_chat(update, autopost_enabled=False)
+            self.db.set_chat_slots(chat_id, sorted(new_slots))
+            self.logger.info(f"Chat {chat_id} slots changed: {new_slots}")
+            # Заранее созданные сессии - по новым слотам
+            if self.db.get_chat(chat_id).autopost_enabled:
+                tomorrow = datetime.now().date() + timedelta(days=1)
+                await asyncio.to_thread(self.schedule_engine.pregenerate, [chat_id], tomorrow)
+
+        await update.message.reply_text(self._schedule_text(chat_id))
+
+        # Логируем команду
+        self.log_command_usage(update, 'slots')
+
+    async def capacity(self, update: Update, 
+                       context: ContextTypes.DEFAULT_TYPE) -> None:
+        """
+        Изменить максимальное количество игроков завтрашней сессии в этом чате.
+        При увеличении игроки из резерва сразу переходят в основной состав.
+        Пример: /capacity 14:00 8
+        """
+        if not update.message:
+            return
+
+        if not await self.check_admin(update, context):
+            return
+
+        args = context.args or []
+        if len(args) != 2 or not validate_session_time(args[0]) or not args[1].isdigit() \
+                or int(args[1]) < 1:
+            await update.message.reply_text("Usage: /capacity HH:MM max_players")
+            return
+
+        chat_id = self.get_sessions_chat_id(update, context)
+        tomorrow = datetime.now().date() + timedelta(days=1)
+        time_str = datetime.strptime(args[0], '%H:%M').strftime('%H:%M')
+        session = self.db.get_session_by_time(chat_id, tomorrow, time_str)
+        if not session:
+            await update.message.reply_text(self.messages.ERRORS['invalid_session'])
+            return
+
+        max_players = int(args[1])
+        promoted = self.db.set_session_capacity(session.id, max_players)
+        self.logger.info(f"Session {session.id} capacity changed to {max_players}, "
+                         f"{len(promoted)} promoted from reserve")
+
+        message = f"Max players for {time_str}: {max_players}"
+        if promoted:
+            message += f"\nMoved from reserve: {', '.join(p.full_name for p in promoted)}"
+        await update.message.reply_text(message)
+
+        await self.update_session_message(context, session.id)
+        await self.notify_players(context, promoted, self.messages.SUCCESS['moved_to_main'])
+
+        # Логируем команду
+        self.log_command_usage(update, 'capacity')
+
     async def show_stats(self, update: Update, 
                         context: ContextTypes.DEFAULT_TYPE) -> None:
         """
@@ -178,3 +427,228 @@ class AdminCommandHandler(CommandHandler):
 
         # Логируем команду
         self.log_command_usage(update, 'stats')
+
+    async def export(self, update: Update,
+                     context: ContextTypes.DEFAULT_TYPE) -> None:
+        """
+        Выгрузка посещений этого чата в CSV (gz - сжатый gzip).
+        Без дат - последние EXPORT['default_days'] дней, без конечной даты - по сегодня.
+        Пример: /export, /export 2025-01-01, /export 2025-01-01 2025-03-31 gz
+        """
+        if not update.message:
+            return
+
+        if not await self.check_admin(update, context):
+            return
+
+        settings = self.config.EXPORT
+        args = list(context.args or [])
+        compress = 'gz' in args
+        if compress:
+            args.remove('gz')
+        today = datetime.now().date()
+        try:
+            dates = [datetime.strptime(arg, '%Y-%m-%d').date() for arg in args]
+        except ValueError:
+            dates = None
+        if dates is None or len(dates) > 2:
+            await update.message.reply_text("Usage: /export [YYYY-MM-DD] [YYYY-MM-DD] [gz]")
+            return
+        start = dates[0] if dates else today - timedelta(days=settings['default_days'] - 1)
+        end = dates[1] if len(dates) > 1 else today
+        if start > end:
+            await update.message.reply_text("The start date is after the end date.")
+            return
+
+        chat_id = self.get_sessions_chat_id(update, context)
+        if chat_id is None:
+            await update.message.reply_text("Use /export in the group chat.")
+            return
+
+        # Одна выгрузка на чат за раз
+        running = context.bot_data.setdefault('exports_running', set())
+        if chat_id in running:
+            await update.message.reply_text("An export for this chat is already running.")
+            return
+        running.add(chat_id)
+        path = None
+        try:
+            # Чтение базы и запись файла - в рабочем потоке, event loop не блокируется
+            path, rows = await asyncio.to_thread(
+                export_attendance, self.db, chat_id, start, end, compress, settings
+            )
+            size = os.path.getsize(path)
+            self.logger.info(f"Attendance export for chat {chat_id} {start}..{end}: "
+                             f"{rows} rows, {size} bytes")
+            if size > settings['max_size']:
+                await update.message.reply_text(
+                    f"The export is {size // (1024 * 1024)} MB, over the Telegram limit. "
+                    f"Use a shorter period or add gz."
+                )
+                return
+
+            filename = f"attendance_{start.isoformat()}_{end.isoformat()}.csv" + ('.gz' if compress else '')
+            with open(path, 'rb') as document:
+                await update.message.reply_document(
+                    document=document, filename=filename,
+                    caption=f"Attendance {start.isoformat()} - {end.isoformat()}: {rows} sign-ups"
+                )
+        finally:
+            running.discard(chat_id)
+            if path:
+                os.remove(path)
+
+        # Логируем команду
+        self.log_command_usage(update, 'export')
+
+    async def show_stalls(self, update: Update, 
+                          context: ContextTypes.DEFAULT_TYPE) -> None:
+        """
+        Показать самые долгие блокировки event loop
+        Пример: /stalls или /stalls reset
+        """
+        if not update.message:
+            return
+
+        if not await self.check_admin(update, context):
+            return
+
+        watchdog = context.bot_data.get('loop_watchdog')
+        if not watchdog:
+            await update.message.reply_text(
+                "Loop watchdog is disabled. Set LOOP_WATCHDOG=1 to enable it."
+            )
+            return
+
+        await update.message.reply_text(watchdog.summary())
+        if context.args and context.args[0] == 'reset':
+            watchdog.reset()
+            await update.message.reply_text("Stall statistics have been reset.")
+
+        # Логируем команду
+        self.log_command_usage(update, 'stalls')
+
+    async def show_netstats(self, update: Update, 
+                            context: ContextTypes.DEFAULT_TYPE) -> None:
+        """
+        Статистика пулов соединений с Bot API
+        Пример: /netstats или /netstats reset
+        """
+        if not update.message:
+            return
+
+        if not await self.check_admin(update, context):
+            return
+
+        pools = context.bot_data.get('http_pools')
+        if not pools:
+            await update.message.reply_text("Connection pool statistics are not available.")
+            return
+
+        await update.message.reply_text('\n\n'.join(stats.summary() for stats in pools))
+        if context.args and context.args[0] == 'reset':
+            for stats in pools:
+                stats.reset()
+            await update.message.reply_text("Connection pool statistics have been reset.")
+
+        # Логируем команду
+        self.log_command_usage(update, 'netstats')
+
+    async def profile(self, update: Update, 
+                      context: ContextTypes.DEFAULT_TYPE) -> None:
+        """
+        Профилирование работающего бота
+        Пример: /profile, /profile cpu 60, /profile cpu 60 all,
+                /profile mem start, /profile mem snap, /profile mem stop
+        """
+        if not update.message:
+            return
+
+        if not await self.check_admin(update, context):
+            return
+
+        args = [arg.lower() for arg in (context.args or [])]
+        mode = args.pop(0) if args and not args[0].isdigit() else 'cpu'
+
+        if mode == 'cpu':
+            await self._profile_cpu(update, context, args)
+        elif mode == 'mem':
+            await self._profile_memory(update, context, args)
+        else:
+            await update.message.reply_text(
+                "Usage: /profile [cpu [seconds] [all]] | /profile mem start|snap|stop"
+            )
+            return
+
+        # Логируем команду
+        self.log_command_usage(update, 'profile')
+
+    async def _profile_cpu(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                           args: List[str]) -> None:
+        """Сэмплирование стеков на заданное время, отчёт приходит по окончании"""
+        settings = self.config.PROFILER
+        profiler = context.bot_data.get('cpu_profiler')
+        if profiler and profiler.running:
+            await update.message.reply_text("CPU profile is already running.")
+            return
+
+        duration = settings['default_duration']
+        if args and args[0].isdigit():
+            duration = min(max(int(args[0]), 1), settings['max_duration'])
+
+        # Обработчик выполняется в потоке event loop - по умолчанию профилируем только его
+        thread_ids = None if 'all' in args else [threading.get_ident()]
+        profiler = SamplingProfiler(interval=settings['interval'], thread_ids=thread_ids)
+        context.bot_data['cpu_profiler'] = profiler
+        profiler.start(duration)
+        self.logger.info(f"CPU profile started for {duration} s")
+
+        await update.message.reply_text(f"CPU profile started for {duration} s.")
+        context.application.create_task(self._finish_cpu_profile(update.message, profiler))
+
+    async def _finish_cpu_profile(self, message: Message, profiler: SamplingProfiler) -> None:
+        settings = self.config.PROFILER
+        try:
+            await asyncio.to_thread(profiler.wait)
+            folded_path, summary_path = await asyncio.to_thread(
+                profiler.write, settings['output_dir'], settings['top_n']
+            )
+            self.logger.info(f"CPU profile saved to {folded_path}")
+            text = profiler.summary(settings['top_n'])
+            await message.reply_text(
+                f"{text[:3800]}\n\nSaved: {folded_path}, {summary_path}"
+            )
+        except Exception as e:
+            self.logger.error(f"Error finishing CPU profile: {e}", exc_info=True)
+
+    async def _profile_memory(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                              args: List[str]) -> None:
+        """Снимки tracemalloc: start, snap (сравнение с предыдущим), stop"""
+        settings = self.config.PROFILER
+        profiler = context.bot_data.setdefault(
+            'memory_profiler', MemoryProfiler(nframes=settings['tracemalloc_frames'])
+        )
+        action = args[0] if args else 'snap'
+
+        if action == 'start':
+            await asyncio.to_thread(profiler.start)
+            self.logger.info("tracemalloc started")
+            await update.message.reply_text(
+                "Memory tracing started. Use /profile mem snap to compare, "
+                "/profile mem stop when done."
+            )
+        elif action in ('snap', 'snapshot'):
+            if not profiler.running:
+                await update.message.reply_text("Memory tracing is off. Use /profile mem start.")
+                return
+            text, path = await asyncio.to_thread(
+                profiler.snapshot, settings['output_dir'], settings['top_n']
+            )
+            self.logger.info(f"Memory snapshot saved to {path}")
+            await update.message.reply_text(f"{text[:3800]}\n\nSaved: {path}")
+        elif action == 'stop':
+            profiler.stop()
+            self.logger.info("tracemalloc stopped")
+            await update.message.reply_text("Memory tracing stopped.")
+        else:
+            await update.message.reply_text("Usage: /profile mem start|snap|stop")
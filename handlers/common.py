@@ -1,17 +1,32 @@
 # handlers/common.py
 
-from telegram import Update
+from telegram import InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
-from telegram.error import BadRequest, Forbidden, TelegramError
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import asyncio
 import logging
 
-from database.database import Database
+from database.database import Database, Roster
 from config.config import BotConfig
 from config.messages import Messages
-from database.models import PlayerStatus
+from database.models import Player, PlayerStatus, Session
+from utils.board import BoardRenderer
 from utils.validators import is_admin
-from utils.formatting import format_players_list, format_reserve_list, create_session_buttons
+from utils.formatting import create_session_buttons
+
+# Одно обновление списка сессий за раз на сообщение: при параллельной обработке
+# обновлений более раннее редактирование иначе может лечь поверх более позднего.
+# Ожидающие обновления схлопываются - список перерисовывает только последний из них
+class _BoardState:
+    __slots__ = ('lock', 'requested', 'users')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.requested = 0
+        self.users = 0  # обновлений, которые сейчас ждут или держат lock
+
 
 class CommandHandler:
     """Base class for handling bot commands"""
@@ -31,6 +46,74 @@ class CommandHandler:
             return False
         return True
 
+    def board_renderer(self, context: ContextTypes.DEFAULT_TYPE) -> BoardRenderer:
+        """Shared BoardRenderer (кэш фрагментов общий для всех обработчиков)"""
+        renderer = context.bot_data.get('board_renderer')
+        if renderer is None:
+            renderer = context.bot_data['board_renderer'] = BoardRenderer(
+                self.config.FORMAT_SETTINGS['date_format'],
+                self.config.FORMAT_SETTINGS['time_format']
+            )
+        return renderer
+
+    def layout_board(self, context: ContextTypes.DEFAULT_TYPE,
+                     sessions: List[Session]) -> List[List[Session]]:
+        """Split sessions of one date (sorted by start time) into board messages"""
+        layout = self.config.BOARD_LAYOUT
+        return self.board_renderer(context).layout(
+            sessions[0].date, sessions, layout['message_limit'],
+            layout['entry_length'], layout['reserve_share']
+        )
+
+    @staticmethod
+    def posted_parts(sessions: List[Session]) -> List[List[Session]]:
+        """Posted board messages of one date: sessions grouped by message_id"""
+        parts: Dict[int, List[Session]] = {}
+        for session in sessions:
+            if session.message_id:
+                parts.setdefault(session.message_id, []).append(session)
+        return list(parts.values())
+
+    def render_board(self, context: ContextTypes.DEFAULT_TYPE, parts: List[List[Session]],
+                     index: int = 0, with_players: bool = True,
+                     rosters: Optional[Dict[int, Tuple[Roster, Roster]]] = None) -> str:
+        """
+        Text of board message `index` of a date split into parts.
+        Сессии нумеруются сквозь все части; составы читаются только для сессий
+        этой части (или берутся из rosters), блоки неизменившихся сессий
+        берутся из кэша BoardRenderer
+        """
+        sessions = parts[index]
+        if rosters is None:
+            rosters = {}
+            if with_players:
+                for session in sessions:
+                    players = self.db.get_session_players(session.id)
+                    reserve = self.db.get_session_reserve(session.id)
+                    self.logger.info(f"Session {session.id}: {len(players)} players, {len(reserve)} in reserve")
+                    rosters[session.id] = (players, reserve)
+        return self.board_renderer(context).render(
+            sessions[0].date, sessions, rosters,
+            first_number=1 + sum(len(part) for part in parts[:index]),
+            part=index + 1, parts=len(parts),
+            limit=self.config.BOARD_LAYOUT['message_limit']
+        )
+
+    def board_keyboard(self, sessions: List[Session]) -> InlineKeyboardMarkup:
+        """Join buttons of the sessions in one board message"""
+        return create_session_buttons(sessions, self.config.BOARD_LAYOUT['buttons_per_row'])
+
+    def get_sessions_chat_id(self, update: Update,
+                             context: ContextTypes.DEFAULT_TYPE) -> Optional[int]:
+        """
+        Chat whose sessions the update refers to: the group itself or,
+        in a private chat, the group the user came from
+        """
+        chat = update.effective_chat
+        if chat and chat.type != 'private':
+            return chat.id
+        return (context.user_data or {}).get('source_chat_id')
+
     def log_command_usage(self, update: Update, command: str) -> None:
         """Log command usage"""
         if update.effective_user and update.effective_chat:
@@ -40,10 +123,81 @@ class CommandHandler:
                 f"Chat: {update.effective_chat.id}"
             )
 
+    async def notify_players(self, context: ContextTypes.DEFAULT_TYPE,
+                             players: List[Player], text: str) -> int:
+        """
+        Личные сообщения игрокам с ограничением скорости (NOTIFICATIONS).
+        Игроки без Telegram (гости) пропускаются.
+
+        Returns:
+            int: сколько сообщений доставлено
+        """
+        chat_ids = list(dict.fromkeys(p.telegram_id for p in players if p.telegram_id))
+        if not chat_ids:
+            return 0
+
+        settings = self.config.NOTIFICATIONS
+        semaphore = asyncio.Semaphore(settings['concurrency'])
+        interval = 1.0 / settings['per_second']
+        loop = asyncio.get_running_loop()
+        next_slot = loop.time()
+
+        async def send(chat_id: int) -> bool:
+            nonlocal next_slot
+            async with semaphore:
+                # Равномерно по времени, а не пачкой
+                slot = max(next_slot, loop.time())
+                next_slot = slot + interval
+                await asyncio.sleep(slot - loop.time())
+                for attempt in range(2):
+                    try:
+                        await context.bot.send_message(chat_id=chat_id, text=text)
+                        return True
+                    except RetryAfter as e:
+                        if attempt:
+                            break
+                        self.logger.warning(f"Flood limit on notification to {chat_id}, "
+                                            f"retrying in {e.retry_after}s")
+                        await asyncio.sleep(e.retry_after)
+                    except TelegramError as e:
+                        self.logger.error(f"Failed to notify player {chat_id}: {e}")
+                        return False
+                self.logger.error(f"Failed to notify player {chat_id}: flood limit")
+                return False
+
+        delivered = sum(await asyncio.gather(*(send(chat_id) for chat_id in chat_ids)))
+        self.logger.info(f"Notified {delivered}/{len(chat_ids)} players")
+        return delivered
+
     async def update_session_message(self, context: ContextTypes.DEFAULT_TYPE, session_id: int) -> None:
         """
         Update the sessions list message
         """
+        session = self.db.get_session(session_id)
+        if not session or not session.message_id or not session.chat_id:
+            await self._update_session_message(context, session_id)
+            return
+        boards: Dict[Tuple[int, int], _BoardState] = context.bot_data.setdefault('boards', {})
+        key = (session.chat_id, session.message_id)
+        board = boards.setdefault(key, _BoardState())
+        board.requested += 1
+        board.users += 1
+        ticket = board.requested
+        try:
+            # Список читается из базы уже под блокировкой - последнее редактирование самое свежее
+            async with board.lock:
+                if ticket < board.requested:
+                    # За нами ждёт более позднее обновление, оно покажет и наши изменения
+                    return
+                await self._update_session_message(context, session_id)
+        finally:
+            # Последнее обновление сообщения убирает его состояние, иначе словарь
+            # копит записи обо всех когда-либо редактированных списках
+            board.users -= 1
+            if not board.users and boards.get(key) is board:
+                del boards[key]
+
+    async def _update_session_message(self, context: ContextTypes.DEFAULT_TYPE, session_id: int) -> None:
         try:
             # Первая проверка - валидность контекста
             if not context or not context.bot:
@@ -58,8 +212,8 @@ class CommandHandler:
                 self.logger.warning(f"Session {session_id} not found or missing message info")
                 return
 
-            # Get all sessions for the same date
-            all_sessions = self.db.get_sessions_for_date(session.date)
+            # Get all sessions of the same chat for the same date
+            all_sessions = self.db.get_sessions_for_date(session.chat_id, session.date)
             if not all_sessions:
                 self.logger.error("No sessions found for update")
                 return
@@ -69,26 +223,10 @@ class CommandHandler:
             # Sort sessions by start time
             all_sessions.sort(key=lambda x: x.time_start)
 
-            # Format the full list message
-            full_message = f"<b>📅 Date:</b> {session.date.strftime(self.config.FORMAT_SETTINGS['date_format'])}\n\n"
-
-            for i, curr_session in enumerate(all_sessions, 1):
-                # Get players and reserve for current session
-                curr_players = self.db.get_session_players(curr_session.id)
-                curr_reserve = self.db.get_session_reserve(curr_session.id)
-                
-                self.logger.info(f"Session {curr_session.id}: {len(curr_players)} players, {len(curr_reserve)} in reserve")
-
-                session_text = f"""<b>⏰ Session {i}:</b> <i>{curr_session.time_start.strftime(self.config.FORMAT_SETTINGS['time_format'])} – {curr_session.time_end.strftime(self.config.FORMAT_SETTINGS['time_format'])}</i>
-👥 Max players: {curr_session.max_players}
-<b>Players:</b>  
-{format_players_list(curr_players, curr_session.max_players)}
-
-<b>Reserve:</b>
-{format_reserve_list(curr_reserve)}
-
-"""
-                full_message += session_text
+            # Редактируется только сообщение с этой сессией
+            parts = self.posted_parts(all_sessions)
+            index = next(i for i, part in enumerate(parts) if part[0].message_id == session.message_id)
+            full_message = self.render_board(context, parts, index)
 
             # Вторая проверка - валидность сообщения
             if not full_message or not full_message.strip():
@@ -97,7 +235,7 @@ class CommandHandler:
 
             # Update the message with all sessions
             try:
-                buttons = create_session_buttons(all_sessions)
+                buttons = self.board_keyboard(parts[index])
                 self.logger.info(f"Updating message {session.message_id} in chat {session.chat_id}")
                 
                 # Добавляем проверку валидности HTML перед отправкой
@@ -116,7 +254,7 @@ class CommandHandler:
                 self.logger.info("Sessions list updated successfully")
                 
             except BadRequest as e:
-                if "message is not modified" in str(e):
+                if "message is not modified" in str(e).lower():
                     self.logger.info("Message content hasn't changed")
                 elif "message to edit not found" in str(e):
                     self.logger.error(f"Message {session.message_id} not found in chat {session.chat_id}")
@@ -139,10 +277,11 @@ class CommandHandler:
         
         try:
             today = datetime.now().date()
-            sessions = self.db.get_sessions_for_date(today)
+            sessions = self.db.get_sessions_for_date(self.get_sessions_chat_id(update, context), today)
             
-            for session in sessions:
-                await self.update_session_message(context, session.id)
+            # Одно обновление на сообщение списка
+            for part in self.posted_parts(sessions):
+                await self.update_session_message(context, part[0].id)
                 
             if query:
                 await query.message.reply_text(
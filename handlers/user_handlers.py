@@ -1,28 +1,40 @@
 # handlers/user_handlers.py
 
+import asyncio
+from itertools import groupby
+
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from datetime import datetime, timedelta
-from typing import List
+from datetime import date, datetime, timedelta
+from typing import List, Optional
 
 try:
     from .common import CommandHandler
 except ImportError:
     from handlers.common import CommandHandler
 
-from database.models import PlayerStatus
+from database.models import JoinOutcome, JoinRequest, PlayerStatus, Session
+from database.registration_index import RegistrationIndex
+from database.roster_cache import RosterCache
 from utils.formatting import (
-    format_players_list, 
-    format_reserve_list,  
-    create_session_buttons, 
     create_group_menu,
     create_remove_players_menu,
     create_session_players_menu
 )
 
+# Периоды /sessions: сколько дней показывать начиная с сегодня
+SESSIONS_PERIODS = {'today': 1, 'week': 7}
+
 class UserCommandHandler(CommandHandler):
     """Обработчик пользовательских команд"""
 
+    def __init__(self, database, logger):
+        super().__init__(database, logger)
+        # Регистрации пользователей по датам для "Cancel my sign-up"
+        self.registrations = RegistrationIndex(database)
+        # Сессии чатов с составами по диапазонам дат для /sessions
+        self.rosters = RosterCache(database)
+
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle /start command"""
         if not update.message:
@@ -63,6 +75,34 @@ class UserCommandHandler(CommandHandler):
         await update.message.reply_text(self.messages.COMMANDS['help'])
         self.log_command_usage(update, 'help')
 
+    async def my_registrations(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Предстоящие регистрации пользователя во всех чатах (/my)"""
+        if not update.message or not update.effective_user:
+            return
+
+        registrations = self.db.get_user_registrations(
+            update.effective_user.id, datetime.now().date(), until=date.max
+        )
+        if not registrations:
+            await update.message.reply_text("You have no upcoming sign-ups.")
+            self.log_command_usage(update, 'my')
+            return
+
+        date_format = self.config.FORMAT_SETTINGS['date_format']
+        time_format = self.config.FORMAT_SETTINGS['time_format']
+        lines = ["<b>Your sign-ups:</b>"]
+        current_date = None
+        for session, registration in registrations:
+            if session.date != current_date:
+                current_date = session.date
+                lines.append(f"\n<b>📅 {session.date.strftime(date_format)}</b>")
+            status = "main list" if registration.status == PlayerStatus.MAIN else "reserve"
+            lines.append(f"⏰ {session.time_start.strftime(time_format)} – "
+                         f"{session.time_end.strftime(time_format)}: {status}")
+
+        await update.message.reply_text('\n'.join(lines), parse_mode='HTML')
+        self.log_command_usage(update, 'my')
+
     async def show_sessions(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Показать все сессии"""
         if not update.message:
@@ -72,41 +112,45 @@ class UserCommandHandler(CommandHandler):
             await update.message.reply_text(self.messages.ERRORS['bot_disabled'])
             return
 
+        # /sessions - сегодня, /sessions week - неделя начиная с сегодня
+        period = context.args[0].lower() if context.args else 'today'
+        if period not in SESSIONS_PERIODS:
+            await update.message.reply_text("Usage: /sessions [week]")
+            return
+
         today = datetime.now().date()
-        sessions = self.db.get_sessions_for_date(today)
+        # Сессии и составы диапазона - одним запросом, повторно - из кэша
+        sessions, rosters = self.rosters.get(
+            self.get_sessions_chat_id(update, context), today,
+            today + timedelta(days=SESSIONS_PERIODS[period] - 1)
+        )
+        # Только опубликованные сессии: заранее созданные (ScheduleEngine.pregenerate)
+        # открываются для записи вместе со списком в чате
+        sessions = [session for session in sessions if session.message_id]
         
         if not sessions:
-            await update.message.reply_text("No sessions available today.")
+            await update.message.reply_text(
+                "No sessions available today." if period == 'today'
+                else "No sessions available this week."
+            )
             return
 
-        full_message = f"<b>📅 Date:</b> {today.strftime(self.config.FORMAT_SETTINGS['date_format'])}\n\n"
-
-        for i, session in enumerate(sessions, 1):
-            players = self.db.get_session_players(session.id)
-            reserve = self.db.get_session_reserve(session.id)
-            
-            session_message = f"""<b>⏰ Session {i}:</b> <i>{session.time_start.strftime(self.config.FORMAT_SETTINGS['time_format'])} – {session.time_end.strftime(self.config.FORMAT_SETTINGS['time_format'])}</i>
-👥 Max players: {session.max_players}
-<b>Players:</b>  
-{format_players_list(players, session.max_players)}
-
-<b>Reserve:</b>
-{format_reserve_list(reserve)}
-
-"""
-            full_message += session_message
-
-        await update.message.reply_text(
-            text=full_message,
-            parse_mode='HTML',
-            reply_markup=create_session_buttons(sessions)
-        )
+        for _, day_sessions in groupby(sessions, key=lambda session: session.date):
+            parts = self.layout_board(context, list(day_sessions))
+            for index, part in enumerate(parts):
+                await update.message.reply_text(
+                    text=self.render_board(context, parts, index, rosters=rosters),
+                    parse_mode='HTML',
+                    reply_markup=self.board_keyboard(part)
+                )
         
         self.log_command_usage(update, 'sessions')
 
     async def button_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle button presses"""
         query = update.callback_query
+        # Press time orders joins in the group commit queue (answer() latency varies)
+        pressed_at = datetime.now()
         await query.answer()
         
         self.logger.info(f"Button pressed: {query.data}")
@@ -134,25 +178,26 @@ class UserCommandHandler(CommandHandler):
 
         if query.data == "back_to_remove_menu":
             # Return to session selection for removal
-            sessions = self.db.get_sessions_for_date(datetime.now().date() + timedelta(days=1))
+            sessions = self.db.get_sessions_for_date(
+                self.get_sessions_chat_id(update, context), datetime.now().date() + timedelta(days=1)
+            )
             await query.message.edit_reply_markup(
-                reply_markup=create_remove_players_menu(sessions)
+                reply_markup=create_remove_players_menu(sessions, self.config.BOARD_LAYOUT['buttons_per_row'])
             )
             return
 
         if query.data == "cancel_my_signup":
-            sessions = self.db.get_sessions_for_date(datetime.now().date() + timedelta(days=1))
             user_id = update.effective_user.id
             self.logger.info(f"User {user_id} trying to cancel registration")
-
-            for session in sessions:
-                self.logger.info(f"Checking registration for session {session.id}")
-                if self.db.is_player_registered(session.id, user_id):
-                    self.logger.info(f"Found registration in session {session.id}")
-                    await self.leave_session_by_id(update, context, session.id)
-                    return
-                else:
-                    self.logger.info(f"No registration found in session {session.id}")
+            registrations = self.registrations.get(
+                user_id, datetime.now().date() + timedelta(days=1),
+                chat_id=self.get_sessions_chat_id(update, context)
+            )
+            if registrations:
+                session, _ = registrations[0]
+                self.logger.info(f"Found registration in session {session.id}")
+                await self.leave_session_by_id(update, context, session.id)
+                return
 
             self.logger.warning(f"User {user_id} not found in any sessions")
             await context.bot.send_message(
@@ -196,10 +241,15 @@ class UserCommandHandler(CommandHandler):
                         await query.message.reply_text("Please start from the group chat first")
                         return
 
-                    sessions = self.db.get_sessions_for_date(datetime.now().date() + timedelta(days=1))
+                    sessions = self.db.get_sessions_for_date(
+                        source_chat_id, datetime.now().date() + timedelta(days=1)
+                    )
                     keyboard = []
-                    # Кнопки для сессий
+                    # Кнопки для сессий опубликованного списка: заранее созданные
+                    # сессии (ScheduleEngine.pregenerate) открываются с публикацией
                     for session in sessions:
+                        if not session.message_id:
+                            continue
                         keyboard.append([
                             InlineKeyboardButton(
                                 f"✍️ {session.time_start.strftime('%H:%M')}",
@@ -223,7 +273,9 @@ class UserCommandHandler(CommandHandler):
                 await query.message.reply_text("Please start from the group chat first")
                 return
 
-            sessions = self.db.get_sessions_for_date(datetime.now().date() + timedelta(days=1))
+            sessions = self.db.get_sessions_for_date(
+                source_chat_id, datetime.now().date() + timedelta(days=1)
+            )
             keyboard = []
             for session in sessions:
                 keyboard.append([
@@ -287,7 +339,7 @@ class UserCommandHandler(CommandHandler):
         
         if action == 'join':
             if 'self' in data_parts:
-                await self.join_session_by_id(update, context, session_id)
+                await self.join_session_by_id(update, context, session_id, pressed_at)
             elif 'group' in data_parts:
                 await context.bot.send_message(
                     chat_id=update.effective_chat.id,
@@ -303,9 +355,12 @@ class UserCommandHandler(CommandHandler):
         # Handle player removal
         if query.data == "back_to_remove_menu":
                     # Return to session selection for removal
-                    sessions = self.db.get_sessions_for_date(datetime.now().date() + timedelta(days=1))
+                    sessions = self.db.get_sessions_for_date(
+                        self.get_sessions_chat_id(update, context),
+                        datetime.now().date() + timedelta(days=1)
+                    )
                     await query.message.edit_reply_markup(
-                        reply_markup=create_remove_players_menu(sessions)
+                        reply_markup=create_remove_players_menu(sessions, self.config.BOARD_LAYOUT['buttons_per_row'])
                     )
                     return
 
@@ -316,7 +371,8 @@ class UserCommandHandler(CommandHandler):
             player_id = int(player_id)
             
             try:
-                if self.db.remove_player_by_id(session_id, player_id):
+                removed, promoted = self.db.remove_player_by_id(session_id, player_id)
+                if removed:
                     self.logger.info("Player removed successfully")
                     
                     # Update the message with new keyboard
@@ -336,16 +392,8 @@ class UserCommandHandler(CommandHandler):
                     # Update main session message
                     await self.update_session_message(context, session_id)
                     
-                    # Move player from reserve if exists
-                    moved_player = self.db.move_reserve_to_main(session_id)
-                    if moved_player and moved_player.telegram_id:
-                        try:
-                            await context.bot.send_message(
-                                chat_id=moved_player.telegram_id,
-                                text=self.messages.SUCCESS['moved_to_main']
-                            )
-                        except Exception as e:
-                            self.logger.error(f"Failed to notify player: {e}")
+                    # Players moved from reserve in the same transaction
+                    await self.notify_players(context, promoted, self.messages.SUCCESS['moved_to_main'])
                             
             except Exception as e:
                 self.logger.error(f"Error removing player: {e}")
@@ -353,7 +401,7 @@ class UserCommandHandler(CommandHandler):
             return
 
     async def join_session_by_id(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
-                               session_id: int) -> None:
+                               session_id: int, requested_at: Optional[datetime] = None) -> None:
         """Add player to session by ID"""
         if not update.effective_user:
             return
@@ -377,47 +425,43 @@ class UserCommandHandler(CommandHandler):
                 )
                 return
 
-            # Check if already registered
-            if self.db.is_player_registered(session_id, update.effective_user.id):
+            writer = context.bot_data.get('join_writer')
+            if writer:
+                # Group commit: checks and registration run in the writer's transaction
+                player = self.db.add_player(
+                    full_name=update.effective_user.full_name,
+                    telegram_id=update.effective_user.id
+                )
+                outcome = await writer.join(JoinRequest(
+                    session_id=session_id,
+                    player_id=player.id,
+                    requested_at=requested_at or datetime.now(),
+                    one_session_per_day=not self.config.SESSION_SETTINGS['allow_multiple_sessions']
+                ))
+            else:
+                outcome = self._join_now(update, session)
+
+            if outcome == JoinOutcome.DUPLICATE:
                 self.logger.info(f"User {update.effective_user.id} already registered for session {session_id}")
                 await context.bot.send_message(
                     chat_id=update.effective_chat.id,
                     text=self.messages.ERRORS['already_registered']
                 )
                 return
-
-            # Check if already registered in any session of this day
-            if not self.config.SESSION_SETTINGS['allow_multiple_sessions']:
-                sessions = self.db.get_sessions_for_date(session.date)
-                for s in sessions:
-                    if self.db.is_player_registered(s.id, update.effective_user.id):
-                        await context.bot.send_message(
-                            chat_id=update.effective_chat.id,
-                            text="You are already registered for another session today"
-                        )
-                        return
-            
-            # Add player
-            player = self.db.add_player(
-                full_name=update.effective_user.full_name,
-                telegram_id=update.effective_user.id
-            )
-            self.logger.info(f"Added player {player.id} to database")
-
-            # Get current players count
-            current_players = self.db.get_session_players(session_id)
-            self.logger.info(f"Current players in session: {len(current_players)}, max: {session.max_players}")
-            
-            # Determine status based on current count
-            status = PlayerStatus.MAIN if len(current_players) < session.max_players else PlayerStatus.RESERVE
-
-            # Register player
-            registration = self.db.register_player(
-                session_id=session_id,
-                player_id=player.id,
-                status=status
-            )
-            self.logger.info(f"Registered player {player.id} with status {status}")
+            if outcome == JoinOutcome.OTHER_SESSION:
+                await context.bot.send_message(
+                    chat_id=update.effective_chat.id,
+                    text="You are already registered for another session today"
+                )
+                return
+            if outcome == JoinOutcome.INVALID_SESSION:
+                await context.bot.send_message(
+                    chat_id=update.effective_chat.id,
+                    text=self.messages.ERRORS['invalid_session']
+                )
+                return
+            status = PlayerStatus(outcome.value)
+            self.logger.info(f"Registered user {update.effective_user.id} in session {session_id} with status {status}")
 
             # Send success message
             message = self.messages.SUCCESS['player_added'] if status == PlayerStatus.MAIN \
@@ -441,6 +485,31 @@ class UserCommandHandler(CommandHandler):
                 text="An error occurred while joining the session. Please try again."
             )
 
+    def _join_now(self, update: Update, session: Session) -> JoinOutcome:
+        """Register the user right away, each step with its own commit"""
+        user = update.effective_user
+
+        # Check if already registered for this or (if not allowed) any session of this day
+        registered = {s.id for s, _ in self.db.get_user_registrations(user.id, session.date)
+                      if s.chat_id == session.chat_id}
+        if session.id in registered:
+            return JoinOutcome.DUPLICATE
+        if registered and not self.config.SESSION_SETTINGS['allow_multiple_sessions']:
+            return JoinOutcome.OTHER_SESSION
+
+        # Add player
+        player = self.db.add_player(full_name=user.full_name, telegram_id=user.id)
+        self.logger.info(f"Added player {player.id} to database")
+
+        # Get current players count
+        current_players = self.db.get_session_players(session.id)
+        self.logger.info(f"Current players in session: {len(current_players)}, max: {session.max_players}")
+
+        # Determine status based on current count
+        status = PlayerStatus.MAIN if len(current_players) < session.max_players else PlayerStatus.RESERVE
+        self.db.register_player(session_id=session.id, player_id=player.id, status=status)
+        return JoinOutcome(status.value)
+
     async def leave_session_by_id(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
                                session_id: int) -> None:
         """Leave session by ID"""
@@ -473,26 +542,15 @@ class UserCommandHandler(CommandHandler):
             return
 
         try:
-            self.db.unregister_player(session_id, update.effective_user.id)
+            promoted = self.db.unregister_player(session_id, update.effective_user.id)
             self.logger.info(f"Successfully unregistered user {update.effective_user.id} from session {session_id}")
             
-            moved_player = self.db.move_reserve_to_main(session_id)
-            
             await update.callback_query.message.reply_text(
                 self.messages.SUCCESS['player_removed']
             )
             
-            if moved_player and moved_player.telegram_id:
-                try:
-                    await context.bot.send_message(
-                        chat_id=moved_player.telegram_id,
-                        text=self.messages.SUCCESS['moved_to_main']
-                    )
-                    self.logger.info(f"Notified player {moved_player.telegram_id} about moving to main list")
-                except Exception as e:
-                    self.logger.error(f"Failed to notify player: {e}")
-            
             await self.update_session_message(context, session_id)
+            await self.notify_players(context, promoted, self.messages.SUCCESS['moved_to_main'])
             self.log_command_usage(update, 'leave')
             
         except Exception as e:
@@ -520,41 +578,71 @@ class UserCommandHandler(CommandHandler):
 
                 added_count = 0
                 reserve_count = 0
+                duplicate_count = 0
                 current_players = self.db.get_session_players(session_id)
                 available_spots = session.max_players - len(current_players)
 
-                for name in players_names:
-                    if not name:
-                        continue
-
-                    # Create player
-                    player = self.db.add_player(
-                        full_name=name,
-                        telegram_id=None  # Group players don't have telegram_id
-                    )
+                writer = context.bot_data.get('join_writer')
+                if writer:
+                    # All names go into the queue in order and are committed together
+                    futures = [
+                        writer.submit(JoinRequest(
+                            session_id=session_id,
+                            player_id=self.db.add_player(full_name=name, telegram_id=None,
+                                                         guest_of=registrar_id).id,
+                            requested_at=datetime.now(),
+                            registered_by_id=registrar_id,
+                            registered_by_name=registrar_name,
+                            one_session_per_day=False
+                        ))
+                        for name in players_names if name
+                    ]
+                    outcomes = await asyncio.gather(*futures)
+                    added_count = outcomes.count(JoinOutcome.MAIN)
+                    reserve_count = outcomes.count(JoinOutcome.RESERVE)
+                    duplicate_count = outcomes.count(JoinOutcome.DUPLICATE)
+                else:
+                    registered = {player.id for player, _ in
+                                  current_players + self.db.get_session_reserve(session_id)}
+                    for name in players_names:
+                        if not name:
+                            continue
+
+                        # The registrar's guest with this name, created on first sign-up
+                        player = self.db.add_player(
+                            full_name=name,
+                            telegram_id=None,  # Group players don't have telegram_id
+                            guest_of=registrar_id
+                        )
+                        if player.id in registered:
+                            duplicate_count += 1
+                            continue
+                        registered.add(player.id)
 
-                    # Determine status
-                    status = PlayerStatus.MAIN if available_spots > 0 else PlayerStatus.RESERVE
+                        # Determine status
+                        status = PlayerStatus.MAIN if available_spots > 0 else PlayerStatus.RESERVE
 
-                    # Register player
-                    self.db.register_player(
-                        session_id=session_id,
-                        player_id=player.id,
-                        status=status,
-                        registered_by_id=registrar_id,
-                        registered_by_name=registrar_name
-                    )
+                        # Register player
+                        self.db.register_player(
+                            session_id=session_id,
+                            player_id=player.id,
+                            status=status,
+                            registered_by_id=registrar_id,
+                            registered_by_name=registrar_name
+                        )
 
-                    if status == PlayerStatus.MAIN:
-                        added_count += 1
-                        available_spots -= 1
-                    else:
-                        reserve_count += 1
+                        if status == PlayerStatus.MAIN:
+                            added_count += 1
+                            available_spots -= 1
+                        else:
+                            reserve_count += 1
 
                 # Send summary message
                 message = f"Added {added_count} players to main list"
                 if reserve_count > 0:
                     message += f" and {reserve_count} to reserve"
+                if duplicate_count > 0:
+                    message += f" ({duplicate_count} already registered)"
                 await update.message.reply_text(message)
                 
                 # Update session message in source chat if it exists
@@ -562,7 +650,7 @@ class UserCommandHandler(CommandHandler):
                 if source_chat_id:
                     # Сначала обновим chat_id в сессии, если нужно
                     session = self.db.get_session(session_id)
-                    if session.chat_id != source_chat_id:
+                    if session.chat_id is None:
                         self.db.update_session_message(session_id, session.message_id, source_chat_id)
                     await self.update_session_message(context, session_id)
                 
@@ -0,0 +1,3 @@
+# loadtest/__init__.py
+
+from .fake_bot_api import FakeBotApi
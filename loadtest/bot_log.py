@@ -0,0 +1,60 @@
+# loadtest/bot_log.py
+
+"""
+Лог бота на время нагрузочных прогонов.
+
+main.py при импорте подключает к логгеру бота FileHandler на logs/bot.log. Трафик
+прогонов (FakeBotApi, BotHarness) не должен попадать в этот файл: он засоряет лог
+и потом читается loadtest.replay как настоящий. Пока идёт хотя бы один прогон,
+файловые обработчики логгера бота сняты; после последнего они возвращаются.
+"""
+
+import logging
+from typing import List, Set
+
+BOT_LOGGER = 'kpg_malibu_bvb'
+
+_detached: List[logging.Handler] = []
+# Обработчики самих прогонов (BotHarness log_file) - их не снимаем
+_owned: Set[logging.Handler] = set()
+_runs = 0
+
+
+def _detach_file_handlers() -> None:
+    bot_logger = logging.getLogger(BOT_LOGGER)
+    for handler in list(bot_logger.handlers):
+        if isinstance(handler, logging.FileHandler) and handler not in _owned:
+            bot_logger.removeHandler(handler)
+            _detached.append(handler)
+
+
+def acquire() -> None:
+    """Начало прогона: файловые обработчики, подключённые к этому моменту, снимаются"""
+    global _runs
+    _runs += 1
+    _detach_file_handlers()
+
+
+def release() -> None:
+    """Конец прогона: после последнего файловые обработчики возвращаются"""
+    global _runs
+    _runs -= 1
+    if _runs == 0:
+        bot_logger = logging.getLogger(BOT_LOGGER)
+        while _detached:
+            bot_logger.addHandler(_detached.pop())
+
+
+def add_run_handler(log_file: str) -> logging.FileHandler:
+    """Файл лога бота на время прогона"""
+    handler = logging.FileHandler(log_file)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    _owned.add(handler)
+    logging.getLogger(BOT_LOGGER).addHandler(handler)
+    return handler
+
+
+def remove_run_handler(handler: logging.FileHandler) -> None:
+    logging.getLogger(BOT_LOGGER).removeHandler(handler)
+    _owned.discard(handler)
+    handler.close()
@@ -0,0 +1,57 @@
+# loadtest/compare_modes.py
+
+"""
+Сравнение задержки получения обновлений: long polling против webhook.
+
+Один и тот же прогон join_storm (одинаковый seed, нагрузка и задержка API)
+выполняется в обоих режимах, после чего печатается сравнение перцентилей
+времени от постановки обновления в FakeBotApi до конца его обработки ботом.
+
+Для режима webhook нужен tornado: pip install "python-telegram-bot[webhooks]==20.8"
+
+Пример:
+    python -m loadtest.compare_modes --users 200 --arrival-rate 50 --latency 0.05
+"""
+
+import asyncio
+import json
+from typing import Any, Dict
+
+from loadtest.join_storm import build_parser, run_storm
+
+MODES = ('polling', 'webhook')
+
+
+def print_comparison(reports: Dict[str, Dict[str, Any]]) -> None:
+    first = reports[MODES[0]]
+    print(f"\nUpdate delivery: {first['users']} users, {first['actions']} actions per mode")
+    print("delivery = from update creation to handler start, e2e = to handler end (ms)")
+    print(f"{'mode':<10}{'deliv p50':>11}{'deliv p99':>11}{'e2e p50':>10}{'e2e p99':>10}"
+          f"{'upd/s':>8}{'API calls':>11}  rosters")
+    for mode, report in reports.items():
+        delivery, e2e = report['delivery_latency'], report['end_to_end_latency']
+        calls = sum(report['api_calls'].values())
+        print(f"{mode:<10}{delivery['p50_ms']:>11}{delivery['p99_ms']:>11}"
+              f"{e2e['p50_ms']:>10}{e2e['p99_ms']:>10}"
+              f"{report['throughput_updates_per_s']:>8}{calls:>11}  "
+              f"{'OK' if report['roster_ok'] else 'PROBLEMS'}")
+
+
+def main() -> None:
+    parser = build_parser()
+    parser.description = 'Compare update latency in polling and webhook modes'
+    args = parser.parse_args()
+
+    reports = {}
+    for mode in MODES:
+        args.mode = mode
+        reports[mode] = asyncio.run(run_storm(args))
+
+    print_comparison(reports)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,821 @@
+# loadtest/fake_bot_api.py
+
+"""
+Локальная замена api.telegram.org для нагрузочных и end-to-end тестов.
+
+Реализует подмножество Bot API, которое использует бот (getUpdates, sendMessage,
+editMessageText, editMessageReplyMarkup, answerCallbackQuery, getChatMember, getMe
+и служебные методы, которые вызывает python-telegram-bot при старте), умеет
+добавлять задержку к ответам и отвечать 429 Too Many Requests с retry_after.
+
+Запуск отдельно:
+    python -m loadtest.fake_bot_api --port 8081 --latency 0.05 --admin 123456
+
+После этого бота можно направить на сервер:
+    TELEGRAM_API_BASE_URL=http://127.0.0.1:8081/bot TELEGRAM_BOT_TOKEN=123:fake python main.py
+
+Обновления подаются через служебный endpoint POST /_control/updates
+(JSON-объект Update или список объектов), статистика вызовов - GET /_control/stats.
+После setWebhook обновления, как и у настоящего сервера, доставляются POST-запросами
+на адрес webhook (по одному обновлению на запрос, до max_connections параллельно,
+но в пределах одного чата - строго по очереди)
+с заголовком X-Telegram-Bot-Api-Secret-Token; неуспешные доставки повторяются.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import random
+import time
+from collections import Counter, deque
+from email.parser import BytesParser
+from email.policy import HTTP
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import httpx
+
+from loadtest import bot_log
+
+logger = logging.getLogger('kpg_malibu_bvb.loadtest')
+
+# Методы, на которые настоящий Bot API отвечает 429 при превышении лимитов
+FLOOD_METHODS = frozenset({
+    'sendMessage',
+    'sendDocument',
+    'editMessageText',
+    'editMessageReplyMarkup',
+})
+
+# Параметры, которые приходят строками, но должны быть числами или JSON
+INT_PARAMS = frozenset({
+    'chat_id', 'message_id', 'user_id', 'offset', 'limit', 'timeout',
+    'reply_to_message_id', 'max_connections',
+})
+JSON_PARAMS = frozenset({
+    'reply_markup', 'allowed_updates', 'entities', 'caption_entities',
+    'reply_parameters', 'link_preview_options', 'commands',
+})
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 409: 'Conflict',
+                429: 'Too Many Requests'}
+
+
+class ApiError(Exception):
+    """Ошибка Bot API, возвращаемая клиенту в виде {"ok": false, ...}"""
+
+    def __init__(self, code: int, description: str, retry_after: Optional[int] = None):
+        super().__init__(description)
+        self.code = code
+        self.description = description
+        self.retry_after = retry_after
+
+    @classmethod
+    def flood(cls, retry_after: int) -> 'ApiError':
+        return cls(429, f"Too Many Requests: retry after {retry_after}", retry_after)
+
+    def payload(self) -> Dict[str, Any]:
+        payload = {'ok': False, 'error_code': self.code, 'description': self.description}
+        if self.retry_after is not None:
+            payload['parameters'] = {'retry_after': self.retry_after}
+        return payload
+
+
+def _update_chat_id(update: Dict[str, Any]) -> Any:
+    """Чат, к которому относится обновление (для порядка доставки в webhook)"""
+    message = update.get('message') or update.get('callback_query', {}).get('message')
+    if message:
+        return message['chat']['id']
+    return update.get('callback_query', {}).get('from', {}).get('id')
+
+
+def make_user(user_id: int, first_name: Optional[str] = None,
+              username: Optional[str] = None) -> Dict[str, Any]:
+    """Объект User для подачи в обновления"""
+    user = {
+        'id': user_id,
+        'is_bot': False,
+        'first_name': first_name or f"User{user_id}",
+    }
+    if username:
+        user['username'] = username
+    return user
+
+
+class FakeBotApi:
+    """
+    HTTP-сервер, эмулирующий Bot API.
+
+    Args:
+        host: адрес для прослушивания
+        port: порт (0 - выбрать свободный)
+        latency: базовая задержка ответа в секундах
+        jitter: случайная добавка к задержке (равномерно от 0 до jitter)
+        method_latency: задержка для отдельных методов, перекрывает latency
+        flood_probability: вероятность ответить 429 на исходящий метод
+        retry_after: retry_after для случайных 429
+        chat_limit: лимит исходящих сообщений в минуту на групповой чат
+        global_limit: лимит исходящих сообщений в секунду на бота
+        admins: telegram_id пользователей, которые считаются админами чатов
+        seed: зерно генератора случайных чисел
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8081,
+                 latency: float = 0.0, jitter: float = 0.0,
+                 method_latency: Optional[Dict[str, float]] = None,
+                 flood_probability: float = 0.0, retry_after: int = 1,
+                 chat_limit: Optional[int] = None, global_limit: Optional[int] = None,
+                 admins: Iterable[int] = (), bot_username: str = 'kpg_malibu_bvb_test_bot',
+                 seed: Optional[int] = None, webhook_retry_delay: float = 0.1):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.method_latency = dict(method_latency or {})
+        self.flood_probability = flood_probability
+        self.retry_after = retry_after
+        self.chat_limit = chat_limit
+        self.global_limit = global_limit
+        self.admins = set(admins)
+        self.webhook_retry_delay = webhook_retry_delay
+        self.bot_user = {
+            'id': 1000000001,
+            'is_bot': True,
+            'first_name': 'KPG Malibu BVB (fake)',
+            'username': bot_username,
+            'can_join_groups': True,
+            'can_read_all_group_messages': False,
+            'supports_inline_queries': False,
+        }
+
+        self._random = random.Random(seed)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.Task] = set()
+        self._cond: Optional[asyncio.Condition] = None
+        self._poll_generation = 0
+        self._callback_ids = itertools.count(1)
+        self._last_update_id = 0
+        self._updates: List[Dict[str, Any]] = []
+        self._next_message_id: Dict[int, int] = {}
+        self._chat_windows: Dict[int, Deque[float]] = {}
+        self._global_window: Deque[float] = deque()
+        self.webhook: Optional[Dict[str, Any]] = None
+        self._webhook_task: Optional[asyncio.Task] = None
+
+        # Состояние, доступное тестам
+        self.messages: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        self.outbox: List[Dict[str, Any]] = []
+        self.pushed_at: Dict[int, float] = {}
+        self.calls: Counter = Counter()
+        self.flood_errors: Counter = Counter()
+        self.webhook_deliveries = 0
+        self.webhook_errors: Counter = Counter()
+        self.polling_conflicts = 0
+
+        self._methods = {
+            'getMe': self._get_me,
+            'getUpdates': self._get_updates,
+            'sendMessage': self._send_message,
+            'sendDocument': self._send_document,
+            'editMessageText': self._edit_message_text,
+            'editMessageReplyMarkup': self._edit_message_reply_markup,
+            'answerCallbackQuery': self._answer_callback_query,
+            'getChatMember': self._get_chat_member,
+            'setWebhook': self._set_webhook,
+            'deleteWebhook': self._delete_webhook,
+            'getWebhookInfo': self._get_webhook_info,
+            'setMyCommands': self._ok,
+            'close': self._ok,
+            'logOut': self._ok,
+        }
+
+    # ------------------------------------------------------------------
+    # Жизненный цикл
+    # ------------------------------------------------------------------
+
+    @property
+    def base_url(self) -> str:
+        """Значение для BotConfig.API_BASE_URL / ApplicationBuilder.base_url"""
+        return f"http://{self.host}:{self.port}/bot"
+
+    @property
+    def base_file_url(self) -> str:
+        return f"http://{self.host}:{self.port}/file/bot"
+
+    async def start(self) -> None:
+        """Запуск сервера в текущем event loop"""
+        # Лог прогона (этот логгер - дочерний логгеру бота) не пишется в logs/bot.log
+        bot_log.acquire()
+        self._cond = asyncio.Condition()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Fake Bot API listening on {self.base_url}")
+
+    async def stop(self) -> None:
+        """Остановка сервера"""
+        await self._stop_webhook_delivery()
+        if self._server:
+            self._server.close()
+            for task in list(self._connections):
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+            logger.info("Fake Bot API stopped")
+            bot_log.release()
+
+    async def __aenter__(self) -> 'FakeBotApi':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    # ------------------------------------------------------------------
+    # Подача обновлений
+    # ------------------------------------------------------------------
+
+    def push_update(self, update: Dict[str, Any]) -> Dict[str, Any]:
+        """Поставить обновление в очередь getUpdates (или на доставку в webhook)"""
+        self._last_update_id += 1
+        update['update_id'] = self._last_update_id
+        self._updates.append(update)
+        self.pushed_at[self._last_update_id] = time.monotonic()
+        if self._cond is not None:
+            asyncio.ensure_future(self._wake_pollers())
+        return update
+
+    def callback_update(self, user: Dict[str, Any], chat_id: int, data: str,
+                        message_id: Optional[int] = None) -> Dict[str, Any]:
+        """Нажатие inline-кнопки под сообщением message_id (по умолчанию - последним в чате)"""
+        if message_id is None:
+            message_id = self.last_message_id(chat_id)
+        message = self.messages.get((chat_id, message_id)) or self._message(chat_id, message_id or 1, '')
+        return self.push_update({
+            'callback_query': {
+                'id': str(next(self._callback_ids)),
+                'from': user,
+                'chat_instance': str(chat_id),
+                'message': message,
+                'data': data,
+            }
+        })
+
+    def command_update(self, user: Dict[str, Any], chat_id: int, command: str,
+                       args: Iterable[str] = ()) -> Dict[str, Any]:
+        """Команда /command args... от пользователя"""
+        text = ' '.join([f"/{command}", *args])
+        return self.push_update({
+            'message': {
+                **self._message(chat_id, self._allocate_message_id(chat_id), text, from_user=user),
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command) + 1}],
+            }
+        })
+
+    def text_update(self, user: Dict[str, Any], chat_id: int, text: str) -> Dict[str, Any]:
+        """Обычное текстовое сообщение от пользователя"""
+        return self.push_update({
+            'message': self._message(chat_id, self._allocate_message_id(chat_id), text, from_user=user)
+        })
+
+    def last_message_id(self, chat_id: int) -> Optional[int]:
+        """ID последнего сообщения бота в чате"""
+        for entry in reversed(self.outbox):
+            if entry['chat_id'] == chat_id:
+                return entry['message_id']
+        seeded = [message_id for chat, message_id in self.messages if chat == chat_id]
+        return max(seeded) if seeded else None
+
+    def seed_message(self, chat_id: int, message_id: int, text: str = '') -> Dict[str, Any]:
+        """Создать сообщение бота, отправленное "до запуска" (например, список из копии базы)"""
+        message = self._message(chat_id, message_id, text)
+        self.messages[(chat_id, message_id)] = message
+        self._next_message_id[chat_id] = max(self._next_message_id.get(chat_id, 0), message_id)
+        return message
+
+    @property
+    def pending_updates(self) -> int:
+        return len(self._updates)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики вызовов методов и ответов 429"""
+        return {
+            'calls': dict(self.calls),
+            'flood_errors': dict(self.flood_errors),
+            'pending_updates': self.pending_updates,
+            'messages_sent': len(self.outbox),
+            'webhook_deliveries': self.webhook_deliveries,
+            'webhook_errors': dict(self.webhook_errors),
+            'polling_conflicts': self.polling_conflicts,
+        }
+
+    def reset_stats(self) -> None:
+        self.calls.clear()
+        self.flood_errors.clear()
+        self.webhook_deliveries = 0
+        self.webhook_errors.clear()
+        self.polling_conflicts = 0
+
+    async def _wake_pollers(self) -> None:
+        async with self._cond:
+            self._cond.notify_all()
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                status, payload = await self._dispatch(method, target, headers, body)
+
+                data = json.dumps(payload).encode()
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTP_REASONS.get(status, 'OK')}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                    "\r\n".encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+
+        method, target, _ = request_line.decode('latin-1').split(' ', 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = b''
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                body += await reader.readexactly(size)
+                await reader.readline()
+        else:
+            body = b''
+
+        return method, target, headers, body
+
+    def _parse_params(self, headers: Dict[str, str], body: bytes, query: str) -> Dict[str, Any]:
+        content_type = headers.get('content-type', '')
+        params: Dict[str, Any] = dict(parse_qsl(query))
+
+        if content_type.startswith('application/json'):
+            params.update(json.loads(body or b'{}'))
+        elif content_type.startswith('multipart/form-data'):
+            message = BytesParser(policy=HTTP).parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode() + body
+            )
+            for part in message.iter_parts():
+                name = part.get_param('name', header='content-disposition')
+                payload = part.get_payload(decode=True) or b''
+                if part.get_filename():
+                    params[name] = {'filename': part.get_filename(), 'size': len(payload)}
+                else:
+                    params[name] = payload.decode()
+        elif body:
+            params.update(parse_qsl(body.decode()))
+
+        for key, value in params.items():
+            if not isinstance(value, str):
+                continue
+            if key in INT_PARAMS:
+                params[key] = int(value)
+            elif key in JSON_PARAMS:
+                params[key] = json.loads(value)
+        return params
+
+    async def _dispatch(self, http_method: str, target: str, headers: Dict[str, str],
+                        body: bytes) -> Tuple[int, Dict[str, Any]]:
+        url = urlsplit(target)
+        path = url.path.strip('/').split('/')
+
+        if path[0] == '_control':
+            return await self._control(path[1] if len(path) > 1 else '', http_method, body, url.query)
+
+        if len(path) != 2 or not path[0].startswith('bot'):
+            return 404, ApiError(404, 'Not Found').payload()
+
+        name = path[1]
+        self.calls[name] += 1
+        handler = self._methods.get(name)
+        if handler is None:
+            return 404, ApiError(404, 'Not Found: method not found').payload()
+
+        try:
+            params = self._parse_params(headers, body, url.query)
+            if name == 'getUpdates':
+                # Long polling: запрос идёт до сервера, ждёт обновлений, ответ идёт обратно
+                await self._delay(name, 0.5)
+                result = await handler(params)
+                await self._delay(name, 0.5)
+                return 200, {'ok': True, 'result': result}
+            await self._delay(name)
+            if name in FLOOD_METHODS:
+                self._check_flood(params.get('chat_id'))
+            result = await handler(params)
+            return 200, {'ok': True, 'result': result}
+        except ApiError as e:
+            if e.code == 429:
+                self.flood_errors[name] += 1
+            return e.code, e.payload()
+        except (KeyError, ValueError) as e:
+            return 400, ApiError(400, f"Bad Request: {e}").payload()
+
+    async def _control(self, action: str, http_method: str, body: bytes,
+                       query: str) -> Tuple[int, Dict[str, Any]]:
+        if action == 'updates' and http_method == 'POST':
+            data = json.loads(body or b'[]')
+            updates = data if isinstance(data, list) else [data]
+            return 200, {'ok': True, 'result': [self.push_update(u)['update_id'] for u in updates]}
+        if action == 'stats':
+            return 200, {'ok': True, 'result': self.stats()}
+        if action == 'messages':
+            chat_id = dict(parse_qsl(query)).get('chat_id')
+            result = [m for m in self.outbox if chat_id is None or m['chat_id'] == int(chat_id)]
+            return 200, {'ok': True, 'result': result}
+        return 404, ApiError(404, 'Not Found').payload()
+
+    # ------------------------------------------------------------------
+    # Задержки и лимиты
+    # ------------------------------------------------------------------
+
+    async def _delay(self, name: str, share: float = 1.0) -> None:
+        """Сетевая задержка метода; share=0.5 - путь в одну сторону"""
+        delay = self.method_latency.get(name, self.latency)
+        if self.jitter:
+            delay += self._random.uniform(0, self.jitter)
+        delay *= share
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _check_flood(self, chat_id: Optional[int]) -> None:
+        if self.flood_probability and self._random.random() < self.flood_probability:
+            raise ApiError.flood(self.retry_after)
+
+        now = time.monotonic()
+        if self.global_limit:
+            window = self._global_window
+            while window and now - window[0] >= 1:
+                window.popleft()
+            if len(window) >= self.global_limit:
+                raise ApiError.flood(max(1, math.ceil(1 - (now - window[0]))))
+
+        chat_window = None
+        if self.chat_limit and isinstance(chat_id, int) and chat_id < 0:
+            chat_window = self._chat_windows.setdefault(chat_id, deque())
+            while chat_window and now - chat_window[0] >= 60:
+                chat_window.popleft()
+            if len(chat_window) >= self.chat_limit:
+                raise ApiError.flood(max(1, math.ceil(60 - (now - chat_window[0]))))
+
+        if self.global_limit:
+            self._global_window.append(now)
+        if chat_window is not None:
+            chat_window.append(now)
+
+    # ------------------------------------------------------------------
+    # Методы Bot API
+    # ------------------------------------------------------------------
+
+    def _chat(self, chat_id: int) -> Dict[str, Any]:
+        if chat_id < 0:
+            return {'id': chat_id, 'type': 'supergroup', 'title': f"Chat {chat_id}"}
+        return {'id': chat_id, 'type': 'private', 'first_name': f"User{chat_id}"}
+
+    def _allocate_message_id(self, chat_id: int) -> int:
+        message_id = self._next_message_id.get(chat_id, 0) + 1
+        self._next_message_id[chat_id] = message_id
+        return message_id
+
+    def _message(self, chat_id: int, message_id: int, text: str,
+                 reply_markup: Optional[Dict[str, Any]] = None,
+                 from_user: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': self._chat(chat_id),
+            'from': from_user or self.bot_user,
+            'text': text,
+        }
+        if reply_markup:
+            message['reply_markup'] = reply_markup
+        return message
+
+    def _find_message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        if 'inline_message_id' in params:
+            raise ApiError(400, 'Bad Request: inline messages are not supported')
+        message = self.messages.get((params['chat_id'], params['message_id']))
+        if message is None:
+            raise ApiError(400, 'Bad Request: message to edit not found')
+        return message
+
+    def _store(self, method: str, message: Dict[str, Any]) -> Dict[str, Any]:
+        chat_id = message['chat']['id']
+        self.messages[(chat_id, message['message_id'])] = message
+        self.outbox.append({
+            'time': time.monotonic(),
+            'method': method,
+            'chat_id': chat_id,
+            'message_id': message['message_id'],
+            'text': message.get('text', ''),
+        })
+        return message
+
+    async def _ok(self, params: Dict[str, Any]) -> bool:
+        return True
+
+    async def _get_me(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return self.bot_user
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if self.webhook:
+            raise ApiError(409, "Conflict: can't use getUpdates method while webhook is active; "
+                                "use deleteWebhook to delete the webhook first")
+
+        offset = params.get('offset') or 0
+        limit = params.get('limit') or 100
+        timeout = params.get('timeout') or 0
+        if offset > 0:
+            self._updates = [u for u in self._updates if u['update_id'] >= offset]
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        async with self._cond:
+            # Новый getUpdates прерывает предыдущий, как и настоящий сервер
+            self._poll_generation += 1
+            generation = self._poll_generation
+            self._cond.notify_all()
+
+            while True:
+                if generation != self._poll_generation:
+                    self.polling_conflicts += 1
+                    raise ApiError(409, 'Conflict: terminated by other getUpdates request; '
+                                        'make sure that only one bot instance is running')
+                pending = [u for u in self._updates if u['update_id'] >= offset][:limit]
+                remaining = deadline - loop.time()
+                if pending or remaining <= 0:
+                    return pending
+                try:
+                    await asyncio.wait_for(self._cond.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _send_message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        chat_id = params['chat_id']
+        message = self._message(
+            chat_id,
+            self._allocate_message_id(chat_id),
+            params['text'],
+            reply_markup=params.get('reply_markup'),
+        )
+        return self._store('sendMessage', message)
+
+    async def _send_document(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        chat_id = params['chat_id']
+        document = params['document']
+        message = self._message(chat_id, self._allocate_message_id(chat_id), '')
+        del message['text']
+        message['document'] = {
+            'file_id': f"fake-{chat_id}-{message['message_id']}",
+            'file_unique_id': f"fake-{chat_id}-{message['message_id']}",
+            'file_name': document.get('filename') if isinstance(document, dict) else None,
+            'file_size': document.get('size') if isinstance(document, dict) else None,
+        }
+        if params.get('caption'):
+            message['caption'] = params['caption']
+        return self._store('sendDocument', message)
+
+    async def _edit_message_text(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        message = self._find_message(params)
+        reply_markup = params.get('reply_markup')
+        if message.get('text') == params['text'] and message.get('reply_markup') == reply_markup:
+            raise ApiError(400, 'Bad Request: message is not modified: specified new message '
+                                'content and reply markup are exactly the same as a current '
+                                'content and reply markup of the message')
+        message['text'] = params['text']
+        message.pop('reply_markup', None)
+        if reply_markup:
+            message['reply_markup'] = reply_markup
+        message['edit_date'] = int(time.time())
+        return self._store('editMessageText', message)
+
+    async def _edit_message_reply_markup(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        message = self._find_message(params)
+        reply_markup = params.get('reply_markup')
+        if message.get('reply_markup') == reply_markup:
+            raise ApiError(400, 'Bad Request: message is not modified: specified new message '
+                                'content and reply markup are exactly the same as a current '
+                                'content and reply markup of the message')
+        message.pop('reply_markup', None)
+        if reply_markup:
+            message['reply_markup'] = reply_markup
+        message['edit_date'] = int(time.time())
+        return self._store('editMessageReplyMarkup', message)
+
+    async def _answer_callback_query(self, params: Dict[str, Any]) -> bool:
+        return True
+
+    async def _get_chat_member(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        user = make_user(params['user_id'])
+        if params['user_id'] not in self.admins:
+            return {'status': 'member', 'user': user}
+        return {
+            'status': 'administrator',
+            'user': user,
+            'can_be_edited': False,
+            'is_anonymous': False,
+            'can_manage_chat': True,
+            'can_delete_messages': True,
+            'can_manage_video_chats': True,
+            'can_restrict_members': True,
+            'can_promote_members': False,
+            'can_change_info': True,
+            'can_invite_users': True,
+        }
+
+    async def _set_webhook(self, params: Dict[str, Any]) -> bool:
+        if not params.get('url'):
+            return await self._delete_webhook(params)
+        await self._stop_webhook_delivery()
+        self.webhook = {
+            'url': params['url'],
+            'secret_token': params.get('secret_token'),
+            'max_connections': params.get('max_connections', 40),
+        }
+        if params.get('drop_pending_updates') == 'true':
+            self._updates.clear()
+        self._webhook_task = asyncio.ensure_future(self._deliver_webhook(self.webhook))
+        return True
+
+    async def _delete_webhook(self, params: Dict[str, Any]) -> bool:
+        await self._stop_webhook_delivery()
+        if params.get('drop_pending_updates') == 'true':
+            self._updates.clear()
+        return True
+
+    # ------------------------------------------------------------------
+    # Доставка в webhook
+    # ------------------------------------------------------------------
+
+    async def _stop_webhook_delivery(self) -> None:
+        self.webhook = None
+        if self._webhook_task:
+            self._webhook_task.cancel()
+            await asyncio.gather(self._webhook_task, return_exceptions=True)
+            self._webhook_task = None
+
+    async def _deliver_webhook(self, webhook: Dict[str, Any]) -> None:
+        """Рассылка ожидающих обновлений, пока webhook не удалён или не заменён"""
+        in_flight: Dict[int, asyncio.Task] = {}
+        busy_chats: Set[Any] = set()
+
+        def ready() -> List[Dict[str, Any]]:
+            # Первое недоставленное обновление каждого чата, не занятого доставкой
+            seen = set(busy_chats)
+            updates = []
+            for update in self._updates:
+                chat_id = _update_chat_id(update)
+                if chat_id not in seen:
+                    seen.add(chat_id)
+                    updates.append(update)
+            return updates
+
+        def has_work() -> bool:
+            return len(in_flight) < webhook['max_connections'] and bool(ready())
+
+        headers = {}
+        if webhook['secret_token']:
+            headers['X-Telegram-Bot-Api-Secret-Token'] = webhook['secret_token']
+
+        async with httpx.AsyncClient(timeout=30, headers=headers) as client:
+            try:
+                while True:
+                    async with self._cond:
+                        await self._cond.wait_for(has_work)
+                    for update in ready():
+                        if len(in_flight) >= webhook['max_connections']:
+                            break
+                        update_id, chat_id = update['update_id'], _update_chat_id(update)
+                        task = asyncio.ensure_future(self._post_update(client, webhook, update))
+                        in_flight[update_id] = task
+                        busy_chats.add(chat_id)
+                        task.add_done_callback(
+                            lambda _, update_id=update_id, chat_id=chat_id:
+                            self._delivery_done(in_flight, busy_chats, update_id, chat_id)
+                        )
+            finally:
+                for task in in_flight.values():
+                    task.cancel()
+                await asyncio.gather(*in_flight.values(), return_exceptions=True)
+
+    def _delivery_done(self, in_flight: Dict[int, asyncio.Task], busy_chats: Set[Any],
+                       update_id: int, chat_id: Any) -> None:
+        in_flight.pop(update_id, None)
+        busy_chats.discard(chat_id)
+        if self._server is not None:
+            asyncio.ensure_future(self._wake_pollers())
+
+    async def _post_update(self, client: httpx.AsyncClient, webhook: Dict[str, Any],
+                           update: Dict[str, Any]) -> None:
+        # Та же сетевая задержка, что и у API: запрос до бота и подтверждение обратно
+        await self._delay('webhook', 0.5)
+        try:
+            response = await client.post(webhook['url'], json=update)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        await self._delay('webhook', 0.5)
+
+        if isinstance(status, int) and 200 <= status < 300:
+            self.webhook_deliveries += 1
+            self._updates = [u for u in self._updates if u['update_id'] != update['update_id']]
+        else:
+            # Telegram повторяет доставку, пока не получит 2xx
+            self.webhook_errors[status] += 1
+            await asyncio.sleep(self.webhook_retry_delay)
+
+    async def _get_webhook_info(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'url': self.webhook['url'] if self.webhook else '',
+            'has_custom_certificate': False,
+            'pending_update_count': len(self._updates),
+        }
+
+
+async def _serve(api: FakeBotApi) -> None:
+    async with api:
+        await asyncio.Event().wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Local fake Telegram Bot API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='base response latency, seconds')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='uniform random latency added on top, seconds')
+    parser.add_argument('--flood-probability', type=float, default=0.0,
+                        help='probability of a 429 answer to an outgoing method')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--chat-limit', type=int, default=None,
+                        help='outgoing messages per minute per group chat')
+    parser.add_argument('--global-limit', type=int, default=None,
+                        help='outgoing messages per second per bot')
+    parser.add_argument('--admin', type=int, action='append', default=[],
+                        help='telegram_id treated as chat administrator (repeatable)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    api = FakeBotApi(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        flood_probability=args.flood_probability,
+        retry_after=args.retry_after,
+        chat_limit=args.chat_limit,
+        global_limit=args.global_limit,
+        admins=args.admin,
+    )
+    try:
+        asyncio.run(_serve(api))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+# loadtest/group_commit_bench.py
+
+"""
+Запись на сессии: commit на каждую запись против группового commit.
+
+Режимы (каждый на чистой базе, users игроков записываются на sessions сессий):
+  per_call - прежний путь обработчика (_join_now): проверки и запись отдельными
+             соединениями, каждое изменение со своим commit;
+  single   - Database.apply_joins с одним запросом: одна транзакция на запись;
+  group    - GroupCommitWriter: users одновременных запросов, пакеты по
+             max_batch/max_delay.
+
+Для group дополнительно проверяется справедливость: в каждой сессии все основные
+игроки нажали раньше всех игроков резерва (нарушения = пары "резерв нажал раньше
+основного"). --jitter задаёт случайную задержку перед постановкой в очередь,
+имитируя разную скорость обработчиков.
+
+Пример:
+    python -m loadtest.group_commit_bench --users 400 --sessions 4 --max-players 12
+    python -m loadtest.group_commit_bench --jitter 0.003 --dir /var/tmp
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import shutil
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as dtime
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+from database.database import Database
+from database.group_commit import GroupCommitWriter
+from database.models import JoinOutcome, JoinRequest
+from handlers.user_handlers import UserCommandHandler
+from loadtest.harness import latency_summary
+
+FIRST_CHAT_ID = -1001000000001
+FIRST_USER_ID = 100000
+
+
+def prepare(workdir: str, args: argparse.Namespace):
+    db = Database(f"{workdir}/bench.db")
+    session_date = date.today() + timedelta(days=1)
+    sessions = [
+        db.create_session(FIRST_CHAT_ID, session_date, dtime(10 + 2 * i, 0),
+                          dtime(12 + 2 * i, 0), args.max_players)
+        for i in range(args.sessions)
+    ]
+    return db, sessions
+
+
+def order_violations(db: Database, session_ids: List[int]) -> int:
+    """Пары (основной, резерв), где игрок резерва нажал раньше основного"""
+    violations = 0
+    for session_id in session_ids:
+        main = [r.registration_time for _, r in db.get_session_players(session_id)]
+        reserve = [r.registration_time for _, r in db.get_session_reserve(session_id)]
+        violations += sum(1 for m in main for r in reserve if r < m)
+    return violations
+
+
+def run_per_call(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix='group_commit_bench_', dir=args.dir)
+    try:
+        db, sessions = prepare(workdir, args)
+        handler = UserCommandHandler(db, logging.getLogger('kpg_malibu_bvb'))
+        latencies = []
+        began = time.perf_counter()
+        for i in range(args.users):
+            update = SimpleNamespace(effective_user=SimpleNamespace(
+                id=FIRST_USER_ID + i, full_name=f"Player {i}"))
+            started = time.perf_counter()
+            handler._join_now(update, sessions[i % len(sessions)])
+            latencies.append(time.perf_counter() - started)
+        elapsed = time.perf_counter() - began
+        return {'mode': 'per_call', 'joins': args.users, 'transactions': args.users,
+                'elapsed_s': round(elapsed, 3), 'joins_per_s': round(args.users / elapsed, 1),
+                'latency': latency_summary(latencies)}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def make_requests(db: Database, sessions, args: argparse.Namespace) -> List[JoinRequest]:
+    players = [db.add_player(f"Player {i}", FIRST_USER_ID + i) for i in range(args.users)]
+    now = datetime.now()
+    return [JoinRequest(session_id=sessions[i % len(sessions)].id, player_id=player.id,
+                        requested_at=now + timedelta(microseconds=i))
+            for i, player in enumerate(players)]
+
+
+def run_single(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix='group_commit_bench_', dir=args.dir)
+    try:
+        db, sessions = prepare(workdir, args)
+        requests = make_requests(db, sessions, args)
+        latencies = []
+        began = time.perf_counter()
+        for request in requests:
+            started = time.perf_counter()
+            db.apply_joins([request])
+            latencies.append(time.perf_counter() - started)
+        elapsed = time.perf_counter() - began
+        return {'mode': 'single', 'joins': args.users, 'transactions': args.users,
+                'elapsed_s': round(elapsed, 3), 'joins_per_s': round(args.users / elapsed, 1),
+                'latency': latency_summary(latencies),
+                'order_violations': order_violations(db, [s.id for s in sessions])}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def run_group(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix='group_commit_bench_', dir=args.dir)
+    try:
+        db, sessions = prepare(workdir, args)
+        requests = make_requests(db, sessions, args)
+        writer = GroupCommitWriter(db, max_batch=args.max_batch, max_delay=args.max_delay)
+        writer.start()
+        rng = random.Random(args.seed)
+        latencies: List[float] = []
+
+        async def join(request: JoinRequest) -> JoinOutcome:
+            started = time.perf_counter()
+            if args.jitter:
+                await asyncio.sleep(rng.uniform(0, args.jitter))
+            outcome = await writer.join(request)
+            latencies.append(time.perf_counter() - started)
+            return outcome
+
+        began = time.perf_counter()
+        outcomes = await asyncio.gather(*(join(r) for r in requests))
+        elapsed = time.perf_counter() - began
+        await writer.stop()
+
+        main = sum(1 for o in outcomes if o == JoinOutcome.MAIN)
+        return {'mode': 'group', 'joins': args.users, 'transactions': writer.batches,
+                'max_batch': writer.max_batch_seen,
+                'elapsed_s': round(elapsed, 3), 'joins_per_s': round(args.users / elapsed, 1),
+                'latency': latency_summary(latencies),
+                'main': main, 'reserve': args.users - main,
+                'order_violations': order_violations(db, [s.id for s in sessions])}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    base = results[0]['joins_per_s']
+    print(f"{'mode':>9} {'joins/s':>9} {'speedup':>8} {'txns':>6} {'p50 ms':>8} "
+          f"{'p99 ms':>8} {'order':>6}")
+    for r in results:
+        print(f"{r['mode']:>9} {r['joins_per_s']:>9.1f} {r['joins_per_s'] / base:>7.2f}x "
+              f"{r['transactions']:>6} {r['latency']['p50_ms']:>8.2f} "
+              f"{r['latency']['p99_ms']:>8.2f} {r.get('order_violations', '-'):>6}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Per-call commits vs group commit for joins')
+    parser.add_argument('--users', type=int, default=400)
+    parser.add_argument('--sessions', type=int, default=4)
+    parser.add_argument('--max-players', type=int, default=12)
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-delay', type=float, default=0.005, help='seconds')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='random delay before submitting, seconds')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--dir', help='directory for database files (default: system temp)')
+    parser.add_argument('--json', help='write the report to this file')
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    logging.getLogger('kpg_malibu_bvb').setLevel(logging.WARNING)
+    results = [run_per_call(args), run_single(args), asyncio.run(run_group(args))]
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
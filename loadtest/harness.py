@@ -0,0 +1,301 @@
+# loadtest/harness.py
+
+"""
+Обвязка для прогона настоящего бота против FakeBotApi.
+
+BotHarness поднимает VolleyballBot на отдельной базе, получает обновления через
+локальный API (long polling или webhook) и замеряет время обработки каждого обновления: от постановки в
+очередь getUpdates до начала и конца обработки хендлерами.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+
+from database.models import STATUS_CODES, PlayerStatus
+from loadtest import bot_log
+from loadtest.fake_bot_api import FakeBotApi
+
+# Группы обработчиков-маркеров: до и после всех хендлеров бота
+FIRST_GROUP = -1000
+LAST_GROUP = 1000
+
+FAKE_TOKEN = '123456:fake-token'
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def latency_summary(values: Sequence[float]) -> Dict[str, float]:
+    """p50/p90/p99/max в миллисекундах"""
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 50) * 1000, 2),
+        'p90_ms': round(percentile(values, 90) * 1000, 2),
+        'p99_ms': round(percentile(values, 99) * 1000, 2),
+        'max_ms': round(max(values) * 1000, 2) if values else 0.0,
+    }
+
+
+class BotHarness:
+    """
+    Бот, подключённый к FakeBotApi, с замерами времени обработки обновлений.
+
+    Args:
+        api: запущенный FakeBotApi
+        db_path: путь к базе, с которой работает бот
+        sample_interval: период опроса глубины очереди обновлений, секунды
+        log_level: уровень логгера бота на время прогона
+        mode: 'polling' или 'webhook' (FakeBotApi доставляет обновления POST-запросами)
+        log_file: файл для лога бота на время прогона (logs/bot.log отключается
+                  всегда; без log_file лог идёт только в консоль)
+    """
+
+    def __init__(self, api: FakeBotApi, db_path: str, sample_interval: float = 0.005,
+                 log_level: int = logging.WARNING, mode: str = 'polling',
+                 log_file: Optional[str] = None):
+        if mode not in ('polling', 'webhook'):
+            raise ValueError(f"Unknown mode: {mode}")
+        self.api = api
+        self.db_path = db_path
+        self.sample_interval = sample_interval
+        self.log_level = log_level
+        self.mode = mode
+        self.log_file = log_file
+        self._log_handler: Optional[logging.FileHandler] = None
+        self._saved_level: Optional[int] = None
+        self._log_detached = False
+
+        self.bot = None
+        self.application: Optional[Application] = None
+        self.started_at: Dict[int, float] = {}
+        self.finished_at: Dict[int, float] = {}
+        self.peak_update_queue = 0
+        self.peak_in_flight = 0
+        self._sampler: Optional[asyncio.Task] = None
+        self._idle = asyncio.Event()
+
+    async def start(self) -> None:
+        """Создание приложения и запуск polling"""
+        # Импорт здесь, чтобы логгер бота настраивался только при запуске
+        from main import VolleyballBot
+
+        bot_logger = logging.getLogger(bot_log.BOT_LOGGER)
+        # logs/bot.log отключается на время прогона (loadtest/bot_log.py)
+        bot_log.acquire()
+        self._log_detached = True
+        if self.log_file:
+            self._log_handler = bot_log.add_run_handler(self.log_file)
+        self._saved_level = bot_logger.level
+        bot_logger.setLevel(self.log_level)
+        self.bot = VolleyballBot(db_path=self.db_path)
+        self.application = self.bot.build_application(token=FAKE_TOKEN, base_url=self.api.base_url)
+        self.application.add_handler(TypeHandler(Update, self._on_start), group=FIRST_GROUP)
+        self.application.add_handler(TypeHandler(Update, self._on_finish), group=LAST_GROUP)
+
+        # Тот же порядок запуска, что и в VolleyballBot.serve
+        await self.application.initialize()
+        await self.application.post_init(self.application)
+        await self.application.start()
+        if self.mode == 'webhook':
+            port = _free_port()
+            started_mode = await self.bot.start_updates(self.application, webhook={
+                'url': f"http://127.0.0.1:{port}/telegram",
+                'listen': '127.0.0.1',
+                'port': port,
+                'secret_token': 'harness-secret',
+                'max_connections': 40,
+            })
+            if started_mode != 'webhook':
+                raise RuntimeError("Webhook mode is unavailable (is tornado installed?)")
+        else:
+            await self.application.updater.start_polling(poll_interval=0, timeout=10)
+        self._sampler = asyncio.create_task(self._sample_queue())
+
+    async def stop(self) -> None:
+        """Остановка polling и приложения"""
+        if self._sampler:
+            self._sampler.cancel()
+        try:
+            if self.application:
+                await self.bot.drain(self.application)
+                await self.application.shutdown()
+                await self.application.post_shutdown(self.application)
+        finally:
+            self._restore_log()
+
+    def _restore_log(self) -> None:
+        """Вернуть логгер бота в состояние до прогона"""
+        if self._log_handler:
+            bot_log.remove_run_handler(self._log_handler)
+            self._log_handler = None
+        if self._saved_level is not None:
+            logging.getLogger(bot_log.BOT_LOGGER).setLevel(self._saved_level)
+            self._saved_level = None
+        if self._log_detached:
+            bot_log.release()
+            self._log_detached = False
+
+    async def __aenter__(self) -> 'BotHarness':
+        try:
+            await self.start()
+        except BaseException:
+            self._restore_log()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    async def run_job(self, callback, data: Any = None, timeout: float = 30) -> None:
+        """Выполнить задачу JobQueue немедленно и дождаться её завершения"""
+        done = asyncio.Event()
+
+        async def wrapper(context: ContextTypes.DEFAULT_TYPE) -> None:
+            try:
+                await callback(context)
+            finally:
+                done.set()
+
+        self.application.job_queue.run_once(wrapper, when=0, data=data)
+        await asyncio.wait_for(done.wait(), timeout)
+
+    @property
+    def in_flight(self) -> int:
+        """Обновления, поставленные в API, но ещё не обработанные ботом"""
+        return len(self.api.pushed_at) - len(self.finished_at)
+
+    async def wait_idle(self, timeout: float = 60) -> bool:
+        """Дождаться обработки всех поставленных обновлений"""
+        deadline = time.monotonic() + timeout
+        while self.in_flight > 0:
+            if time.monotonic() > deadline:
+                return False
+            self._idle.clear()
+            try:
+                await asyncio.wait_for(self._idle.wait(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def handler_latencies(self, update_ids: Optional[Sequence[int]] = None) -> List[float]:
+        """Время работы хендлеров по обновлениям"""
+        ids = update_ids if update_ids is not None else self.finished_at.keys()
+        return [self.finished_at[i] - self.started_at[i] for i in ids if i in self.finished_at]
+
+    def delivery_latencies(self, update_ids: Optional[Sequence[int]] = None) -> List[float]:
+        """Время от постановки обновления в API до начала обработки (доставка и очередь)"""
+        ids = update_ids if update_ids is not None else self.started_at.keys()
+        return [self.started_at[i] - self.api.pushed_at[i] for i in ids if i in self.started_at]
+
+    def end_to_end_latencies(self, update_ids: Optional[Sequence[int]] = None) -> List[float]:
+        """Время от постановки обновления в API до конца обработки"""
+        ids = update_ids if update_ids is not None else self.finished_at.keys()
+        return [self.finished_at[i] - self.api.pushed_at[i] for i in ids if i in self.finished_at]
+
+    async def _on_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        self.started_at[update.update_id] = time.monotonic()
+
+    async def _on_finish(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        self.finished_at[update.update_id] = time.monotonic()
+        if self.in_flight <= 0:
+            self._idle.set()
+
+    async def _sample_queue(self) -> None:
+        while True:
+            self.peak_update_queue = max(self.peak_update_queue, self.application.update_queue.qsize())
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            await asyncio.sleep(self.sample_interval)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def check_rosters(db_path: str, session_ids: Sequence[int],
+                  join_order: Optional[Dict[int, float]] = None,
+                  allow_multiple_sessions: bool = False) -> Dict[str, Any]:
+    """
+    Проверка итоговых составов.
+
+    Args:
+        db_path: путь к базе бота
+        session_ids: проверяемые сессии (одна дата)
+        join_order: telegram_id -> момент первого нажатия "записаться" для проверки порядка резерва
+        allow_multiple_sessions: разрешена ли запись на несколько сессий в день
+
+    Returns:
+        dict: найденные нарушения и составы по сессиям
+    """
+    problems: List[str] = []
+    rosters: Dict[int, Dict[str, Any]] = {}
+    seen: Dict[int, int] = {}
+
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        for session_id in session_ids:
+            max_players = conn.execute(
+                'SELECT max_players FROM sessions WHERE id = ?', (session_id,)
+            ).fetchone()[0]
+            rows = conn.execute('''
+                SELECT p.telegram_id, p.full_name, r.status
+                FROM registrations r
+                JOIN players p ON p.id = r.player_id
+                WHERE r.session_id = ?
+                ORDER BY r.registration_time, r.id
+            ''', (session_id,)).fetchall()
+
+            main = [row for row in rows if row[2] == STATUS_CODES[PlayerStatus.MAIN]]
+            reserve = [row for row in rows if row[2] == STATUS_CODES[PlayerStatus.RESERVE]]
+            rosters[session_id] = {
+                'max_players': max_players,
+                'main': len(main),
+                'reserve': len(reserve),
+            }
+
+            if len(main) > max_players:
+                problems.append(f"session {session_id}: oversubscribed {len(main)}/{max_players}")
+            if reserve and len(main) < max_players:
+                problems.append(f"session {session_id}: {len(reserve)} in reserve "
+                                f"while main has free slots ({len(main)}/{max_players})")
+
+            for telegram_id, full_name, _ in rows:
+                if telegram_id is None:
+                    continue
+                if telegram_id in seen:
+                    if seen[telegram_id] == session_id:
+                        problems.append(f"session {session_id}: user {telegram_id} registered twice")
+                    elif not allow_multiple_sessions:
+                        problems.append(f"user {telegram_id} registered in sessions "
+                                        f"{seen[telegram_id]} and {session_id}")
+                seen[telegram_id] = session_id
+
+            if join_order:
+                actual = [row[0] for row in reserve if row[0] in join_order]
+                expected = sorted(actual, key=lambda telegram_id: join_order[telegram_id])
+                if actual != expected:
+                    problems.append(f"session {session_id}: reserve order differs from arrival order")
+    finally:
+        conn.close()
+
+    return {
+        'ok': not problems,
+        'problems': problems,
+        'rosters': rosters,
+        'registered_users': set(seen),
+    }
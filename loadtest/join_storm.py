@@ -0,0 +1,253 @@
+# loadtest/join_storm.py
+
+"""
+Нагрузочный прогон "записи в 19:00".
+
+Ежедневная задача create_daily_sessions публикует список, после чего N
+виртуальных пользователей с заданной интенсивностью нажимают join_self_<id>,
+часть из них нажимает кнопку дважды, отменяет запись (cancel_my_signup) или
+открывает меню групп (group_menu).
+
+В отчёте: перцентили времени обработки по типам действий, число вызовов Bot API
+на одно действие пользователя, проверка итоговых составов (нет переполнения,
+порядок резерва совпадает с порядком нажатий) и пиковая глубина очереди обновлений.
+
+Пример:
+    python -m loadtest.join_storm --users 200 --arrival-rate 50 --double-tap 0.2
+    python -m loadtest.join_storm --mode webhook
+    python -m loadtest.join_storm --group-commit
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from config.config import BotConfig
+from loadtest.fake_bot_api import FakeBotApi, make_user
+from loadtest.harness import BotHarness, check_rosters, latency_summary
+
+CHAT_ID = -1001000000001
+ADMIN_ID = 1
+FIRST_USER_ID = 100000
+
+
+class JoinStorm:
+    """Генератор нагрузки для одного чата"""
+
+    def __init__(self, harness: BotHarness, api: FakeBotApi, users: int, arrival_rate: float,
+                 double_tap: float, double_tap_delay: float, cancel_rate: float,
+                 group_menu_rate: float, seed: int):
+        self.harness = harness
+        self.api = api
+        self.users = users
+        self.arrival_rate = arrival_rate
+        self.double_tap = double_tap
+        self.double_tap_delay = double_tap_delay
+        self.cancel_rate = cancel_rate
+        self.group_menu_rate = group_menu_rate
+        self.random = random.Random(seed)
+
+        self.actions: Dict[str, List[int]] = defaultdict(list)
+        self.join_order: Dict[int, float] = {}
+        self.cancelled: set = set()
+
+    def _press(self, action: str, user: Dict[str, Any], data: str) -> None:
+        update = self.api.callback_update(user, CHAT_ID, data)
+        self.actions[action].append(update['update_id'])
+        if action == 'join':
+            self.join_order.setdefault(user['id'], time.monotonic())
+        elif action == 'cancel':
+            self.cancelled.add(user['id'])
+
+    async def _user(self, user_id: int, delay: float, session_ids: List[int]) -> None:
+        await asyncio.sleep(delay)
+        user = make_user(user_id)
+        session_id = self.random.choice(session_ids)
+
+        self._press('join', user, f"join_self_{session_id}")
+        if self.random.random() < self.double_tap:
+            await asyncio.sleep(self.random.uniform(0, self.double_tap_delay))
+            self._press('double_tap', user, f"join_self_{session_id}")
+
+        if self.random.random() < self.group_menu_rate:
+            await asyncio.sleep(self.random.uniform(0.1, 1.0))
+            self._press('group_menu', user, 'group_menu')
+
+        if self.random.random() < self.cancel_rate:
+            await asyncio.sleep(self.random.uniform(0.5, 3.0))
+            self._press('cancel', user, 'cancel_my_signup')
+
+    async def run(self, session_ids: List[int]) -> None:
+        tasks = []
+        arrival = 0.0
+        for n in range(self.users):
+            arrival += self.random.expovariate(self.arrival_rate)
+            tasks.append(asyncio.create_task(self._user(FIRST_USER_ID + n, arrival, session_ids)))
+        await asyncio.gather(*tasks)
+
+
+async def run_storm(args: argparse.Namespace) -> Dict[str, Any]:
+    api = FakeBotApi(
+        port=0,
+        latency=args.latency,
+        jitter=args.jitter,
+        flood_probability=args.flood_probability,
+        chat_limit=args.chat_limit,
+        admins=[ADMIN_ID],
+        seed=args.seed,
+    )
+    workdir = tempfile.mkdtemp(prefix='join_storm_')
+    db_path = os.path.join(workdir, 'storm.db')
+    BotConfig.GROUP_COMMIT['enabled'] = args.group_commit
+
+    async with api:
+        harness = BotHarness(api, db_path, log_level=args.log_level, mode=args.mode)
+        async with harness:
+            # Публикация списка ежедневной задачей
+            await harness.run_job(harness.bot.create_daily_sessions, data={'chat_id': CHAT_ID})
+            tomorrow = datetime.now().date() + timedelta(days=1)
+            sessions = harness.bot.db.get_sessions_for_date(CHAT_ID, tomorrow)
+            session_ids = [s.id for s in sessions]
+            if not session_ids:
+                raise RuntimeError("Daily job did not create any sessions")
+
+            api.reset_stats()
+            storm = JoinStorm(
+                harness, api,
+                users=args.users,
+                arrival_rate=args.arrival_rate,
+                double_tap=args.double_tap,
+                double_tap_delay=args.double_tap_delay,
+                cancel_rate=args.cancel_rate,
+                group_menu_rate=args.group_menu_rate,
+                seed=args.seed,
+            )
+            started = time.monotonic()
+            await storm.run(session_ids)
+            drained = await harness.wait_idle(timeout=args.timeout)
+            elapsed = time.monotonic() - started
+            writer = harness.application.bot_data.get('join_writer')
+            group_commit = writer.summary() if writer else None
+
+    total_actions = sum(len(ids) for ids in storm.actions.values())
+    # getUpdates зависит от режима polling, а не от действий пользователей
+    api_calls = sum(count for method, count in api.calls.items() if method != 'getUpdates')
+    rosters = check_rosters(
+        db_path, session_ids,
+        join_order={uid: t for uid, t in storm.join_order.items() if uid not in storm.cancelled},
+    )
+    missing = sorted(set(storm.join_order) - storm.cancelled - rosters['registered_users'])
+    if missing:
+        rosters['problems'].append(f"{len(missing)} joined users are not registered")
+        rosters['ok'] = False
+
+    return {
+        'mode': args.mode,
+        'group_commit': group_commit,
+        'users': args.users,
+        'actions': total_actions,
+        'elapsed_s': round(elapsed, 3),
+        'drained': drained,
+        'throughput_updates_per_s': round(total_actions / elapsed, 2) if elapsed else 0.0,
+        'handler_latency': {
+            action: latency_summary(harness.handler_latencies(ids))
+            for action, ids in storm.actions.items()
+        },
+        'delivery_latency': latency_summary(harness.delivery_latencies()),
+        'end_to_end_latency': latency_summary(harness.end_to_end_latencies()),
+        'api_calls': dict(api.calls),
+        'api_calls_per_action': round(api_calls / total_actions, 2) if total_actions else 0.0,
+        'flood_errors': dict(api.flood_errors),
+        'peak_update_queue': harness.peak_update_queue,
+        'peak_in_flight': harness.peak_in_flight,
+        'roster_ok': rosters['ok'],
+        'roster_problems': rosters['problems'],
+        'rosters': rosters['rosters'],
+        'db_path': db_path,
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\nJoin storm ({report['mode']}): {report['users']} users, {report['actions']} actions "
+          f"in {report['elapsed_s']}s ({report['throughput_updates_per_s']} updates/s)")
+    if not report['drained']:
+        print("WARNING: not all updates were processed before timeout")
+    if report['group_commit']:
+        print(report['group_commit'])
+
+    print("\nHandler latency:")
+    for action, summary in report['handler_latency'].items():
+        print(f"  {action:<12} n={summary['count']:<5} p50={summary['p50_ms']}ms "
+              f"p90={summary['p90_ms']}ms p99={summary['p99_ms']}ms max={summary['max_ms']}ms")
+    delivery = report['delivery_latency']
+    print(f"  {'delivery':<12} n={delivery['count']:<5} p50={delivery['p50_ms']}ms "
+          f"p90={delivery['p90_ms']}ms p99={delivery['p99_ms']}ms max={delivery['max_ms']}ms")
+    e2e = report['end_to_end_latency']
+    print(f"  {'end-to-end':<12} n={e2e['count']:<5} p50={e2e['p50_ms']}ms "
+          f"p90={e2e['p90_ms']}ms p99={e2e['p99_ms']}ms max={e2e['max_ms']}ms")
+
+    print(f"\nBot API calls per user action (excluding getUpdates): {report['api_calls_per_action']}")
+    for method, count in sorted(report['api_calls'].items()):
+        print(f"  {method}: {count}")
+    if report['flood_errors']:
+        print(f"  429 responses: {report['flood_errors']}")
+
+    print(f"\nPeak update queue depth: {report['peak_update_queue']} "
+          f"(in flight: {report['peak_in_flight']})")
+
+    print("\nRosters:")
+    for session_id, roster in report['rosters'].items():
+        print(f"  session {session_id}: {roster['main']}/{roster['max_players']} main, "
+              f"{roster['reserve']} reserve")
+    if report['roster_ok']:
+        print("  OK: no oversubscription, reserve order preserved")
+    for problem in report['roster_problems']:
+        print(f"  PROBLEM: {problem}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Replay the daily autopost join storm')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--arrival-rate', type=float, default=20.0,
+                        help='mean user arrivals per second (Poisson)')
+    parser.add_argument('--double-tap', type=float, default=0.2,
+                        help='share of users pressing the join button twice')
+    parser.add_argument('--double-tap-delay', type=float, default=0.3,
+                        help='max delay between the two presses, seconds')
+    parser.add_argument('--cancel-rate', type=float, default=0.1)
+    parser.add_argument('--group-menu-rate', type=float, default=0.05)
+    parser.add_argument('--latency', type=float, default=0.03,
+                        help='fake Bot API latency, seconds')
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--flood-probability', type=float, default=0.0)
+    parser.add_argument('--chat-limit', type=int, default=None)
+    parser.add_argument('--mode', choices=('polling', 'webhook'), default='polling',
+                        help='how the bot receives updates from the fake Bot API')
+    parser.add_argument('--group-commit', action='store_true',
+                        help='batch joins with GroupCommitWriter (concurrent update processing)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--timeout', type=float, default=300.0)
+    parser.add_argument('--log-level', default='WARNING', help='bot logger level during the run')
+    parser.add_argument('--json', help='write the report as JSON to this file')
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+
+    report = asyncio.run(run_storm(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
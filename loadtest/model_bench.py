@@ -0,0 +1,254 @@
+# loadtest/model_bench.py
+
+"""
+Модели строк: dataclass с разбором всех полей против __slots__ с
+декодированием при чтении.
+
+База строится один раз (sessions сессий по players игроков), затем каждый
+вариант моделей проверяется в отдельном процессе с ограничением адресного
+пространства --memory-limit (как MemoryLimit=256M в kpg_malibu_bvb.service):
+
+  dataclass - прежние модели: @dataclass с __dict__, все поля строки
+              декодируются при создании объекта;
+  slots     - текущие модели (database/models.py) и фабрика строк roster_row.
+
+Замеры:
+  build us/row  - строки состава -> объекты (Player, Registration);
+  fetch us/row  - то же вместе с выборкой (cursor.row_factory для slots);
+  KB/roster     - память составов в кэше (tracemalloc), до и после чтения
+                  всех полей;
+  rosters/limit - сколько составов поместится в лимит сверх занятого процессом.
+
+Пример:
+    python -m loadtest.model_bench --sessions 2000 --players 20
+    python -m loadtest.model_bench --memory-limit 128
+"""
+
+import argparse
+import gc
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from datetime import time as dtime
+from typing import Any, Callable, Dict, List, Optional
+
+from database.database import Database, roster_row
+from database.encoding import decode_datetime
+from database.models import STATUS_BY_CODE, PlayerStatus, JoinRequest
+
+FIRST_CHAT_ID = -1001000000001
+FIRST_USER_ID = 100000
+
+ROSTER_QUERY = '''
+    SELECT p.id, p.full_name, p.telegram_id, p.created_at, r.*
+    FROM players p
+    JOIN registrations r ON p.id = r.player_id
+    WHERE r.session_id = ?
+    ORDER BY r.registration_time
+'''
+
+
+@dataclass
+class DataclassPlayer:
+    """Прежняя модель игрока"""
+    id: int
+    full_name: str
+    telegram_id: Optional[int]
+    created_at: datetime
+    guest_of: Optional[int] = None
+
+
+@dataclass
+class DataclassRegistration:
+    """Прежняя модель регистрации"""
+    id: int
+    session_id: int
+    player_id: int
+    status: PlayerStatus
+    registration_time: datetime
+    registered_by_id: Optional[int] = None
+    registered_by_name: Optional[str] = None
+
+
+def dataclass_row(cursor, row):
+    """Прежний разбор строки состава: все поля сразу"""
+    return (
+        DataclassPlayer(
+            id=row[0],
+            full_name=row[1],
+            telegram_id=row[2],
+            created_at=decode_datetime(row[3])
+        ),
+        DataclassRegistration(
+            id=row[4],
+            session_id=row[5],
+            player_id=row[6],
+            status=STATUS_BY_CODE[row[7]],
+            registration_time=decode_datetime(row[8]),
+            registered_by_id=row[9],
+            registered_by_name=row[10]
+        )
+    )
+
+
+MODELS: Dict[str, Callable] = {
+    'dataclass': dataclass_row,
+    'slots': roster_row,
+}
+
+
+def build_database(path: str, args: argparse.Namespace) -> None:
+    db = Database(path)
+    players = [db.add_player(f"Player {i}", FIRST_USER_ID + i).id
+               for i in range(args.players * 4)]
+    now = datetime.now()
+    first_day = date.today() + timedelta(days=1)
+    for n in range(args.sessions):
+        session = db.create_session(FIRST_CHAT_ID - n % 10, first_day + timedelta(days=n // 40),
+                                    dtime(8 + n % 4 * 2, 0), dtime(10 + n % 4 * 2, 0),
+                                    args.players * 2 // 3)
+        first = n % 4 * args.players
+        db.apply_joins([
+            JoinRequest(session_id=session.id, player_id=player_id,
+                        requested_at=now + timedelta(microseconds=i),
+                        registered_by_id=FIRST_USER_ID if i % 5 == 0 else None,
+                        registered_by_name='Player 0' if i % 5 == 0 else None,
+                        one_session_per_day=False)
+            for i, player_id in enumerate(players[first:first + args.players])
+        ])
+
+
+def read_all(roster) -> None:
+    for player, registration in roster:
+        (player.created_at, registration.status, registration.registration_time)
+
+
+def rss_kb() -> int:
+    """Текущий RSS процесса, КБ"""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+def run_model(name: str, db_path: str, memory_limit_mb: int, repeat: int) -> Dict[str, Any]:
+    """Замеры одного варианта моделей (в отдельном процессе)"""
+    limit = memory_limit_mb * 2**20
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    factory = MODELS[name]
+    result: Dict[str, Any] = {'model': name}
+
+    conn = sqlite3.connect(db_path)
+    try:
+        session_ids = [row[0] for row in conn.execute('SELECT id FROM sessions ORDER BY id')]
+        rows = {sid: conn.execute(ROSTER_QUERY, (sid,)).fetchall() for sid in session_ids}
+        total_rows = sum(len(r) for r in rows.values())
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for session_rows in rows.values():
+                [factory(None, row) for row in session_rows]
+        result['build_us_per_row'] = round(
+            (time.perf_counter() - started) / (repeat * total_rows) * 1e6, 3)
+
+        started = time.perf_counter()
+        for sid in session_ids:
+            cursor = conn.cursor()
+            cursor.row_factory = factory
+            cursor.execute(ROSTER_QUERY, (sid,)).fetchall()
+        result['fetch_us_per_row'] = round((time.perf_counter() - started) / total_rows * 1e6, 3)
+    finally:
+        conn.close()
+
+    gc.collect()
+    rss_before = rss_kb()
+    tracemalloc.start()
+    try:
+        cache = {sid: [factory(None, row) for row in session_rows]
+                 for sid, session_rows in rows.items()}
+        cached = tracemalloc.get_traced_memory()[0]
+        for roster in cache.values():
+            read_all(roster)
+        cached_read = tracemalloc.get_traced_memory()[0]
+    except MemoryError:
+        result['error'] = f"MemoryError under {memory_limit_mb} MiB"
+        return result
+    finally:
+        tracemalloc.stop()
+
+    rosters = len(cache)
+    per_roster = cached / rosters
+    result.update({
+        'rosters': rosters,
+        'rows': total_rows,
+        'bytes_per_row': round(cached / total_rows, 1),
+        'kb_per_roster': round(per_roster / 1024, 2),
+        'kb_per_roster_read': round(cached_read / rosters / 1024, 2),
+        'rss_mb': round(rss_kb() / 1024, 1),
+        'rosters_per_limit': int((limit - rss_before * 1024) / (cached_read / rosters)),
+    })
+    return result
+
+
+def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    workdir = tempfile.mkdtemp(prefix='model_bench_', dir=args.dir)
+    try:
+        db_path = os.path.join(workdir, 'bench.db')
+        build_database(db_path, args)
+        results = []
+        # spawn: процесс без памяти родителя, лимит действует только на замер
+        context = multiprocessing.get_context('spawn')
+        for name in MODELS:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                results.append(pool.submit(run_model, name, db_path, args.memory_limit,
+                                           args.repeat).result())
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_report(results: List[Dict[str, Any]], memory_limit: int) -> None:
+    print(f"memory limit {memory_limit} MiB")
+    print(f"{'model':>10} {'build us/row':>13} {'fetch us/row':>13} {'B/row':>7} "
+          f"{'KB/roster':>10} {'+read':>7} {'RSS MB':>7} {'rosters/limit':>14}")
+    for r in results:
+        if 'error' in r:
+            print(f"{r['model']:>10} {r['error']}")
+            continue
+        print(f"{r['model']:>10} {r['build_us_per_row']:>13.3f} {r['fetch_us_per_row']:>13.3f} "
+              f"{r['bytes_per_row']:>7.1f} {r['kb_per_roster']:>10.2f} "
+              f"{r['kb_per_roster_read']:>7.2f} {r['rss_mb']:>7.1f} {r['rosters_per_limit']:>14}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Row models: dataclass vs __slots__ with lazy decoding')
+    parser.add_argument('--sessions', type=int, default=2000)
+    parser.add_argument('--players', type=int, default=20, help='registrations per session')
+    parser.add_argument('--repeat', type=int, default=5, help='passes of the build measurement')
+    parser.add_argument('--memory-limit', type=int, default=256,
+                        help='address space limit of the measuring process, MiB')
+    parser.add_argument('--dir', help='directory for database files (default: system temp)')
+    parser.add_argument('--json', help='write the report to this file')
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    logging.getLogger('kpg_malibu_bvb').setLevel(logging.WARNING)
+    results = run(args)
+    print_report(results, args.memory_limit)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+# loadtest/multi_instance.py
+
+"""
+Проверка работы двух процессов бота с одной базой (LEADER_ELECTION=1).
+
+Запускает FakeBotApi и два процесса main.py в общем рабочем каталоге и проверяет:
+  - автопубликацию выполняет только лидер: в каждом чате ровно один список;
+  - getUpdates вызывает только лидер: команда получает один ответ, конфликтов
+    polling (409) нет;
+  - после SIGKILL лидера второй процесс забирает аренду и отвечает на команды;
+  - create_session идемпотентен при одновременных вызовах из двух процессов;
+  - после SIGTERM процесс освобождает аренду.
+
+Автопубликация проверяется минутным тиком, поэтому прогон занимает 1-2 минуты.
+
+Пример:
+    python -m loadtest.multi_instance --chats 5 --ttl 6
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from datetime import time as dtime
+from typing import Any, Dict, List, Optional
+
+from config.config import BotConfig
+from database.database import Database
+from loadtest.fake_bot_api import FakeBotApi, make_user
+from loadtest.harness import FAKE_TOKEN
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIRST_CHAT_ID = -1001000000001
+ADMIN_ID = 1
+USER_ID = 100000
+
+
+def _create_sessions(db_path: str, start_at: float, count: int) -> int:
+    """Создание одних и тех же сессий из отдельного процесса; сколько создано этим процессом"""
+    db = Database(db_path)
+    time.sleep(max(0.0, start_at - time.time()))
+    created = 0
+    session_date = date.today() + timedelta(days=1)
+    for i in range(count):
+        _, is_new = db.get_or_create_session(FIRST_CHAT_ID - i, session_date,
+                                             dtime(14, 0), dtime(16, 0), 6)
+        created += is_new
+    return created
+
+
+def check_idempotent_create(workdir: str, count: int) -> Dict[str, Any]:
+    db_path = os.path.join(workdir, 'idempotency.db')
+    Database(db_path)
+    start_at = time.time() + 1
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        created = list(pool.map(_create_sessions, [db_path] * 2, [start_at] * 2, [count] * 2))
+    rows = Database(db_path).get_general_stats()['total_sessions']
+    return {'sessions': count, 'created_per_process': created, 'rows': rows,
+            'ok': rows == count and sum(created) == count}
+
+
+class Instance:
+    """Процесс main.py"""
+
+    def __init__(self, name: str, workdir: str, env: Dict[str, str]):
+        self.name = name
+        self.workdir = workdir
+        self.env = env
+        self.process: Optional[asyncio.subprocess.Process] = None
+
+    async def start(self) -> None:
+        log = open(os.path.join(self.workdir, f"{self.name}.out"), 'w')
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(PROJECT_ROOT, 'main.py'),
+            cwd=self.workdir, env=self.env, stdout=log, stderr=log
+        )
+        log.close()
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    async def stop(self, sig: int = signal.SIGTERM, timeout: float = 20) -> Optional[int]:
+        if self.process.returncode is None:
+            self.process.send_signal(sig)
+        try:
+            return await asyncio.wait_for(self.process.wait(), timeout)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            return await self.process.wait()
+
+
+async def wait_for(predicate, timeout: float, interval: float = 0.1) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        await asyncio.sleep(interval)
+    return predicate()
+
+
+async def ask_sessions(api: FakeBotApi, chat_id: int, timeout: float) -> List[Dict[str, Any]]:
+    """Команда /sessions и ответы на неё"""
+    sent = len(api.outbox)
+    api.command_update(make_user(USER_ID), chat_id, 'sessions')
+    await wait_for(lambda: len(api.outbox) > sent, timeout)
+    await asyncio.sleep(1)  # второй ответ, если бы команду обработали оба процесса
+    return [m for m in api.outbox[sent:] if m['chat_id'] == chat_id]
+
+
+def lease_pid(db: Database) -> Optional[int]:
+    lease = db.get_lease('scheduler')
+    if not lease or lease[1] < time.time():
+        return None
+    return int(lease[0].split(':')[1])
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix='multi_instance_')
+    os.makedirs(os.path.join(workdir, BotConfig.DATABASE['path']))
+    db = Database(os.path.join(workdir, BotConfig.DATABASE['path'], BotConfig.DATABASE['name']))
+    chats = [FIRST_CHAT_ID - i for i in range(args.chats)]
+    due = datetime.now().time().replace(second=0, microsecond=0)
+    for chat_id in chats:
+        db.add_chat(chat_id, due, slots=BotConfig.DEFAULT_CHAT_SLOTS)
+
+    report: Dict[str, Any] = {'workdir': workdir}
+    api = FakeBotApi(port=0, admins=[ADMIN_ID])
+    await api.start()
+    env = {
+        **os.environ,
+        'PYTHONPATH': PROJECT_ROOT,
+        'TELEGRAM_BOT_TOKEN': FAKE_TOKEN,
+        'TELEGRAM_API_BASE_URL': api.base_url,
+        'LEADER_ELECTION': '1',
+        'LEADER_TTL': str(args.ttl),
+        'LEADER_RENEW_INTERVAL': str(args.ttl / 3),
+        'WEBHOOK_URL': '',
+    }
+    env.pop('TELEGRAM_CHAT_ID', None)
+    instances = [Instance(name, workdir, env) for name in ('a', 'b')]
+    try:
+        for instance in instances:
+            await instance.start()
+
+        await wait_for(lambda: lease_pid(db) is not None, 30)
+        leader_pid = lease_pid(db)
+        leader = next((i for i in instances if i.pid == leader_pid), None)
+        follower = next((i for i in instances if i is not leader), None)
+        report['leader'] = leader.name if leader else None
+        if leader is None:
+            return report
+
+        # Автопубликация на ближайшем минутном тике
+        tomorrow = date.today() + timedelta(days=1)
+        await wait_for(lambda: len(db.get_chats_with_sessions(tomorrow, posted=True)) == len(chats), 90, 0.5)
+        await wait_for(lambda: len([m for m in api.outbox if m['method'] == 'sendMessage'])
+                       >= len(chats), 10)
+        await asyncio.sleep(3)
+        boards = Counter(m['chat_id'] for m in api.outbox if m['method'] == 'sendMessage')
+        report['boards_per_chat'] = sorted(set(boards[c] for c in chats))
+
+        replies = await ask_sessions(api, chats[0], 10)
+        report['replies_before_failover'] = len(replies)
+
+        # Конфликты после падения лидера - его брошенный long poll, их не считаем
+        report['polling_conflicts'] = api.stats()['polling_conflicts']
+
+        # Падение лидера: аренда не освобождается и должна истечь
+        killed_at = time.monotonic()
+        await leader.stop(signal.SIGKILL)
+        await wait_for(lambda: lease_pid(db) == follower.pid, args.ttl * 3)
+        report['takeover_s'] = round(time.monotonic() - killed_at, 2)
+        replies = await ask_sessions(api, chats[1], args.ttl * 2)
+        report['replies_after_failover'] = len(replies)
+
+        report['exit_code'] = await follower.stop(signal.SIGTERM)
+        report['lease_released'] = db.get_lease('scheduler') is None
+    finally:
+        for instance in instances:
+            if instance.process and instance.process.returncode is None:
+                await instance.stop(signal.SIGKILL)
+        await api.stop()
+
+    report['idempotent_create'] = check_idempotent_create(workdir, args.sessions)
+    report['ok'] = (
+        report.get('boards_per_chat') == [1]
+        and report.get('replies_before_failover') == 1
+        and report.get('replies_after_failover') == 1
+        and report.get('exit_code') == 0
+        and report.get('lease_released', False)
+        and report.get('polling_conflicts') == 0
+        and report['idempotent_create']['ok']
+    )
+    if report['ok'] and not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Two bot processes against one database')
+    parser.add_argument('--chats', type=int, default=5)
+    parser.add_argument('--ttl', type=float, default=6, help='leader lease, seconds')
+    parser.add_argument('--sessions', type=int, default=200,
+                        help='sessions created concurrently by two processes')
+    parser.add_argument('--keep', action='store_true', help='keep the working directory')
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report.get('ok') else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+# loadtest/render_bench.py
+
+"""
+Текст списка сессий: прежняя сборка целиком против BoardRenderer.
+
+Составы строятся в памяти (база не участвует): sessions сессий одной даты по
+main игроков в основном составе и reserve в резерве, часть игроков записана
+другими (" (by ...)"), часть - гости без ссылки. Каждое обновление меняет
+одну сессию (запись в резерв или уход из него, по кругу), после чего список
+собирается заново:
+
+  full     - прежний шаблон update_session_message / show_sessions:
+             все блоки и все имена форматируются при каждом обновлении;
+  renderer - utils/board.py: собирается только блок изменившейся сессии,
+             строки игроков и остальные блоки берутся из кэша;
+  cold     - BoardRenderer с пустым кэшем на каждое обновление (первый
+             показ списка, например после перезапуска).
+
+Тексты всех вариантов сверяются на каждом обновлении.
+
+Пример:
+    python -m loadtest.render_bench --sessions 6 --main 10 --reserve 80
+"""
+
+import argparse
+import json
+import logging
+import time
+from datetime import date, datetime
+from datetime import time as dtime
+from typing import Any, Callable, Dict, List, Tuple
+
+from config.config import BotConfig
+from database.models import Player, PlayerStatus, Registration, Session
+from loadtest.harness import percentile
+from utils.board import BoardRenderer
+from utils.formatting import format_players_list, format_reserve_list
+
+FIRST_USER_ID = 100000
+DATE_FORMAT = BotConfig.FORMAT_SETTINGS['date_format']
+TIME_FORMAT = BotConfig.FORMAT_SETTINGS['time_format']
+
+Rosters = Dict[int, Tuple[List[Tuple[Player, Registration]], List[Tuple[Player, Registration]]]]
+
+
+def full_render(day: date, sessions: List[Session], rosters: Rosters) -> str:
+    """Прежний шаблон: весь текст заново"""
+    full_message = f"<b>📅 Date:</b> {day.strftime(DATE_FORMAT)}\n\n"
+    for i, session in enumerate(sessions, 1):
+        players, reserve = rosters[session.id]
+        full_message += f"""<b>⏰ Session {i}:</b> <i>{session.time_start.strftime(TIME_FORMAT)} – {session.time_end.strftime(TIME_FORMAT)}</i>
+👥 Max players: {session.max_players}
+<b>Players:</b>  
+{format_players_list(players, session.max_players)}
+
+<b>Reserve:</b>
+{format_reserve_list(reserve)}
+
+"""
+    return full_message
+
+
+def us_summary(values: List[float]) -> Dict[str, float]:
+    """p50/p90/p99/max в микросекундах (latency_summary округляет до 10 мкс)"""
+    return {
+        'count': len(values),
+        'p50_us': round(percentile(values, 50) * 1e6, 1),
+        'p90_us': round(percentile(values, 90) * 1e6, 1),
+        'p99_us': round(percentile(values, 99) * 1e6, 1),
+        'max_us': round(max(values) * 1e6, 1),
+    }
+
+
+def make_entry(n: int, session_id: int, status: PlayerStatus) -> Tuple[Player, Registration]:
+    guest = n % 7 == 0
+    player = Player(n, f"Player <{n}> Игрок", None if guest else FIRST_USER_ID + n, datetime.now())
+    by_other = guest or n % 5 == 0
+    registration = Registration(n, session_id, n, status, datetime.now(),
+                                registered_by_id=FIRST_USER_ID if by_other else None,
+                                registered_by_name='Organizer' if by_other else None)
+    return player, registration
+
+
+def build(args: argparse.Namespace) -> Tuple[date, List[Session], Rosters]:
+    day = date.today()
+    sessions, rosters = [], {}
+    n = 0
+    for s in range(args.sessions):
+        session = Session(s + 1, day, dtime(8 + s * 2 % 14, 0), dtime(10 + s * 2 % 14, 0), args.main)
+        players = [make_entry(n + i, session.id, PlayerStatus.MAIN) for i in range(args.main)]
+        n += args.main
+        reserve = [make_entry(n + i, session.id, PlayerStatus.RESERVE) for i in range(args.reserve)]
+        n += args.reserve
+        sessions.append(session)
+        rosters[session.id] = (players, reserve)
+    return day, sessions, rosters
+
+
+def updates(args: argparse.Namespace, sessions: List[Session], rosters: Rosters):
+    """Изменения по одной сессии: запись в резерв, затем уход"""
+    next_id = 10 ** 6
+    for u in range(args.updates):
+        session = sessions[u % len(sessions)]
+        reserve = rosters[session.id][1]
+        if (u // len(sessions)) % 2 == 0:
+            reserve.append(make_entry(next_id, session.id, PlayerStatus.RESERVE))
+            next_id += 1
+        else:
+            reserve.pop()
+        yield
+
+
+def run_variant(name: str, render: Callable[[date, List[Session], Rosters], str],
+                args: argparse.Namespace) -> Dict[str, Any]:
+    day, sessions, rosters = build(args)
+    latencies = []
+    for _ in updates(args, sessions, rosters):
+        started = time.perf_counter()
+        text = render(day, sessions, rosters)
+        latencies.append(time.perf_counter() - started)
+        if text != full_render(day, sessions, rosters):
+            raise AssertionError(f"{name}: text differs from the full template")
+    return {'variant': name, 'length': len(text), 'render': us_summary(latencies)}
+
+
+def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    renderer = BoardRenderer(DATE_FORMAT, TIME_FORMAT)
+    results = [
+        run_variant('full', full_render, args),
+        run_variant('renderer', renderer.render, args),
+        run_variant('cold', lambda *a: BoardRenderer(DATE_FORMAT, TIME_FORMAT).render(*a), args),
+    ]
+    results[1]['sessions_rendered'] = renderer.sessions_rendered
+    results[1]['sessions_reused'] = renderer.sessions_reused
+    return results
+
+
+def print_report(results: List[Dict[str, Any]], args: argparse.Namespace) -> None:
+    print(f"{args.sessions} sessions x ({args.main} main + {args.reserve} reserve), "
+          f"{args.updates} updates, {results[0]['length']} chars")
+    print(f"{'variant':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    for r in results:
+        render = r['render']
+        print(f"{r['variant']:>9} {render['p50_us']:>7.1f}us {render['p90_us']:>7.1f}us "
+              f"{render['p99_us']:>7.1f}us {render['max_us']:>7.1f}us")
+    cached = results[1]
+    print(f"renderer: {cached['sessions_rendered']} session blocks rendered, "
+          f"{cached['sessions_reused']} reused")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Sessions list rendering: full rebuild vs cached fragments')
+    parser.add_argument('--sessions', type=int, default=6, help='sessions on the date')
+    parser.add_argument('--main', type=int, default=10, help='main players per session')
+    parser.add_argument('--reserve', type=int, default=80, help='reserve players per session')
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--json', help='write the report to this file')
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    logging.getLogger('kpg_malibu_bvb').setLevel(logging.WARNING)
+    results = run(args)
+    print_report(results, args)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
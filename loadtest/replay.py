@@ -0,0 +1,351 @@
+# loadtest/replay.py
+
+"""
+Воспроизведение реальной нагрузки из логов.
+
+Источник трассы:
+  * logs/bot.log - строки "Button pressed: ...", "Command: ... | User: ... | Chat: ..."
+    и строки обработчиков записи/отмены, по которым восстанавливается пользователь и чат;
+  * logs/workload.jsonl - компактная запись, которую ведёт сам бот при
+    WORKLOAD_CAPTURE=1 (utils/workload.py).
+
+Трасса воспроизводится против копии базы и FakeBotApi со скоростью 1x, 10x
+или максимально быстро (--speed max), с отчётом о времени обработки. Лог бота
+во время прогона в logs/bot.log не пишется (при необходимости - --log-file).
+
+Примеры:
+    python -m loadtest.replay logs/bot.log --speed 10
+    python -m loadtest.replay logs/workload.jsonl --db database/kpg_malibu_bvb.db --speed max
+    python -m loadtest.replay logs/bot.log --save-trace trace.jsonl --dry-run
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from config.config import BotConfig
+from database.database import Database
+from loadtest.fake_bot_api import FakeBotApi, make_user
+from loadtest.harness import BotHarness, latency_summary
+
+DEFAULT_CHAT_ID = -1001000000001
+DEFAULT_USER_ID = 1
+
+LOG_LINE = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - [\w.]+ - \w+ - (.*)$')
+BUTTON_LINE = re.compile(r'^Button pressed: (\S+)$')
+COMMAND_LINE = re.compile(r'^Command: (\w+) \| User: (-?\d+) \| Chat: (-?\d+)$')
+CHAT_LINE = re.compile(r'^Updating message \d+ in chat (-?\d+)$')
+USER_LINES = [
+    re.compile(r'^Joining session \d+ for user (\d+)$'),
+    re.compile(r'^User (\d+) trying to cancel registration$'),
+    re.compile(r'^Attempting to leave session \d+ for user (\d+)$'),
+]
+
+# Команды, которые обработчики логируют по итогам нажатия кнопки
+BUTTON_COMMANDS = {'join', 'leave'}
+# Команда, которую логирует обработчик текстового сообщения со списком игроков
+TEXT_COMMANDS = {'add_group'}
+# Административные команды: их авторы считаются админами чата при воспроизведении
+ADMIN_COMMANDS = {'create_session', 'toggle_bot', 'stats', 'schedule', 'slots', 'capacity'}
+# Кнопки, которые нажимаются в личном чате с ботом
+PRIVATE_CALLBACKS = ('register_group', 'manage_groups', 'back_to_group_menu',
+                     'private_', 'remove_player_', 'back_to_remove_menu')
+
+
+class TraceEvent(NamedTuple):
+    """Одно входящее обновление трассы"""
+    t: float
+    kind: str           # callback | command | text
+    user_id: int
+    user_name: Optional[str]
+    chat_id: int
+    data: str
+
+    def to_json(self) -> str:
+        return json.dumps({'t': self.t, 'k': self.kind, 'u': self.user_id, 'n': self.user_name,
+                           'c': self.chat_id, 'd': self.data},
+                          ensure_ascii=False, separators=(',', ':'))
+
+    @property
+    def action(self) -> str:
+        """Тип действия для отчёта: callback_data без ID, имя команды или text"""
+        if self.kind == 'callback':
+            return re.sub(r'(_-?\d+)+$', '', self.data)
+        if self.kind == 'command':
+            return self.data.split()[0]
+        return 'text'
+
+
+def _finalize(raw: Iterable[Dict[str, Any]], default_chat: int, default_user: int) -> List[TraceEvent]:
+    events = []
+    for event in raw:
+        user_id = event.get('u') or default_user
+        chat_id = event.get('c')
+        if chat_id is None:
+            is_private = event['k'] == 'callback' and event['d'].startswith(PRIVATE_CALLBACKS)
+            chat_id = user_id if is_private else default_chat
+        events.append(TraceEvent(event['t'], event['k'], user_id, event.get('n'), chat_id, event['d']))
+    events.sort(key=lambda e: e.t)
+    return events
+
+
+def parse_bot_log(path: str, default_chat: Optional[int] = None,
+                  default_user: int = DEFAULT_USER_ID) -> List[TraceEvent]:
+    """
+    Восстановление трассы из logs/bot.log.
+
+    Пользователь и чат для нажатия кнопки берутся из следующих за "Button pressed"
+    строк того же обработчика. Если их нет, используются default_user и последний
+    встреченный групповой чат.
+    """
+    raw: List[Dict[str, Any]] = []
+    pending: Optional[Dict[str, Any]] = None
+    last_group_chat = default_chat
+
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            match = LOG_LINE.match(line.rstrip('\n'))
+            if not match:
+                continue
+            timestamp = datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S,%f').timestamp()
+            message = match.group(2)
+
+            if button := BUTTON_LINE.match(message):
+                pending = {'t': timestamp, 'k': 'callback', 'u': None, 'c': None, 'd': button.group(1)}
+                raw.append(pending)
+                continue
+
+            if command := COMMAND_LINE.match(message):
+                name, user_id, chat_id = command.group(1), int(command.group(2)), int(command.group(3))
+                if chat_id < 0:
+                    last_group_chat = chat_id
+                if name in BUTTON_COMMANDS and pending is not None:
+                    pending['u'] = pending['u'] or user_id
+                    pending['c'] = chat_id
+                    pending = None
+                elif name in TEXT_COMMANDS:
+                    # Сами имена в лог не пишутся - подставляем условные
+                    raw.append({'t': timestamp, 'k': 'text', 'u': user_id, 'c': chat_id,
+                                'd': 'Guest 1, Guest 2'})
+                elif name not in BUTTON_COMMANDS:
+                    raw.append({'t': timestamp, 'k': 'command', 'u': user_id, 'c': chat_id,
+                                'd': f"/{name}"})
+                continue
+
+            if pending is None:
+                continue
+            for pattern in USER_LINES:
+                if user := pattern.match(message):
+                    pending['u'] = int(user.group(1))
+            if (chat := CHAT_LINE.match(message)) and pending['c'] is None:
+                pending['c'] = int(chat.group(1))
+
+    return _finalize(raw, last_group_chat or DEFAULT_CHAT_ID, default_user)
+
+
+def load_capture(path: str, default_chat: Optional[int] = None,
+                 default_user: int = DEFAULT_USER_ID) -> List[TraceEvent]:
+    """Загрузка записи utils.workload.WorkloadRecorder (или сохранённой трассы)"""
+    with open(path, encoding='utf-8') as f:
+        raw = [json.loads(line) for line in f if line.strip()]
+    return _finalize(raw, default_chat or DEFAULT_CHAT_ID, default_user)
+
+
+def load_trace(path: str, default_chat: Optional[int] = None) -> List[TraceEvent]:
+    """Загрузка трассы: JSONL-запись или текстовый лог бота"""
+    with open(path, encoding='utf-8', errors='replace') as f:
+        first = f.readline().lstrip()
+    if first.startswith('{'):
+        return load_capture(path, default_chat)
+    return parse_bot_log(path, default_chat)
+
+
+def copy_database(source: str, target: str, shift_days: int = 0) -> None:
+    """Копия базы через backup API (безопасно при работающем боте)"""
+    src = sqlite3.connect(f"file:{os.path.abspath(source)}?mode=ro", uri=True)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+    if shift_days:
+        # Копия старой базы переводится в текущий формат: дата - число дней
+        Database(target)
+        conn = sqlite3.connect(target)
+        try:
+            conn.execute('UPDATE sessions SET date = date + ?', (shift_days,))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+async def replay(events: List[TraceEvent], db_path: str, speed: float,
+                 latency: float = 0.03, jitter: float = 0.02, admins: Iterable[int] = (),
+                 timeout: float = 600.0, log_level: str = 'WARNING',
+                 log_file: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Воспроизведение трассы против копии базы.
+
+    Args:
+        events: упорядоченная трасса
+        db_path: копия базы, с которой работает бот
+        speed: множитель скорости (0 - без пауз между событиями)
+        log_file: куда писать лог бота во время прогона (None - никуда)
+    """
+    admins = set(admins) | {e.user_id for e in events
+                            if e.kind == 'command' and e.action.lstrip('/') in ADMIN_COMMANDS}
+    api = FakeBotApi(port=0, latency=latency, jitter=jitter, admins=admins)
+
+    # Сообщения со списками, на которые ссылаются сессии в копии базы
+    conn = sqlite3.connect(db_path)
+    try:
+        board_messages = conn.execute(
+            'SELECT DISTINCT chat_id, message_id FROM sessions '
+            'WHERE chat_id IS NOT NULL AND message_id IS NOT NULL'
+        ).fetchall()
+    finally:
+        conn.close()
+    for chat_id, message_id in board_messages:
+        api.seed_message(chat_id, message_id)
+
+    actions: Dict[str, List[int]] = defaultdict(list)
+    async with api:
+        harness = BotHarness(api, db_path, log_level=log_level, log_file=log_file)
+        async with harness:
+            started = time.monotonic()
+            for event in events:
+                if speed:
+                    delay = started + (event.t - events[0].t) / speed - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+
+                user = make_user(event.user_id, event.user_name)
+                if event.kind == 'callback':
+                    update = api.callback_update(user, event.chat_id, event.data)
+                elif event.kind == 'command':
+                    command, *args = event.data.lstrip('/').split()
+                    update = api.command_update(user, event.chat_id, command, args)
+                else:
+                    update = api.text_update(user, event.chat_id, event.data)
+                actions[event.action].append(update['update_id'])
+
+            drained = await harness.wait_idle(timeout=timeout)
+            elapsed = time.monotonic() - started
+
+    return {
+        'events': len(events),
+        'trace_duration_s': round(events[-1].t - events[0].t, 3),
+        'elapsed_s': round(elapsed, 3),
+        'speed': speed or 'max',
+        'drained': drained,
+        'handler_latency': {action: latency_summary(harness.handler_latencies(ids))
+                            for action, ids in sorted(actions.items())},
+        'end_to_end_latency': latency_summary(harness.end_to_end_latencies()),
+        'api_calls': dict(api.calls),
+        'flood_errors': dict(api.flood_errors),
+        'peak_update_queue': harness.peak_update_queue,
+        'peak_in_flight': harness.peak_in_flight,
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\nReplayed {report['events']} events ({report['trace_duration_s']}s of traffic) "
+          f"at speed {report['speed']} in {report['elapsed_s']}s")
+    if not report['drained']:
+        print("WARNING: not all updates were processed before timeout")
+    print("\nHandler latency:")
+    for action, summary in report['handler_latency'].items():
+        print(f"  {action:<22} n={summary['count']:<5} p50={summary['p50_ms']}ms "
+              f"p90={summary['p90_ms']}ms p99={summary['p99_ms']}ms max={summary['max_ms']}ms")
+    e2e = report['end_to_end_latency']
+    print(f"  {'end-to-end':<22} n={e2e['count']:<5} p50={e2e['p50_ms']}ms "
+          f"p90={e2e['p90_ms']}ms p99={e2e['p99_ms']}ms max={e2e['max_ms']}ms")
+    print("\nBot API calls:")
+    for method, count in sorted(report['api_calls'].items()):
+        print(f"  {method}: {count}")
+    print(f"\nPeak update queue depth: {report['peak_update_queue']} "
+          f"(in flight: {report['peak_in_flight']})")
+
+
+def _parse_speed(value: str) -> float:
+    if value.lower() in ('max', '0'):
+        return 0.0
+    return float(value.rstrip('x'))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Replay production traffic against a DB copy')
+    parser.add_argument('trace', help='logs/bot.log or a JSONL workload capture')
+    parser.add_argument('--db', default='database/kpg_malibu_bvb.db', help='database to copy')
+    parser.add_argument('--speed', type=_parse_speed, default=1.0, help='1, 10, 10x or max')
+    parser.add_argument('--since', help='only events after "YYYY-MM-DD HH:MM"')
+    parser.add_argument('--until', help='only events before "YYYY-MM-DD HH:MM"')
+    parser.add_argument('--chat', type=int, help='chat id for events without one')
+    parser.add_argument('--admin', type=int, action='append', default=[])
+    parser.add_argument('--no-shift-dates', action='store_true',
+                        help='keep session dates instead of moving the trace day to today')
+    parser.add_argument('--latency', type=float, default=0.03)
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--log-file', help='write the replayed bot log to this file')
+    parser.add_argument('--save-trace', help='write the parsed trace as JSONL')
+    parser.add_argument('--dry-run', action='store_true', help='parse only, do not replay')
+    parser.add_argument('--json', help='write the report as JSON to this file')
+    args = parser.parse_args()
+
+    # Воспроизведённый трафик не должен дописываться в разбираемую трассу
+    trace_path = os.path.realpath(args.trace)
+    if args.log_file and os.path.realpath(args.log_file) == trace_path:
+        parser.error('--log-file must differ from the trace being replayed')
+    if (BotConfig.WORKLOAD_CAPTURE['enabled']
+            and os.path.realpath(BotConfig.WORKLOAD_CAPTURE['path']) == trace_path):
+        parser.error('WORKLOAD_CAPTURE would append the replay to the trace; unset it')
+
+    events = load_trace(args.trace, args.chat)
+    if args.since:
+        since = datetime.strptime(args.since, '%Y-%m-%d %H:%M').timestamp()
+        events = [e for e in events if e.t >= since]
+    if args.until:
+        until = datetime.strptime(args.until, '%Y-%m-%d %H:%M').timestamp()
+        events = [e for e in events if e.t < until]
+    if not events:
+        print("No events in trace")
+        return
+
+    print(f"Trace: {len(events)} events from {datetime.fromtimestamp(events[0].t)} "
+          f"to {datetime.fromtimestamp(events[-1].t)}")
+    if args.save_trace:
+        with open(args.save_trace, 'w', encoding='utf-8') as f:
+            for event in events:
+                f.write(event.to_json() + '\n')
+    if args.dry_run:
+        return
+
+    shift_days = 0
+    if not args.no_shift_dates:
+        # Списки публикуются на завтра - переносим день трассы на сегодня
+        shift_days = (datetime.now().date() - datetime.fromtimestamp(events[0].t).date()).days
+    db_copy = os.path.join(tempfile.mkdtemp(prefix='replay_'), 'replay.db')
+    copy_database(args.db, db_copy, shift_days)
+
+    report = asyncio.run(replay(events, db_copy, args.speed, args.latency, args.jitter,
+                                args.admin, log_level=args.log_level,
+                                log_file=args.log_file))
+    report['db_path'] = db_copy
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+# loadtest/schema_bench.py
+
+"""
+Состав сессии и размер базы: прежний текстовый формат против целых чисел.
+
+Для каждого формата строится база с одинаковыми данными: sessions сессий по
+main+reserve игроков. text - прежняя схема (ISO-строки, 'HH:MM', статус
+'main'/'reserve') и прежний разбор строк: каждое поле каждой строки
+декодируется сразу (datetime.fromisoformat / strptime). integer - та же база
+после миграции Database (SCHEMA_VERSION 1) и текущие get_session_players /
+get_session_reserve, поля декодируются только при чтении.
+
+Замеры:
+  roster      - основной состав и резерв сессии (как при обновлении списка),
+                объекты не читаются дальше имени;
+  roster+read - то же, но читаются все поля (время записи, статус, created_at);
+  decode      - только перевод уже выбранных строк в объекты, мкс на строку;
+  size        - размер файла после VACUUM.
+
+Пример:
+    python -m loadtest.schema_bench --sessions 200 --main 12 --reserve 8
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+from database.database import Database, roster_row
+from database.models import STATUS_CODES, Player, PlayerStatus, Registration
+from loadtest.harness import latency_summary
+
+FIRST_CHAT_ID = -1001000000001
+FIRST_USER_ID = 100000
+
+# Схема до перехода на целые числа
+TEXT_SCHEMA = '''
+    CREATE TABLE players (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        full_name TEXT NOT NULL,
+        telegram_id INTEGER UNIQUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        guest_of INTEGER,
+        name_key TEXT
+    );
+    CREATE TABLE sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date DATE NOT NULL,
+        time_start TIME NOT NULL,
+        time_end TIME NOT NULL,
+        max_players INTEGER NOT NULL,
+        message_id INTEGER,
+        chat_id INTEGER
+    );
+    CREATE TABLE registrations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        player_id INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        registration_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        registered_by_id INTEGER,
+        registered_by_name TEXT,
+        FOREIGN KEY (session_id) REFERENCES sessions (id) ON DELETE CASCADE,
+        FOREIGN KEY (player_id) REFERENCES players (id) ON DELETE CASCADE
+    );
+    CREATE UNIQUE INDEX idx_sessions_chat_date_start ON sessions (chat_id, date, time_start);
+    CREATE INDEX idx_registrations_player ON registrations (player_id, session_id);
+'''
+
+ROSTER_QUERY = '''
+    SELECT p.id, p.full_name, p.telegram_id, p.created_at, r.*
+    FROM players p
+    JOIN registrations r ON p.id = r.player_id
+    WHERE r.session_id = ? AND r.status = ?
+    ORDER BY r.registration_time
+'''
+
+
+def build_text_database(path: str, args: argparse.Namespace) -> List[int]:
+    """База в прежнем формате; ID сессий"""
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(TEXT_SCHEMA)
+        started = datetime(2025, 1, 1, 19, 0)
+        per_session = args.main + args.reserve
+        conn.executemany(
+            'INSERT INTO players (full_name, telegram_id, created_at, name_key) VALUES (?, ?, ?, ?)',
+            [(f"Player {i}", FIRST_USER_ID + i,
+              (started - timedelta(days=30, seconds=i)).isoformat(), f"player {i}")
+             for i in range(per_session * 4)]
+        )
+        session_ids = []
+        for n in range(args.sessions):
+            day = date(2025, 1, 1) + timedelta(days=n // 4)
+            cursor = conn.execute(
+                'INSERT INTO sessions (date, time_start, time_end, max_players, message_id, chat_id) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (day.isoformat(), f"{10 + 2 * (n % 4)}:00", f"{12 + 2 * (n % 4)}:00",
+                 args.main, 1000 + n, FIRST_CHAT_ID)
+            )
+            session_ids.append(cursor.lastrowid)
+            first_player = (n % 4) * per_session
+            conn.executemany(
+                'INSERT INTO registrations (session_id, player_id, status, registration_time) '
+                'VALUES (?, ?, ?, ?)',
+                [(cursor.lastrowid, first_player + i + 1,
+                  (PlayerStatus.MAIN if i < args.main else PlayerStatus.RESERVE).value,
+                  (started + timedelta(days=n // 4, microseconds=137 * i)).isoformat())
+                 for i in range(per_session)]
+            )
+        conn.commit()
+        return session_ids
+    finally:
+        conn.close()
+
+
+def text_rows_to_objects(rows) -> List[Tuple[Player, Registration]]:
+    """Прежний разбор строк состава: все поля декодируются сразу"""
+    results = []
+    for row in rows:
+        player = Player(
+            id=row[0],
+            full_name=row[1],
+            telegram_id=row[2],
+            created_at=datetime.fromisoformat(row[3])
+        )
+        registration = Registration(
+            id=row[4],
+            session_id=row[5],
+            player_id=row[6],
+            status=PlayerStatus(row[7]),
+            registration_time=datetime.fromisoformat(row[8]),
+            registered_by_id=row[9] if row[9] is not None else None,
+            registered_by_name=row[10]
+        )
+        results.append((player, registration))
+    return results
+
+
+def text_roster(path: str, session_id: int, status: PlayerStatus) -> List[Tuple[Player, Registration]]:
+    """Прежний get_session_players / get_session_reserve"""
+    with sqlite3.connect(path) as conn:
+        conn.execute('PRAGMA foreign_keys = ON')
+        rows = conn.execute(ROSTER_QUERY, (session_id, status.value)).fetchall()
+        return text_rows_to_objects(rows)
+
+
+def select_rows(path: str, session_id: int, status) -> list:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(ROSTER_QUERY, (session_id, status)).fetchall()
+    finally:
+        conn.close()
+
+
+def read_all(roster: List[Tuple[Player, Registration]]) -> None:
+    for player, registration in roster:
+        (player.created_at, registration.status, registration.registration_time)
+
+
+def measure(fetch: Callable[[int], List[Tuple[Player, Registration]]], session_ids: List[int],
+            repeat: int, read: bool) -> Dict[str, Any]:
+    latencies = []
+    for _ in range(repeat):
+        for session_id in session_ids:
+            started = time.perf_counter()
+            roster = fetch(session_id)
+            if read:
+                read_all(roster)
+            latencies.append(time.perf_counter() - started)
+    return latency_summary(latencies)
+
+
+def measure_decode(rows, to_objects, repeat: int, read: bool) -> float:
+    """Перевод выбранных строк в объекты, мкс на строку"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        roster = to_objects(rows)
+        if read:
+            read_all(roster)
+    return round((time.perf_counter() - started) / (repeat * len(rows)) * 1e6, 3)
+
+
+def database_size(path: str) -> int:
+    # Соединения Database закрываются сборщиком мусора, а смене журнала они мешают
+    gc.collect()
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute('PRAGMA journal_mode=DELETE')
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+    return os.path.getsize(path)
+
+
+def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    workdir = tempfile.mkdtemp(prefix='schema_bench_', dir=args.dir)
+    try:
+        text_path = os.path.join(workdir, 'text.db')
+        integer_path = os.path.join(workdir, 'integer.db')
+        session_ids = build_text_database(text_path, args)
+        shutil.copy(text_path, integer_path)
+        started = time.perf_counter()
+        db = Database(integer_path)
+        migration_s = time.perf_counter() - started
+
+        registrations = args.sessions * (args.main + args.reserve)
+        probe = session_ids[len(session_ids) // 2]
+        text_rows = select_rows(text_path, probe, PlayerStatus.MAIN.value)
+        integer_rows = select_rows(integer_path, probe, STATUS_CODES[PlayerStatus.MAIN])
+
+        def text_fetch(session_id: int):
+            return (text_roster(text_path, session_id, PlayerStatus.MAIN)
+                    + text_roster(text_path, session_id, PlayerStatus.RESERVE))
+
+        def integer_fetch(session_id: int):
+            return db.get_session_players(session_id) + db.get_session_reserve(session_id)
+
+        def integer_rows_to_objects(rows):
+            return [roster_row(None, row) for row in rows]
+
+        results = []
+        for name, fetch, rows, to_objects, path in (
+            ('text', text_fetch, text_rows, text_rows_to_objects, text_path),
+            ('integer', integer_fetch, integer_rows, integer_rows_to_objects, integer_path),
+        ):
+            # Оба формата должны давать одинаковые составы
+            assert [(p.id, r.id) for p, r in fetch(probe)] == \
+                [(p.id, r.id) for p, r in text_fetch(probe)]
+            results.append({
+                'format': name,
+                'registrations': registrations,
+                'roster': measure(fetch, session_ids, args.repeat, read=False),
+                'roster_read': measure(fetch, session_ids, args.repeat, read=True),
+                'decode_us_per_row': measure_decode(rows, to_objects, args.decode_repeat, False),
+                'decode_read_us_per_row': measure_decode(rows, to_objects, args.decode_repeat, True),
+                'size_bytes': database_size(path),
+            })
+        results[1]['migration_s'] = round(migration_s, 3)
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    print(f"{results[0]['registrations']} registrations")
+    print(f"{'format':>8} {'size KB':>8} {'B/reg':>6} {'roster p50':>11} {'+read p50':>10} "
+          f"{'decode us':>10} {'+read us':>9}")
+    for r in results:
+        print(f"{r['format']:>8} {r['size_bytes'] / 1024:>8.1f} "
+              f"{r['size_bytes'] / r['registrations']:>6.1f} "
+              f"{r['roster']['p50_ms']:>9.3f}ms {r['roster_read']['p50_ms']:>8.3f}ms "
+              f"{r['decode_us_per_row']:>10.3f} {r['decode_read_us_per_row']:>9.3f}")
+    if 'migration_s' in results[-1]:
+        print(f"migration of the text database: {results[-1]['migration_s']:.3f}s")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Roster fetch and database size: text vs integer columns')
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--main', type=int, default=12, help='main players per session')
+    parser.add_argument('--reserve', type=int, default=8, help='reserve players per session')
+    parser.add_argument('--repeat', type=int, default=3, help='passes over all sessions')
+    parser.add_argument('--decode-repeat', type=int, default=2000,
+                        help='conversions of one prefetched roster')
+    parser.add_argument('--dir', help='directory for database files (default: system temp)')
+    parser.add_argument('--json', help='write the report to this file')
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    logging.getLogger('kpg_malibu_bvb').setLevel(logging.WARNING)
+    results = run(args)
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
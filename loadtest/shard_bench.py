@@ -0,0 +1,135 @@
+# loadtest/shard_bench.py
+
+"""
+Пропускная способность записи в зависимости от числа шардов.
+
+Для каждой конфигурации создаётся чистая база с chats чатами (по одной сессии
+в каждом) и заранее созданными игроками, после чего writers потоков записывают
+игроков на сессии своих чатов (register_player - та же запись, что и при нажатии
+"записаться"). Конфигурация 0 - одна база без шардирования.
+
+В одной базе писатели ждут общую блокировку записи (с паузами busy timeout),
+в шардах ждут только писатели того же шарда. Записи в разные файлы к тому же
+идут параллельно (sqlite3 отпускает GIL), так что на нескольких ядрах разница больше.
+
+Пример:
+    python -m loadtest.shard_bench --shards 0,1,2,4,8 --chats 32 --writers 8
+    python -m loadtest.shard_bench --dir /var/tmp   # на реальном диске, а не в tmpfs
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from datetime import time as dtime
+from typing import Any, Dict, List, Tuple
+
+from database.models import PlayerStatus
+from database.sharding import open_database
+from loadtest.harness import latency_summary
+
+FIRST_CHAT_ID = -1001000000001
+
+
+def run_config(shards: int, args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix='shard_bench_', dir=args.dir)
+    try:
+        db = open_database(f"{workdir}/bench.db", shards=shards)
+        session_date = date.today() + timedelta(days=1)
+        chats = [FIRST_CHAT_ID - i for i in range(args.chats)]
+        sessions = {
+            chat_id: db.create_session(chat_id, session_date, dtime(14, 0), dtime(16, 0), 6).id
+            for chat_id in chats
+        }
+        players = [db.add_player(f"Player {i}", 100000 + i).id for i in range(args.players)]
+
+        def writer(index: int, latencies: List[float], errors: List[str],
+                   start: threading.Barrier) -> None:
+            own_chats = chats[index::args.writers]
+            start.wait()
+            for n in range(args.writes):
+                session_id = sessions[own_chats[n % len(own_chats)]]
+                player_id = players[(index * args.writes + n) % len(players)]
+                status = PlayerStatus.MAIN if n % 2 else PlayerStatus.RESERVE
+                began = time.perf_counter()
+                try:
+                    db.register_player(session_id, player_id, status)
+                except Exception as e:
+                    errors.append(f"{type(e).__name__}: {e}")
+                latencies.append(time.perf_counter() - began)
+
+        def run_writers() -> Tuple[float, List[float], List[str]]:
+            latencies: List[List[float]] = [[] for _ in range(args.writers)]
+            errors: List[str] = []
+            start = threading.Barrier(args.writers + 1)
+            threads = [threading.Thread(target=writer, args=(i, latencies[i], errors, start))
+                       for i in range(args.writers)]
+            for thread in threads:
+                thread.start()
+            start.wait()
+            began = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            return (time.perf_counter() - began,
+                    [x for chunk in latencies for x in chunk], errors)
+
+        # Первый проход создаёт регистрации и копии игроков в шардах,
+        # замеряется второй - повторные записи тех же игроков
+        run_writers()
+        elapsed, latencies, errors = run_writers()
+
+        if hasattr(db, 'close'):
+            db.close()
+        writes = args.writers * args.writes
+        return {
+            'shards': shards,
+            'writes': writes,
+            'errors': len(errors),
+            'elapsed_s': round(elapsed, 3),
+            'writes_per_s': round(writes / elapsed, 1),
+            'latency': latency_summary(latencies),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    base = results[0]['writes_per_s']
+    print(f"CPUs: {os.cpu_count()}")
+    print(f"{'shards':>8} {'writes/s':>10} {'speedup':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for r in results:
+        print(f"{r['shards'] or 'single':>8} {r['writes_per_s']:>10.1f} "
+              f"{r['writes_per_s'] / base:>7.2f}x {r['latency']['p50_ms']:>8.2f} "
+              f"{r['latency']['p99_ms']:>8.2f} {r['errors']:>7}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Write throughput vs number of database shards')
+    parser.add_argument('--shards', default='0,1,2,4,8',
+                        help='comma-separated shard counts, 0 - single database')
+    parser.add_argument('--chats', type=int, default=32)
+    parser.add_argument('--players', type=int, default=500)
+    parser.add_argument('--writers', type=int, default=8, help='concurrent writer threads')
+    parser.add_argument('--writes', type=int, default=300, help='writes per writer')
+    parser.add_argument('--dir', help='directory for database files (default: system temp)')
+    parser.add_argument('--json', help='write the report to this file')
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    logging.getLogger('kpg_malibu_bvb').setLevel(logging.WARNING)
+    results = [run_config(int(n), args) for n in args.shards.split(',')]
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
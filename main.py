@@ -1,11 +1,18 @@
 # main.py
 
+import asyncio
+import functools
 import os
 import logging
-from datetime import datetime, timedelta
+import secrets
+import signal
+from datetime import datetime, time, timedelta
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
 import pytz
 from telegram import Update
+from telegram.error import TelegramError
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -14,13 +21,21 @@ from telegram.ext import (
     filters,
     ContextTypes,
     JobQueue,
+    TypeHandler,
 )
 
 from config.config import BotConfig
-from database.database import Database
+from database.backup import backup_databases
+from database.group_commit import GroupCommitWriter
+from database.maintenance import maintain_databases
+from database.sharding import database_files, open_database
 from handlers.user_handlers import UserCommandHandler
 from handlers.admin_handlers import AdminCommandHandler
 from utils.logger import setup_logger
+from utils.workload import WorkloadRecorder
+from utils.loop_watchdog import LoopWatchdog
+from utils.http_transport import build_request
+from utils.leader import LeaderElection
 
 # Load environment variables
 load_dotenv()
@@ -47,68 +62,419 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 class VolleyballBot:
     """Main bot class"""
     
-    def __init__(self):
+    def __init__(self, db_path: Optional[str] = None):
         """Initialize bot"""
-        self.db = Database(f"{BotConfig.DATABASE['path']}{BotConfig.DATABASE['name']}")
+        self.db_path = db_path or f"{BotConfig.DATABASE['path']}{BotConfig.DATABASE['name']}"
+        self.db = open_database(self.db_path, shards=BotConfig.DATABASE['shards'])
         self.user_handler = UserCommandHandler(self.db, logger)
         self.admin_handler = AdminCommandHandler(self.db, logger)
+        self.watchdog: Optional[LoopWatchdog] = None
+        self.updates_request = None
+        self.outbound_request = None
+        self._autopost_lock = asyncio.Lock()
+        self.leader: Optional[LeaderElection] = None
+        if BotConfig.LEADER_ELECTION['enabled']:
+            self.leader = LeaderElection(
+                self.db,
+                ttl=BotConfig.LEADER_ELECTION['ttl'],
+                renew_interval=BotConfig.LEADER_ELECTION['renew_interval'],
+                logger=logger
+            )
+        if BotConfig.LOOP_WATCHDOG['enabled']:
+            self.watchdog = LoopWatchdog(
+                threshold=BotConfig.LOOP_WATCHDOG['threshold'],
+                interval=BotConfig.LOOP_WATCHDOG['interval'],
+                keep_worst=BotConfig.LOOP_WATCHDOG['keep_worst'],
+                logger=logger
+            )
 
     async def create_daily_sessions(self, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Create daily sessions"""
         try:
-            chat_id = context.job.data['chat_id']
+            chat_id = int(context.job.data['chat_id'])
             logger.info(f"Creating daily sessions for chat {chat_id}")
             
-            # Simulate create_session command from system
-            update = Update(0)  # Create dummy Update
-            update.effective_chat = type('obj', (object,), {'id': chat_id})
-            await self.admin_handler.create_session(update, context)
+            await self.admin_handler.post_daily_sessions(context, chat_id)
             
             logger.info("Daily sessions created successfully")
         except Exception as e:
             logger.error(f"Error creating daily sessions: {e}", exc_info=True)
 
-    def run(self):
-            """Run the bot"""
+    async def autopost(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Post tomorrow's sessions lists in every chat whose autopost time has come"""
+        if self._autopost_lock.locked():
+            logger.warning("Previous autopost round is still running, skipping")
+            return
+
+        async with self._autopost_lock:
+            now = datetime.now()
+            tomorrow = now.date() + timedelta(days=1)
+
+            # Catch up on posts missed during a restart, but not across midnight
+            since = now - timedelta(minutes=BotConfig.AUTOPOST['catchup_minutes'])
+            since_time = since.time() if since.date() == now.date() else None
+            posted = self.db.get_chats_with_sessions(tomorrow, posted=True)
+            chats = [chat for chat in self.db.get_chats_due(since_time, now.time())
+                     if chat.chat_id not in posted]
+            if not chats:
+                return
+
+            logger.info(f"Autopost for {tomorrow}: {len(chats)} chats")
+            semaphore = asyncio.Semaphore(BotConfig.AUTOPOST['concurrency'])
+
+            async def post(chat_id: int) -> bool:
+                async with semaphore:
+                    try:
+                        await self.admin_handler.post_sessions_list(context, chat_id, tomorrow)
+                        return True
+                    except Exception as e:
+                        logger.error(f"Autopost to chat {chat_id} failed: {e}", exc_info=True)
+                        return False
+
+            started = datetime.now()
+            results = await asyncio.gather(*(post(chat.chat_id) for chat in chats))
+            logger.info(f"Autopost finished: {sum(results)}/{len(chats)} chats "
+                        f"in {(datetime.now() - started).total_seconds():.1f} s")
+
+    async def pregenerate_sessions(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Create sessions of all autopost chats for the schedule horizon, pre-render tomorrow's boards"""
+        tomorrow = datetime.now().date() + timedelta(days=1)
+        chat_ids = [chat.chat_id for chat in self.db.get_chats_due(None, time.max)]
+        if not chat_ids:
+            return
+        started = datetime.now()
+        try:
+            created = await asyncio.to_thread(
+                self.admin_handler.schedule_engine.pregenerate, chat_ids, tomorrow
+            )
+            rendered = self.admin_handler.prerender_boards(context, chat_ids, tomorrow)
+        except Exception as e:
+            logger.error(f"Session pre-generation failed: {e}", exc_info=True)
+            return
+        logger.info(f"Pre-generated {created} sessions for {len(chat_ids)} chats, "
+                    f"{rendered} boards pre-rendered in {(datetime.now() - started).total_seconds():.2f} s")
+
+    async def check_integrity(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Check the database and sweep orphan rows in a worker thread"""
+        started = datetime.now()
+        try:
+            report = await asyncio.to_thread(
+                self.db.check_integrity,
+                BotConfig.INTEGRITY['batch_size'],
+                BotConfig.INTEGRITY['pause']
+            )
+        except Exception as e:
+            logger.error(f"Integrity check failed: {e}", exc_info=True)
+            return
+
+        elapsed = (datetime.now() - started).total_seconds()
+        orphans = ', '.join(f"{name}={count}" for name, count in report['orphans'].items())
+        if report['quick_check'] != 'ok':
+            logger.error(f"Integrity check: quick_check reported {report['quick_check']}")
+        level = logging.WARNING if any(report['orphans'].values()) else logging.INFO
+        logger.log(level, f"Integrity check in {elapsed:.1f} s, orphans removed: {orphans}")
+
+    async def backup_database(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Compressed snapshots of the database files in a worker thread"""
+        settings = BotConfig.BACKUP
+        files = database_files(self.db_path, BotConfig.DATABASE['shards'])
+        try:
+            reports = await asyncio.to_thread(backup_databases, files, settings['dir'], settings)
+        except Exception as e:
+            logger.error(f"Database backup failed: {e}", exc_info=True)
+            return
+
+        for report in reports:
+            level = logging.WARNING if report['single_step'] else logging.INFO
+            logger.log(level, f"Backup {report['path']}: {report['size'] // 1024} KB -> "
+                              f"{report['compressed'] // 1024} KB in {report['duration']:.2f} s "
+                              f"(+{report['compress_time']:.2f} s gzip), {report['steps']} steps, "
+                              f"longest {report['longest_step'] * 1000:.1f} ms, "
+                              f"{report['restarts']} restarts"
+                              f"{', single step' if report['single_step'] else ''}, "
+                              f"{len(report['removed'])} old removed")
+
+    async def maintain_database(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Incremental vacuum, ANALYZE/optimize and WAL checkpoint in a worker thread"""
+        files = database_files(self.db_path, BotConfig.DATABASE['shards'])
+        try:
+            reports = await asyncio.to_thread(maintain_databases, files, BotConfig.MAINTENANCE)
+        except Exception as e:
+            logger.error(f"Database maintenance failed: {e}", exc_info=True)
+            return
+
+        for report in reports:
+            before, after = report['before'], report['after']
+            logger.info(f"Maintenance {report['path']}: {before['size'] // 1024} KB -> "
+                        f"{after['size'] // 1024} KB, freelist {before['freelist_count']} -> "
+                        f"{after['freelist_count']} pages ({report['vacuum_steps']} vacuum steps, "
+                        f"longest {report['longest_step'] * 1000:.1f} ms), "
+                        f"WAL {before['wal_size'] // 1024} KB -> {after['wal_size'] // 1024} KB, "
+                        f"analyze {report['analyze_time']:.2f} s, total {report['duration']:.2f} s")
+            if not report['incremental']:
+                logger.warning(f"Maintenance {report['path']}: auto_vacuum is not INCREMENTAL, "
+                               f"free pages are not released")
+
+    def leader_only(self, callback):
+        """Job callback that runs only in the leader process"""
+        @functools.wraps(callback)
+        async def job(context: ContextTypes.DEFAULT_TYPE) -> None:
+            if self.leader and not self.leader.is_leader:
+                return
+            await callback(context)
+        return job
+
+    async def post_init(self, application: Application) -> None:
+        """Start runtime services once the event loop is running"""
+        application.bot_data['http_pools'] = [
+            request.stats for request in (self.updates_request, self.outbound_request) if request
+        ]
+        if self.watchdog:
+            application.bot_data['loop_watchdog'] = self.watchdog
+            self.watchdog.start()
+        if BotConfig.GROUP_COMMIT['enabled']:
+            writer = GroupCommitWriter(
+                self.db,
+                max_batch=BotConfig.GROUP_COMMIT['max_batch'],
+                max_delay=BotConfig.GROUP_COMMIT['max_delay'],
+                logger=logger
+            )
+            writer.start()
+            application.bot_data['join_writer'] = writer
+
+    async def post_shutdown(self, application: Application) -> None:
+        """Stop runtime services"""
+        if self.watchdog:
+            await self.watchdog.stop()
+        writer = application.bot_data.pop('join_writer', None)
+        if writer:
+            await writer.stop()
+            logger.info(writer.summary())
+
+    def build_application(self, token: Optional[str] = None,
+                          base_url: Optional[str] = None) -> Application:
+        """Create application with all handlers and jobs registered"""
+        builder = Application.builder().token(token or BotConfig.TOKEN)
+
+        # Custom Bot API server (e.g. local stand-in for load tests)
+        base_url = base_url or BotConfig.API_BASE_URL
+        if base_url:
+            base_file_url = BotConfig.API_BASE_FILE_URL or base_url.replace('/bot', '/file/bot', 1)
+            builder = builder.base_url(base_url).base_file_url(base_file_url)
+            logger.info(f"Using Bot API at {base_url}")
+
+        # Separate connection pools: long polling never blocks outgoing calls
+        stats_window = BotConfig.HTTP['stats_window']
+        self.updates_request = build_request('updates', BotConfig.HTTP['updates'], stats_window)
+        self.outbound_request = build_request('outbound', BotConfig.HTTP['outbound'], stats_window)
+        builder = builder.request(self.outbound_request).get_updates_request(self.updates_request)
+
+        # Bounded queue makes the webhook listener / poller wait instead of piling up updates
+        builder = builder.update_queue(asyncio.Queue(maxsize=BotConfig.UPDATES['queue_size']))
+
+        # Group commit batches joins only when several handlers run at once
+        if BotConfig.GROUP_COMMIT['enabled']:
+            builder = builder.concurrent_updates(BotConfig.GROUP_COMMIT['concurrent_updates'])
+
+        application = builder.post_init(self.post_init).post_shutdown(self.post_shutdown).build()
+
+        # Add error handler
+        application.add_error_handler(error_handler)
+
+        # Workload capture runs before all other handlers
+        if BotConfig.WORKLOAD_CAPTURE['enabled']:
+            recorder = WorkloadRecorder(BotConfig.WORKLOAD_CAPTURE['path'])
+            application.add_handler(TypeHandler(Update, recorder.record), group=-100)
+            logger.info(f"Workload capture enabled: {recorder.path}")
+
+        # Register handlers
+        application.add_handler(CommandHandler("help", self.user_handler.help_command))
+        application.add_handler(CommandHandler("sessions", self.user_handler.show_sessions))
+        application.add_handler(CommandHandler("my", self.user_handler.my_registrations))
+        application.add_handler(CommandHandler("create_session", self.admin_handler.create_session))
+        application.add_handler(CommandHandler("toggle_bot", self.admin_handler.toggle_bot))
+        application.add_handler(CommandHandler("schedule", self.admin_handler.schedule))
+        application.add_handler(CommandHandler("slots", self.admin_handler.slots))
+        application.add_handler(CommandHandler("capacity", self.admin_handler.capacity))
+        application.add_handler(CommandHandler("stats", self.admin_handler.show_stats))
+        application.add_handler(CommandHandler("export", self.admin_handler.export))
+        application.add_handler(CommandHandler("stalls", self.admin_handler.show_stalls))
+        application.add_handler(CommandHandler("profile", self.admin_handler.profile))
+        application.add_handler(CommandHandler("netstats", self.admin_handler.show_netstats))
+        application.add_handler(CommandHandler("start", self.user_handler.start))
+        
+        # Button handlers
+        application.add_handler(CallbackQueryHandler(self.user_handler.button_handler))
+        
+        # Message handlers
+        application.add_handler(MessageHandler(
+            filters.TEXT & ~filters.COMMAND, 
+            self.user_handler.handle_message
+        ))
+
+        # The chat from TELEGRAM_CHAT_ID gets the default schedule and slots
+        default_chat_id = os.getenv('TELEGRAM_CHAT_ID')
+        if default_chat_id:
+            self.db.add_chat(
+                int(default_chat_id),
+                autopost_time=BotConfig.AUTOPOST_TIME,
+                slots=BotConfig.DEFAULT_CHAT_SLOTS
+            )
+
+        # Per-chat schedules live in the database, so check them every minute
+        job_queue = application.job_queue
+        job_queue.run_repeating(
+            self.leader_only(self.autopost),
+            interval=60,
+            first=60 - datetime.now().second
+        )
+        # Sessions for the coming days are created ahead of the autopost
+        job_queue.run_daily(
+            self.leader_only(self.pregenerate_sessions),
+            time=BotConfig.SCHEDULE['pregenerate_time']
+        )
+        job_queue.run_once(
+            self.leader_only(self.pregenerate_sessions),
+            when=BotConfig.SCHEDULE['first']
+        )
+        job_queue.run_repeating(
+            self.leader_only(self.check_integrity),
+            interval=BotConfig.INTEGRITY['interval'],
+            first=BotConfig.INTEGRITY['first']
+        )
+        job_queue.run_daily(
+            self.leader_only(self.maintain_database),
+            time=BotConfig.MAINTENANCE['time']
+        )
+        if BotConfig.BACKUP['enabled']:
+            job_queue.run_repeating(
+                self.leader_only(self.backup_database),
+                interval=BotConfig.BACKUP['interval'],
+                first=BotConfig.BACKUP['first']
+            )
+
+        return application
+
+    async def start_updates(self, application: Application,
+                            webhook: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Start receiving updates: webhook if configured, long polling otherwise
+
+        Returns:
+            str: 'webhook' or 'polling'
+        """
+        webhook = webhook or BotConfig.WEBHOOK
+        if webhook.get('url'):
+            url_path = webhook.get('path') or urlsplit(webhook['url']).path.strip('/')
             try:
-                # Create application
-                application = Application.builder().token(BotConfig.TOKEN).build()
-
-                # Add error handler
-                application.add_error_handler(error_handler)
-
-                # Register handlers
-                application.add_handler(CommandHandler("help", self.user_handler.help_command))
-                application.add_handler(CommandHandler("sessions", self.user_handler.show_sessions))
-                application.add_handler(CommandHandler("create_session", self.admin_handler.create_session))
-                application.add_handler(CommandHandler("toggle_bot", self.admin_handler.toggle_bot))
-                application.add_handler(CommandHandler("stats", self.admin_handler.show_stats))
-                application.add_handler(CommandHandler("start", self.user_handler.start))
-                
-                # Button handlers
-                application.add_handler(CallbackQueryHandler(self.user_handler.button_handler))
-                
-                # Message handlers
-                application.add_handler(MessageHandler(
-                    filters.TEXT & ~filters.COMMAND, 
-                    self.user_handler.handle_message
-                ))
-
-                # Setup daily posts schedule
-                job_queue = application.job_queue
-                job_queue.run_daily(
-                    self.create_daily_sessions,
-                    time=BotConfig.AUTOPOST_TIME,
-                    days=(0, 1, 2, 3, 4, 5, 6),  # All days of week
-                    data={'chat_id': os.getenv('TELEGRAM_CHAT_ID')}
+                await application.updater.start_webhook(
+                    listen=webhook['listen'],
+                    port=webhook['port'],
+                    url_path=url_path,
+                    webhook_url=webhook['url'],
+                    secret_token=webhook.get('secret_token') or secrets.token_urlsafe(32),
+                    max_connections=webhook['max_connections'],
+                    allowed_updates=Update.ALL_TYPES,
                 )
+                logger.info(f"Receiving updates via webhook {webhook['url']} "
+                            f"(listening on {webhook['listen']}:{webhook['port']}/{url_path})")
+                return 'webhook'
+            except (RuntimeError, OSError, TelegramError) as e:
+                # RuntimeError: tornado is not installed; OSError: port is busy
+                logger.error(f"Webhook mode unavailable, falling back to polling: {e}")
+
+        # start_polling deletes a webhook left from a previous run
+        await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+        logger.info("Receiving updates via long polling")
+        return 'polling'
+
+    async def drain(self, application: Application, timeout: Optional[float] = None) -> None:
+        """
+        Stop receiving updates and finish processing the queued ones.
+        Updates still queued after timeout are dropped.
+        """
+        timeout = BotConfig.UPDATES['drain_timeout'] if timeout is None else timeout
+        if application.updater and application.updater.running:
+            await application.updater.stop()
+
+        # A running /profile would hold Application.stop() until it finishes
+        profiler = application.bot_data.get('cpu_profiler')
+        if profiler:
+            profiler.stop()
+
+        queue = application.update_queue
+        if queue.qsize():
+            logger.info(f"Draining {queue.qsize()} queued updates (timeout {timeout} s)")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while queue.qsize() and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+
+        dropped = []
+        while not queue.empty():
+            update = queue.get_nowait()
+            queue.task_done()
+            dropped.append(getattr(update, 'update_id', None))
+        if dropped:
+            logger.warning(f"Dropped {len(dropped)} unprocessed updates on shutdown: {dropped}")
+
+        if application.running:
+            await application.stop()
+
+    async def serve(self, application: Application) -> None:
+        """Run until SIGINT/SIGTERM, then drain and shut down"""
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except NotImplementedError:
+                # Windows: KeyboardInterrupt stops asyncio.run instead
+                pass
+
+        await application.initialize()
+        try:
+            if application.post_init:
+                await application.post_init(application)
+            if self.leader and not BotConfig.WEBHOOK['url']:
+                # Only one process may call getUpdates, so followers wait for the lease
+                mode = 'polling on leader'
+                self.leader.on_elected = functools.partial(self.start_updates, application)
+                self.leader.on_demoted = application.updater.stop
+            else:
+                if self.leader and not BotConfig.WEBHOOK['secret_token']:
+                    logger.warning("WEBHOOK_SECRET is not set: every process registers its own "
+                                   "secret and rejects updates meant for the others")
+                mode = await self.start_updates(application)
+            await application.start()
+            if self.leader:
+                await self.leader.start()
+            logger.info(f"Bot started ({mode})")
+            await stop_event.wait()
+            logger.info("Stopping bot")
+        finally:
+            if self.leader:
+                # No polling restarts while draining; the lease is released afterwards
+                await self.leader.stop()
+            await self.drain(application)
+            if self.leader:
+                self.leader.release()
+            if application.post_stop:
+                await application.post_stop(application)
+            await application.shutdown()
+            if application.post_shutdown:
+                await application.post_shutdown(application)
+
+    def run(self):
+        """Run the bot"""
+        try:
+            application = self.build_application()
+            asyncio.run(self.serve(application))
+            
+        except Exception as e:
+            logger.error(f"Error starting bot: {e}")
+            raise
 
-                logger.info("Bot started")
-                application.run_polling()
-                
-            except Exception as e:
-                logger.error(f"Error starting bot: {e}")
-                raise
 if __name__ == '__main__':
     bot = VolleyballBot()
     bot.run()
\ No newline at end of file
@@ -0,0 +1,206 @@
+# utils/board.py
+
+import html
+import math
+import re
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+from database.models import Player, Registration, Session
+from utils.formatting import format_player_name, slot_number
+
+Roster = List[Tuple[Player, Registration]]
+
+_TAG = re.compile(r'<[^>]*>')
+
+
+def utf16_length(text: str) -> int:
+    """Длина в единицах UTF-16 (так Telegram считает лимит сообщения)"""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def visible_length(html_text: str) -> int:
+    """Длина текста сообщения после разбора HTML (без тегов и ссылок)"""
+    return utf16_length(html.unescape(_TAG.sub('', html_text)))
+
+
+class BoardRenderer:
+    """
+    Текст списка сессий даты (HTML) из закэшированных фрагментов.
+
+    Кэшируются строка каждого игрока (имя со ссылкой и записавшим) и блок
+    каждой сессии. Блок хранится вместе с подписью содержимого (номер, время,
+    лимит, строки игроков и резерва): при обновлении списка заново собираются
+    только блоки сессий, состав которых изменился, остальные берутся из кэша.
+
+    Большая дата раскладывается по нескольким сообщениям (layout): у каждой
+    сессии свой message_id в базе, и при изменении состава редактируется только
+    сообщение этой сессии. Если сообщение всё же не помещается в лимит, резерв
+    показывается не целиком ("… +N more").
+
+    Args:
+        date_format: формат даты в заголовке (FORMAT_SETTINGS)
+        time_format: формат времени сессии
+        max_sessions: сколько блоков сессий держать в кэше
+        max_entries: сколько строк игроков держать в кэше
+    """
+
+    def __init__(self, date_format: str, time_format: str,
+                 max_sessions: int = 512, max_entries: int = 8192):
+        self.date_format = date_format
+        self.time_format = time_format
+        self.max_sessions = max_sessions
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, str] = {}
+        self._sessions: 'OrderedDict[int, Tuple[Hashable, str]]' = OrderedDict()
+
+        self.sessions_rendered = 0
+        self.sessions_reused = 0
+
+    def render(self, day: date, sessions: Sequence[Session],
+               rosters: Dict[int, Tuple[Roster, Roster]], first_number: int = 1,
+               part: int = 1, parts: int = 1, limit: Optional[int] = None) -> str:
+        """
+        Сообщение с сессиями даты (всеми или одной части раскладки)
+
+        Args:
+            day: дата в заголовке
+            sessions: сессии в порядке показа
+            rosters: session_id -> (основной состав, резерв); нет ключа - пустая сессия
+            first_number: номер первой сессии (сквозная нумерация по частям)
+            part, parts: номер части и число частей (в заголовке, если частей больше одной)
+            limit: лимит длины сообщения после разбора HTML
+        """
+        header = self._header(day, part, parts)
+        text = self._stitch(header, sessions, rosters, first_number)
+        # Длина HTML не меньше видимой длины - разбор нужен только у длинных сообщений
+        if limit is None or utf16_length(text) <= limit or visible_length(text) <= limit:
+            return text
+
+        # Наибольшее число показанных игроков резерва, при котором сообщение помещается
+        fitted = None
+        low, high = 0, max(len(rosters.get(s.id, ([], []))[1]) for s in sessions) - 1
+        while low <= high:
+            shown = (low + high) // 2
+            candidate = self._stitch(header, sessions, rosters, first_number, shown)
+            if visible_length(candidate) <= limit:
+                fitted, low = candidate, shown + 1
+            else:
+                high = shown - 1
+        if fitted is None:
+            # Не помещается даже основной состав - обрезаются последние строки
+            lines = self._stitch(header, sessions, rosters, first_number, 0).split('\n')
+            while lines and visible_length('\n'.join(lines) + '\n…') > limit:
+                lines.pop()
+            fitted = '\n'.join(lines) + '\n…'
+        return fitted
+
+    def layout(self, day: date, sessions: Sequence[Session], limit: int,
+               entry_length: int, reserve_share: float) -> List[List[Session]]:
+        """
+        Раскладка сессий по сообщениям: по порядку, пока оценка сообщения с
+        полными составами помещается в limit
+
+        Args:
+            entry_length: оценка длины строки игрока, символов
+            reserve_share: оценка резерва, доля от max_players
+        """
+        header = visible_length(self._header(day, len(sessions), len(sessions)))
+        parts: List[List[Session]] = []
+        current: List[Session] = []
+        size = header
+        for number, session in enumerate(sessions, 1):
+            reserve = math.ceil(session.max_players * reserve_share)
+            estimate = (visible_length(self._block(number, session, [], []))
+                        + session.max_players * (entry_length + 1)
+                        + reserve * (entry_length + 2))
+            if current and size + estimate > limit:
+                parts.append(current)
+                current, size = [], header
+            current.append(session)
+            size += estimate
+        if current:
+            parts.append(current)
+        return parts
+
+    def session_block(self, number: int, session: Session, players: Roster,
+                      reserve: Roster, reserve_limit: Optional[int] = None) -> str:
+        """Блок сессии; собирается заново, только если изменилось содержимое"""
+        main_keys = tuple([(p.full_name, p.telegram_id, r.registered_by_id, r.registered_by_name)
+                           for p, r in players])
+        reserve_keys = tuple([(p.full_name, p.telegram_id, r.registered_by_id, r.registered_by_name)
+                              for p, r in reserve])
+        signature = (number, session.time_start, session.time_end, session.max_players,
+                     main_keys, reserve_keys, reserve_limit)
+
+        cached = self._sessions.get(session.id)
+        if cached is not None and cached[0] == signature:
+            self._sessions.move_to_end(session.id)
+            self.sessions_reused += 1
+            return cached[1]
+
+        main_entries = [self.entry(key, player, reg)
+                        for key, (player, reg) in zip(main_keys, players)]
+        shown = reserve if reserve_limit is None else reserve[:reserve_limit]
+        reserve_entries = [self.entry(key, player, reg)
+                           for key, (player, reg) in zip(reserve_keys, shown)]
+        block = self._block(number, session, main_entries, reserve_entries,
+                            len(reserve) - len(shown))
+
+        self._sessions[session.id] = (signature, block)
+        self._sessions.move_to_end(session.id)
+        if len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        self.sessions_rendered += 1
+        return block
+
+    def entry(self, key: Hashable, player: Player, registration: Registration) -> str:
+        """Строка игрока (format_player_name) из кэша; key - имя и ссылки из подписи блока"""
+        text = self._entries.get(key)
+        if text is None:
+            text = self._entries[key] = format_player_name(player, registration)
+            if len(self._entries) > self.max_entries:
+                # Вытесняется самая старая строка
+                del self._entries[next(iter(self._entries))]
+        return text
+
+    def forget(self, session_id: Optional[int] = None) -> None:
+        """Сбросить блок сессии (или весь кэш)"""
+        if session_id is None:
+            self._sessions.clear()
+            self._entries.clear()
+        else:
+            self._sessions.pop(session_id, None)
+
+    def _header(self, day: date, part: int, parts: int) -> str:
+        counter = f" ({part}/{parts})" if parts > 1 else ""
+        return f"<b>📅 Date:</b> {day.strftime(self.date_format)}{counter}\n\n"
+
+    def _stitch(self, header: str, sessions: Sequence[Session],
+                rosters: Dict[int, Tuple[Roster, Roster]], first_number: int,
+                reserve_limit: Optional[int] = None) -> str:
+        blocks = [header]
+        for number, session in enumerate(sessions, first_number):
+            players, reserve = rosters.get(session.id, ([], []))
+            blocks.append(self.session_block(number, session, players, reserve, reserve_limit))
+        return ''.join(blocks)
+
+    def _block(self, number: int, session: Session, main_entries: List[str],
+               reserve_entries: List[str], hidden: int = 0) -> str:
+        players_list = '\n'.join(
+            f"{slot_number(i + 1)} {main_entries[i]}" if i < len(main_entries) else slot_number(i + 1)
+            for i in range(session.max_players)
+        )
+        reserve_list = ', '.join(reserve_entries)
+        if hidden:
+            reserve_list = f"{reserve_list} … +{hidden} more" if reserve_list else f"… +{hidden} more"
+        return f"""<b>⏰ Session {number}:</b> <i>{session.time_start.strftime(self.time_format)} – {session.time_end.strftime(self.time_format)}</i>
+👥 Max players: {session.max_players}
+<b>Players:</b>  
+{players_list}
+
+<b>Reserve:</b>
+{reserve_list}
+
+"""
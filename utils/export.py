@@ -0,0 +1,83 @@
+# utils/export.py
+
+"""
+Выгрузка посещений для администраторов (/export) в CSV или CSV, сжатый gzip.
+
+Регистрации читаются из базы пачками по batch_size строк (Database.iter_attendance)
+и сразу пишутся во временный файл - память не зависит от объёма истории.
+Выгрузка целиком выполняется в одном рабочем потоке (asyncio.to_thread):
+соединение SQLite генератора нельзя передавать между потоками.
+"""
+
+import csv
+import gzip
+import io
+import os
+import tempfile
+from datetime import date
+from typing import Any, Dict, Iterable, List, Tuple
+
+from database.models import Player, Registration, Session
+
+ATTENDANCE_COLUMNS = ['date', 'time_start', 'time_end', 'session_id', 'player_id',
+                      'full_name', 'telegram_id', 'status', 'registration_time',
+                      'registered_by_id', 'registered_by_name']
+
+
+def attendance_record(session: Session, player: Player, registration: Registration) -> List[Any]:
+    """Строка CSV в порядке ATTENDANCE_COLUMNS"""
+    registered = registration.registration_time
+    return [
+        session.date.isoformat(),
+        session.time_start.strftime('%H:%M'),
+        session.time_end.strftime('%H:%M'),
+        session.id,
+        player.id,
+        player.full_name,
+        player.telegram_id or '',
+        registration.status.value,
+        registered.isoformat(sep=' ', timespec='seconds') if registered else '',
+        registration.registered_by_id or '',
+        registration.registered_by_name or '',
+    ]
+
+
+def write_attendance(batches: Iterable[List[Tuple[Session, Player, Registration]]], out) -> int:
+    """
+    Запись пачек регистраций в CSV по мере чтения
+
+    Returns:
+        int: сколько строк записано
+    """
+    writer = csv.writer(out)
+    writer.writerow(ATTENDANCE_COLUMNS)
+    count = 0
+    for batch in batches:
+        writer.writerows(attendance_record(*row) for row in batch)
+        count += len(batch)
+    return count
+
+
+def export_attendance(db, chat_id: int, start: date, end: date, compress: bool,
+                      settings: Dict[str, Any]) -> Tuple[str, int]:
+    """
+    Посещения чата с start по end во временный файл (настройки EXPORT).
+    Файл удаляет вызывающий - после отправки.
+
+    Returns:
+        (путь к файлу, сколько строк записано)
+    """
+    fd, path = tempfile.mkstemp(prefix=f"attendance-{chat_id}-",
+                                suffix='.csv.gz' if compress else '.csv',
+                                dir=settings['dir'])
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            binary = gzip.GzipFile(fileobj=raw, mode='wb',
+                                   compresslevel=settings['compress_level']) if compress else raw
+            # utf-8-sig: Excel открывает кириллицу без выбора кодировки
+            with io.TextIOWrapper(binary, encoding='utf-8-sig', newline='') as out:
+                rows = write_attendance(db.iter_attendance(chat_id, start, end, settings['batch_size']), out)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, rows
@@ -4,7 +4,21 @@ from typing import List, Tuple
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from database.models import Player, Registration, Session
 
-def create_remove_players_menu(sessions: List[Session]) -> InlineKeyboardMarkup:
+# Номера мест основного состава
+NUMBER_EMOJIS = ['1️⃣', '2️⃣', '3️⃣', '4️⃣', '5️⃣', '6️⃣', '7️⃣', '8️⃣', '9️⃣', '🔟']
+KEYCAP = '\ufe0f\u20e3'
+
+def slot_number(n: int) -> str:
+    """Номер места n (с 1): 1️⃣ ... 🔟, дальше цифрами-кнопками (1️⃣1️⃣)"""
+    if n <= len(NUMBER_EMOJIS):
+        return NUMBER_EMOJIS[n - 1]
+    return ''.join(digit + KEYCAP for digit in str(n))
+
+def wrap_buttons(buttons: List[InlineKeyboardButton], per_row: int) -> List[List[InlineKeyboardButton]]:
+    """Split buttons into keyboard rows of at most per_row buttons"""
+    return [buttons[i:i + per_row] for i in range(0, len(buttons), per_row)]
+
+def create_remove_players_menu(sessions: List[Session], per_row: int = 4) -> InlineKeyboardMarkup:
     """Create menu for selecting session to remove players from"""
     keyboard = []
     
@@ -18,7 +32,7 @@ def create_remove_players_menu(sessions: List[Session]) -> InlineKeyboardMarkup:
                 callback_data=f"select_session_{session.id}"
             )
         )
-    keyboard.append(session_row)
+    keyboard.extend(wrap_buttons(session_row, per_row))
     
     # Back button
     keyboard.append([
@@ -92,11 +106,11 @@ def create_session_players_menu(players: List[Tuple[Player, Registration]],
     
     return InlineKeyboardMarkup(keyboard)
 
-def create_session_buttons(sessions: List[Session]) -> InlineKeyboardMarkup:
+def create_session_buttons(sessions: List[Session], per_row: int = 4) -> InlineKeyboardMarkup:
     """Create keyboard with buttons for all sessions"""
     keyboard = []
     
-    # Join buttons for sessions in one row
+    # Join buttons for sessions, per_row in a row
     join_row = []
     for session in sessions:
         time_str = session.time_start.strftime('%H:%M')
@@ -106,7 +120,7 @@ def create_session_buttons(sessions: List[Session]) -> InlineKeyboardMarkup:
                 callback_data=f"join_self_{session.id}"
             )
         )
-    keyboard.append(join_row)
+    keyboard.extend(wrap_buttons(join_row, per_row))
     
     # Cancel and Groups in one row
     keyboard.append([
@@ -122,11 +136,11 @@ def create_session_buttons(sessions: List[Session]) -> InlineKeyboardMarkup:
     
     return InlineKeyboardMarkup(keyboard)
 
-def create_group_menu(sessions: List[Session]) -> InlineKeyboardMarkup:
+def create_group_menu(sessions: List[Session], per_row: int = 4) -> InlineKeyboardMarkup:
     """Create keyboard for group registration"""
     keyboard = []
     
-    # Group registration buttons in one row
+    # Group registration buttons, per_row in a row
     join_row = []
     for session in sessions:
         time_str = session.time_start.strftime('%H:%M')
@@ -136,7 +150,7 @@ def create_group_menu(sessions: List[Session]) -> InlineKeyboardMarkup:
                 callback_data=f"join_group_{session.id}"
             )
         )
-    keyboard.append(join_row)
+    keyboard.extend(wrap_buttons(join_row, per_row))
     
     # Cancel and Back in one row
     keyboard.append([
@@ -171,21 +185,19 @@ def format_player_name(player: Player, registration: Registration) -> str:
 
 def format_players_list(players: List[Tuple[Player, Registration]], max_players: int) -> str:
     """Format the main players list with numbers"""
-    number_emojis = ['1️⃣', '2️⃣', '3️⃣', '4️⃣', '5️⃣', '6️⃣', '7️⃣', '8️⃣', '9️⃣', '🔟']
     formatted_list = []
     
     # Convert list to dictionary for easier access
     players_dict = {idx: (player, reg) for idx, (player, reg) in enumerate(players)}
     
     for i in range(max_players):
-        if i < len(number_emojis):
-            if player_data := players_dict.get(i):
-                player, reg = player_data
-                name = format_player_name(player, reg)
-                formatted_list.append(f"{number_emojis[i]} {name}")
-            else:
-                # Для пустых мест просто номер
-                formatted_list.append(f"{number_emojis[i]}")
+        if player_data := players_dict.get(i):
+            player, reg = player_data
+            name = format_player_name(player, reg)
+            formatted_list.append(f"{slot_number(i + 1)} {name}")
+        else:
+            # Для пустых мест просто номер
+            formatted_list.append(slot_number(i + 1))
     
     return '\n'.join(formatted_list)
 
@@ -0,0 +1,177 @@
+# utils/http_transport.py
+
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Sequence
+
+import httpx
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger('kpg_malibu_bvb')
+
+
+def _percentile(values: Sequence[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+class PoolStats:
+    """
+    Статистика одного пула соединений: ожидание свободного соединения в пуле,
+    новые и переиспользованные (keep-alive) соединения, время до заголовков ответа.
+    Времена хранятся для последних window запросов.
+    """
+
+    def __init__(self, name: str, pool_size: int, keepalive: int,
+                 http_version: str, window: int = 1000):
+        self.name = name
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        self.http_version = http_version
+        self.window = window
+        self.reset()
+
+    def reset(self) -> None:
+        """Сброс накопленной статистики"""
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.failures = 0
+        self.pool_waits: Deque[float] = deque(maxlen=self.window)
+        self.connect_times: Deque[float] = deque(maxlen=self.window)
+        self.response_times: Deque[float] = deque(maxlen=self.window)
+
+    def as_dict(self) -> Dict[str, Any]:
+        used = self.new_connections + self.reused_connections
+        return {
+            'pool': self.name,
+            'pool_size': self.pool_size,
+            'keepalive': self.keepalive,
+            'http_version': self.http_version,
+            'requests': self.requests,
+            'new_connections': self.new_connections,
+            'reused_connections': self.reused_connections,
+            'reuse_ratio': round(self.reused_connections / used, 3) if used else 0.0,
+            'failures': self.failures,
+            'pool_wait_p50_ms': round(_percentile(self.pool_waits, 50) * 1000, 2),
+            'pool_wait_p99_ms': round(_percentile(self.pool_waits, 99) * 1000, 2),
+            'pool_wait_max_ms': round(max(self.pool_waits, default=0.0) * 1000, 2),
+            'connect_p50_ms': round(_percentile(self.connect_times, 50) * 1000, 2),
+            'response_p50_ms': round(_percentile(self.response_times, 50) * 1000, 2),
+            'response_p99_ms': round(_percentile(self.response_times, 99) * 1000, 2),
+        }
+
+    def summary(self) -> str:
+        """Текстовая сводка для админ-команды"""
+        s = self.as_dict()
+        return (
+            f"{self.name}: pool {self.pool_size}, keep-alive {self.keepalive}, "
+            f"HTTP/{self.http_version}\n"
+            f"  requests {s['requests']}, failures {s['failures']}, "
+            f"new connections {s['new_connections']}, reused {s['reuse_ratio'] * 100:.1f}%\n"
+            f"  pool wait p50 {s['pool_wait_p50_ms']} ms, p99 {s['pool_wait_p99_ms']} ms, "
+            f"max {s['pool_wait_max_ms']} ms\n"
+            f"  connect p50 {s['connect_p50_ms']} ms, "
+            f"response p50 {s['response_p50_ms']} ms, p99 {s['response_p99_ms']} ms"
+        )
+
+
+class _RequestTrace:
+    """
+    Обработчик trace-событий httpcore для одного запроса.
+
+    Время ожидания в пуле - от начала запроса до первого события соединения
+    (подключение нового или отправка заголовков по уже открытому).
+    """
+
+    def __init__(self, stats: PoolStats):
+        self.stats = stats
+        self.started = time.monotonic()
+        self.acquired: Optional[float] = None
+        self.connect_started: Optional[float] = None
+        self.new_connection = False
+
+    async def __call__(self, event_name: str, info: Dict[str, Any]) -> None:
+        now = time.monotonic()
+        if self.acquired is None and event_name.endswith(
+                ('connect_tcp.started', 'send_request_headers.started')):
+            self.acquired = now
+            self.stats.pool_waits.append(now - self.started)
+
+        if event_name == 'connection.connect_tcp.started':
+            self.new_connection = True
+            self.connect_started = now
+        elif event_name.endswith('send_request_headers.started') and self.connect_started:
+            self.stats.connect_times.append(now - self.connect_started)
+            self.connect_started = None
+        elif event_name.endswith('receive_response_headers.complete'):
+            if self.new_connection:
+                self.stats.new_connections += 1
+            else:
+                self.stats.reused_connections += 1
+            self.stats.response_times.append(now - (self.acquired or self.started))
+        elif event_name.endswith('.failed') and not event_name.endswith('response_closed.failed'):
+            self.stats.failures += 1
+
+
+class InstrumentedHTTPXRequest(HTTPXRequest):
+    """
+    HTTPXRequest с настраиваемым keep-alive и статистикой пула соединений.
+
+    Args:
+        name: имя пула в статистике (updates, outbound)
+        connection_pool_size: максимум одновременных соединений
+        keepalive_connections: сколько простаивающих соединений держать открытыми
+        keepalive_expiry: через сколько секунд простоя закрывать соединение
+        stats_window: по скольким последним запросам считать перцентили
+        остальные аргументы - как у HTTPXRequest
+    """
+
+    def __init__(self, name: str, connection_pool_size: int = 1,
+                 keepalive_connections: Optional[int] = None, keepalive_expiry: float = 5.0,
+                 stats_window: int = 1000, http_version: str = '1.1', **kwargs):
+        super().__init__(connection_pool_size=connection_pool_size,
+                         http_version=http_version, **kwargs)
+        keepalive = connection_pool_size if keepalive_connections is None else keepalive_connections
+        self.stats = PoolStats(name, connection_pool_size, keepalive, http_version, stats_window)
+
+        self._client_kwargs['limits'] = httpx.Limits(
+            max_connections=connection_pool_size,
+            max_keepalive_connections=keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._client_kwargs['event_hooks'] = {'request': [self._on_request]}
+        self._client = self._build_client()
+
+    async def _on_request(self, request: httpx.Request) -> None:
+        self.stats.requests += 1
+        request.extensions['trace'] = _RequestTrace(self.stats)
+
+
+def build_request(name: str, settings: Dict[str, Any],
+                  stats_window: int = 1000) -> InstrumentedHTTPXRequest:
+    """
+    Создание пула из настроек BotConfig.HTTP. Если HTTP/2 недоступен
+    (не установлен python-telegram-bot[http2]), используется HTTP/1.1.
+    """
+    kwargs = dict(
+        connection_pool_size=settings['pool_size'],
+        keepalive_connections=settings['keepalive'],
+        keepalive_expiry=settings['keepalive_expiry'],
+        connect_timeout=settings['connect_timeout'],
+        read_timeout=settings['read_timeout'],
+        write_timeout=settings['write_timeout'],
+        pool_timeout=settings['pool_timeout'],
+        stats_window=stats_window,
+    )
+    http_version = str(settings.get('http_version', '1.1'))
+    try:
+        return InstrumentedHTTPXRequest(name, http_version=http_version, **kwargs)
+    except RuntimeError as e:
+        if http_version == '1.1':
+            raise
+        logger.warning(f"HTTP/{http_version} unavailable for {name} pool, using HTTP/1.1: {e}")
+        return InstrumentedHTTPXRequest(name, http_version='1.1', **kwargs)
@@ -0,0 +1,109 @@
+# utils/leader.py
+
+import asyncio
+import logging
+import os
+import secrets
+import socket
+import time
+from typing import Awaitable, Callable, Optional
+
+
+class LeaderElection:
+    """
+    Выбор лидера среди процессов бота, работающих с одной базой.
+
+    Лидер держит аренду (таблица leases) и продлевает её каждые renew_interval
+    секунд. Если процесс лидера завис или упал, аренда истекает через ttl секунд
+    и её забирает другой процесс. Процесс считает себя лидером только до конца
+    своей аренды, даже если продлить её не удалось.
+    """
+
+    def __init__(self, db, name: str = 'scheduler', ttl: float = 30.0,
+                 renew_interval: float = 10.0, logger: Optional[logging.Logger] = None):
+        """
+        Args:
+            db: Database или ShardedDatabase
+            name: имя роли
+            ttl: срок аренды, секунды
+            renew_interval: период продления, секунды (меньше ttl)
+            logger: логгер
+        """
+        if renew_interval >= ttl:
+            raise ValueError(f"renew_interval ({renew_interval}) must be less than ttl ({ttl})")
+        self.db = db
+        self.name = name
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self.logger = logger or logging.getLogger('kpg_malibu_bvb')
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(3)}"
+
+        # Вызываются при получении и потере роли
+        self.on_elected: Optional[Callable[[], Awaitable[None]]] = None
+        self.on_demoted: Optional[Callable[[], Awaitable[None]]] = None
+
+        self._expires_at = 0.0
+        self._leader = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader and time.time() < self._expires_at
+
+    async def start(self) -> None:
+        """Первая попытка захвата роли и запуск продления (из работающего event loop)"""
+        await self._renew()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановка продления; роль остаётся за процессом до release() или конца аренды"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def release(self) -> None:
+        """Освобождение аренды, чтобы другой процесс сразу забрал роль"""
+        if self._leader:
+            self.db.release_lease(self.name, self.holder)
+            self._leader = False
+            self._expires_at = 0.0
+            self.logger.info(f"Released {self.name} lease ({self.holder})")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.renew_interval)
+            await self._renew()
+
+    async def _renew(self) -> None:
+        attempted_at = time.time()
+        try:
+            acquired = self.db.acquire_lease(self.name, self.holder, self.ttl)
+            if acquired:
+                # В базе срок отсчитан от чуть более позднего момента
+                self._expires_at = attempted_at + self.ttl
+        except Exception as e:
+            # Роль сохраняется до конца уже полученной аренды
+            self.logger.error(f"Failed to renew {self.name} lease: {e}")
+            acquired = self.is_leader
+
+        was_leader = self._leader
+        self._leader = acquired
+
+        if acquired and not was_leader:
+            self.logger.info(f"Acquired {self.name} lease ({self.holder})")
+            await self._notify(self.on_elected)
+        elif was_leader and not acquired:
+            self.logger.warning(f"Lost {self.name} lease ({self.holder})")
+            await self._notify(self.on_demoted)
+
+    async def _notify(self, callback: Optional[Callable[[], Awaitable[None]]]) -> None:
+        if callback is None:
+            return
+        try:
+            await callback()
+        except Exception as e:
+            self.logger.error(f"Error in {self.name} leadership callback: {e}", exc_info=True)
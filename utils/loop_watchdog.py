@@ -0,0 +1,252 @@
+# utils/loop_watchdog.py
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import FrameType
+from typing import List, Optional
+
+# Корень проекта: кадры из этих файлов считаются "нашим" кодом
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HANDLERS_DIR = os.path.join(PROJECT_ROOT, 'handlers')
+DATABASE_DIR = os.path.join(PROJECT_ROOT, 'database')
+
+
+def frame_name(frame: FrameType) -> str:
+    """Имя функции кадра вместе с классом: Database.get_session"""
+    code = frame.f_code
+    qualname = getattr(code, 'co_qualname', None)
+    if qualname:
+        return qualname
+    owner = frame.f_locals.get('self')
+    return f"{type(owner).__name__}.{code.co_name}" if owner is not None else code.co_name
+
+
+def frame_location(frame: FrameType) -> str:
+    """Путь к файлу (относительно проекта, если это наш код) и строка"""
+    filename = frame.f_code.co_filename
+    if filename.startswith(PROJECT_ROOT):
+        filename = os.path.relpath(filename, PROJECT_ROOT)
+    else:
+        filename = os.path.basename(filename)
+    return f"{filename}:{frame.f_lineno}"
+
+
+def is_project_frame(frame: FrameType) -> bool:
+    filename = frame.f_code.co_filename
+    return filename.startswith(PROJECT_ROOT) and f"{os.sep}site-packages{os.sep}" not in filename
+
+
+def walk_stack(frame: Optional[FrameType]) -> List[FrameType]:
+    """Кадры стека от внешнего к внутреннему"""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+@dataclass
+class Stall:
+    """Один эпизод блокировки event loop"""
+    started_at: datetime
+    duration: float
+    handler: Optional[str] = None
+    db_methods: List[str] = field(default_factory=list)
+    location: Optional[str] = None
+    stack: List[str] = field(default_factory=list)
+    samples: int = 1
+
+    def merge(self, other: 'Stall') -> None:
+        """Учесть ещё один снимок стека той же блокировки"""
+        self.samples += 1
+        self.handler = self.handler or other.handler
+        for method in other.db_methods:
+            if method not in self.db_methods:
+                self.db_methods.append(method)
+
+    def describe(self) -> str:
+        where = self.handler or 'unknown handler'
+        if self.db_methods:
+            where += f" -> {', '.join(self.db_methods)}"
+        return f"{self.duration * 1000:.0f} ms in {where} at {self.location or '?'}"
+
+
+def analyze_stack(frame: Optional[FrameType]) -> Stall:
+    """
+    Определение виновника блокировки по стеку потока event loop
+
+    Args:
+        frame: текущий кадр потока event loop
+
+    Returns:
+        Stall: заготовка с обработчиком, методом Database и местом блокировки
+    """
+    stall = Stall(started_at=datetime.now(), duration=0.0)
+    frames = walk_stack(frame)
+    if not frames:
+        return stall
+
+    for f in frames:
+        filename = f.f_code.co_filename
+        if filename.startswith(HANDLERS_DIR):
+            # Самый внутренний кадр обработчика - тот, что делал вызов
+            stall.handler = frame_name(f)
+        elif filename.startswith(DATABASE_DIR) and not stall.db_methods:
+            # Самый внешний кадр слоя БД - публичный метод Database
+            stall.db_methods.append(frame_name(f))
+
+    innermost = frames[-1]
+    stall.location = f"{frame_name(innermost)} ({frame_location(innermost)})"
+    stall.stack = [f"{frame_name(f)} ({frame_location(f)})" for f in frames
+                   if is_project_frame(f) or f is innermost]
+    return stall
+
+
+class LoopWatchdog:
+    """
+    Сторож event loop: измеряет задержку срабатывания таймеров и при блокировке
+    дольше порога снимает стек потока loop из отдельного потока, чтобы найти
+    обработчик и методы Database, которые заблокировали loop. Пока блокировка
+    продолжается, стек снимается повторно.
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05,
+                 keep_worst: int = 20, logger: Optional[logging.Logger] = None):
+        """
+        Args:
+            threshold: задержка loop, начиная с которой фиксируется блокировка, секунды
+            interval: период контрольного таймера, секунды
+            keep_worst: сколько самых долгих блокировок хранить
+            logger: логгер для сообщений о блокировках
+        """
+        self.threshold = threshold
+        self.interval = interval
+        self.keep_worst = keep_worst
+        self.logger = logger or logging.getLogger('kpg_malibu_bvb')
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._pending: Optional[Stall] = None
+        self._worst: List[tuple] = []
+        self._seq = itertools.count()
+        self.reset()
+
+    def reset(self) -> None:
+        """Сброс накопленной статистики"""
+        with self._lock:
+            self._worst = []
+            self.started_at = datetime.now()
+            self.beats = 0
+            self.stalls = 0
+            self.stalled_time = 0.0
+            self.max_lag = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Запуск (вызывать из работающего event loop)"""
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._monitor, name='loop-watchdog', daemon=True)
+        self._thread.start()
+        self.logger.info(f"Loop watchdog started (threshold {self.threshold * 1000:.0f} ms)")
+
+    async def stop(self) -> None:
+        """Остановка"""
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    async def _heartbeat(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._last_beat = time.monotonic()
+
+            with self._lock:
+                pending, self._pending = self._pending, None
+                self.beats += 1
+                self.max_lag = max(self.max_lag, lag)
+
+            if lag >= self.threshold:
+                self._record(pending or Stall(started_at=datetime.now(), duration=0.0), lag)
+
+    def _monitor(self) -> None:
+        # Проверяем чаще, чем срабатывает таймер, чтобы застать блокировку
+        while not self._stop.wait(self.interval / 2):
+            if time.monotonic() - self._last_beat < self.interval + self.threshold:
+                continue
+            sample = analyze_stack(sys._current_frames().get(self._loop_thread_id))
+            with self._lock:
+                if self._pending is None:
+                    self._pending = sample
+                else:
+                    self._pending.merge(sample)
+
+    def _record(self, stall: Stall, lag: float) -> None:
+        stall.duration = lag
+        with self._lock:
+            self.stalls += 1
+            self.stalled_time += lag
+            entry = (lag, next(self._seq), stall)
+            if len(self._worst) < self.keep_worst:
+                heapq.heappush(self._worst, entry)
+            else:
+                heapq.heappushpop(self._worst, entry)
+
+        self.logger.warning(f"Event loop blocked for {stall.describe()}")
+        if stall.stack:
+            self.logger.debug("Blocking stack:\n  " + "\n  ".join(stall.stack))
+
+    def worst(self, limit: Optional[int] = None) -> List[Stall]:
+        """Самые долгие блокировки по убыванию длительности"""
+        with self._lock:
+            entries = sorted(self._worst, reverse=True)
+        return [stall for _, _, stall in entries[:limit]]
+
+    def summary(self, limit: int = 5) -> str:
+        """Текстовая сводка для админ-команды"""
+        with self._lock:
+            beats, stalls = self.beats, self.stalls
+            stalled_time, max_lag = self.stalled_time, self.max_lag
+        lines = [
+            f"Loop watchdog since {self.started_at.strftime('%Y-%m-%d %H:%M:%S')}",
+            f"Threshold: {self.threshold * 1000:.0f} ms, checks: {beats}",
+            f"Stalls: {stalls}, blocked total: {stalled_time:.2f} s, max lag: {max_lag * 1000:.0f} ms",
+        ]
+        worst = self.worst(limit)
+        if worst:
+            lines.append("")
+            lines.append("Worst stalls:")
+            for i, stall in enumerate(worst, 1):
+                lines.append(f"{i}. {stall.started_at.strftime('%H:%M:%S')} {stall.describe()}")
+        return '\n'.join(lines)
@@ -0,0 +1,246 @@
+# utils/profiler.py
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.loop_watchdog import PROJECT_ROOT, frame_name, is_project_frame, walk_stack
+
+# Кадры ожидания событий: такие сэмплы считаются простоем, а не работой
+IDLE_FUNCTIONS = ('select', 'poll', 'epoll', 'kqueue', 'wait')
+IDLE_FILES = ('selectors.py', 'threading.py')
+
+
+def _short_filename(filename: str) -> str:
+    if filename.startswith(PROJECT_ROOT):
+        return os.path.relpath(filename, PROJECT_ROOT)
+    parts = filename.split(os.sep)
+    if 'site-packages' in parts:
+        return os.sep.join(parts[parts.index('site-packages') + 1:])
+    return os.path.basename(filename)
+
+
+def process_rss() -> Optional[int]:
+    """Resident set size процесса в байтах (Linux), None если недоступно"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class SamplingProfiler:
+    """
+    Сэмплирующий профилировщик: из отдельного потока с заданной частотой снимает
+    стеки потоков через sys._current_frames() и считает одинаковые стеки.
+    Накладные расходы не зависят от количества вызовов в профилируемом коде.
+    Результат пишется в формате collapsed stacks (flamegraph.pl, speedscope).
+    """
+
+    def __init__(self, interval: float = 0.01, thread_ids: Optional[Iterable[int]] = None):
+        """
+        Args:
+            interval: период сэмплирования, секунды
+            thread_ids: потоки для профилирования (None - все, кроме потока профилировщика)
+        """
+        self.interval = interval
+        self.thread_ids = set(thread_ids) if thread_ids else None
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[datetime] = None
+        self.duration = 0.0
+        self._labels: Dict[object, str] = {}
+        self._project_labels = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration: float) -> None:
+        """Запуск профилирования на duration секунд"""
+        self.stacks.clear()
+        self.samples = 0
+        self.started_at = datetime.now()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(duration,),
+                                        name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Досрочная остановка"""
+        self._stop.set()
+
+    def wait(self) -> None:
+        """Дождаться окончания профилирования"""
+        if self._thread:
+            self._thread.join()
+
+    def _label(self, frame) -> str:
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{frame_name(frame)} ({_short_filename(code.co_filename)})"
+            self._labels[code] = label
+            if is_project_frame(frame):
+                self._project_labels.add(label)
+        return label
+
+    def _run(self, duration: float) -> None:
+        own_id = threading.get_ident()
+        started = time.monotonic()
+        deadline = started + duration
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if self.thread_ids is not None and thread_id not in self.thread_ids:
+                    continue
+                self.stacks[tuple(self._label(f) for f in walk_stack(frame))] += 1
+                self.samples += 1
+        self.duration = time.monotonic() - started
+
+    @staticmethod
+    def _is_idle(stack: Tuple[str, ...]) -> bool:
+        if not stack:
+            return True
+        function, _, filename = stack[-1].rpartition(' (')
+        return function in IDLE_FUNCTIONS or filename.rstrip(')') in IDLE_FILES
+
+    def top(self, limit: int = 15) -> Tuple[List[Tuple[str, int]], List[Tuple[str, int]]]:
+        """
+        Функции с наибольшим числом собственных сэмплов и код проекта
+        с наибольшим числом суммарных сэмплов (простой не учитывается)
+        """
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        for stack, count in self.stacks.items():
+            if self._is_idle(stack):
+                continue
+            self_counts[stack[-1]] += count
+            for label in set(stack) & self._project_labels:
+                total_counts[label] += count
+        return self_counts.most_common(limit), total_counts.most_common(limit)
+
+    def summary(self, limit: int = 15) -> str:
+        """Текстовая сводка"""
+        busy = sum(count for stack, count in self.stacks.items() if not self._is_idle(stack))
+        top_self, top_total = self.top(limit)
+        lines = [
+            f"CPU profile: {self.samples} samples in {self.duration:.1f}s "
+            f"every {self.interval * 1000:.0f} ms",
+            f"Busy: {busy} samples ({busy * 100 / self.samples if self.samples else 0:.1f}%)",
+            "",
+            "Top self:",
+        ]
+        lines += [f"{count:>6} {count * 100 / busy:5.1f}%  {label}" for label, count in top_self]
+        lines += ["", "Top inclusive (project code):"]
+        lines += [f"{count:>6} {count * 100 / busy:5.1f}%  {label}" for label, count in top_total]
+        return '\n'.join(lines)
+
+    def write(self, output_dir: str, limit: int = 15) -> Tuple[str, str]:
+        """
+        Запись collapsed stacks и сводки
+
+        Returns:
+            Tuple[str, str]: пути к .folded и .txt файлам
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        stamp = (self.started_at or datetime.now()).strftime('%Y%m%d-%H%M%S')
+        folded_path = os.path.join(output_dir, f"profile-{stamp}.folded")
+        summary_path = os.path.join(output_dir, f"profile-{stamp}.txt")
+
+        with open(folded_path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(';'.join(label.replace(';', ',') for label in stack) + f" {count}\n")
+        with open(summary_path, 'w') as f:
+            f.write(self.summary(limit) + '\n')
+        return folded_path, summary_path
+
+
+class MemoryProfiler:
+    """
+    Снимки tracemalloc: топ мест выделения памяти и прирост между двумя снимками.
+    Пока трассировка включена, каждое выделение памяти дороже и требует памяти
+    на трассы, поэтому после замеров её нужно выключать.
+    """
+
+    def __init__(self, nframes: int = 10):
+        self.nframes = nframes
+        self.previous: Optional[tracemalloc.Snapshot] = None
+        self.previous_at: Optional[datetime] = None
+
+    @property
+    def running(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self) -> None:
+        """Включение трассировки и базовый снимок"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.nframes)
+        self.previous = self._snapshot()
+        self.previous_at = datetime.now()
+
+    def stop(self) -> None:
+        """Выключение трассировки"""
+        self.previous = None
+        self.previous_at = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ))
+
+    @staticmethod
+    def _site(stat) -> str:
+        frame = stat.traceback[0]
+        return f"{_short_filename(frame.filename)}:{frame.lineno}"
+
+    def snapshot(self, output_dir: str, limit: int = 15) -> Tuple[str, str]:
+        """
+        Новый снимок, сравнение с предыдущим и запись отчёта
+
+        Returns:
+            Tuple[str, str]: текст сводки и путь к файлу отчёта
+        """
+        snapshot = self._snapshot()
+        now = datetime.now()
+        current, peak = tracemalloc.get_traced_memory()
+        rss = process_rss()
+
+        lines = [f"Memory snapshot {now.strftime('%H:%M:%S')}: traced {current / 2**20:.1f} MiB "
+                 f"(peak {peak / 2**20:.1f} MiB)"]
+        if rss is not None:
+            lines[0] += f", RSS {rss / 2**20:.1f} MiB"
+        lines += ["", "Top allocation sites:"]
+        for stat in snapshot.statistics('lineno')[:limit]:
+            lines.append(f"{stat.size / 1024:>9.1f} KiB {stat.count:>7} blocks  {self._site(stat)}")
+
+        if self.previous is not None:
+            lines += ["", f"Growth since {self.previous_at.strftime('%H:%M:%S')}:"]
+            diff = [stat for stat in snapshot.compare_to(self.previous, 'lineno') if stat.size_diff]
+            for stat in diff[:limit]:
+                lines.append(f"{stat.size_diff / 1024:>+9.1f} KiB {stat.count_diff:>+7} blocks  "
+                             f"{self._site(stat)}")
+
+        self.previous = snapshot
+        self.previous_at = now
+
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"memory-{now.strftime('%Y%m%d-%H%M%S')}.txt")
+        text = '\n'.join(lines)
+        with open(path, 'w') as f:
+            f.write(text + '\n')
+        return text, path
@@ -0,0 +1,86 @@
+# utils/schedule.py
+
+import logging
+from datetime import date, time, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from config.config import BotConfig
+from database.models import ChatSlot
+
+Slot = Tuple[time, time, int]
+
+
+class ScheduleEngine:
+    """
+    Слоты сессий по датам и создание сессий заранее.
+
+    Слоты дня: шаблон дня недели (SCHEDULE['weekdays']), иначе слоты чата
+    (/slots), иначе DEFAULT_SESSIONS. Максимум игроков слота без своего
+    значения берётся из SCHEDULE['capacity'] по времени начала.
+
+    pregenerate создаёт сессии всех чатов на несколько дней вперёд одним
+    INSERT OR IGNORE в одной транзакции: повторный вызов (следующий день,
+    рестарт, второй процесс) только дополняет недостающие сессии. Заранее
+    созданные сессии, которые больше не совпадают со слотами (изменены /slots
+    или SCHEDULE), удаляются в той же транзакции, если они ещё не опубликованы
+    и на них никто не записан (Database.sync_sessions).
+
+    Args:
+        db: Database или ShardedDatabase
+        config: настройки (BotConfig)
+        logger: логгер
+    """
+
+    def __init__(self, db, config=BotConfig, logger: Optional[logging.Logger] = None):
+        self.db = db
+        self.config = config
+        self.logger = logger or logging.getLogger('kpg_malibu_bvb')
+
+    def capacity(self, time_start: time, slots: Iterable[Slot] = ()) -> int:
+        """Максимум игроков сессии, начинающейся в time_start"""
+        for start, _, max_players in slots:
+            if start == time_start:
+                return max_players
+        return self.config.SCHEDULE['capacity'].get(
+            time_start, self.config.SESSION_SETTINGS['default_max_players']
+        )
+
+    def slots_for(self, chat_id: int, day: date,
+                  chat_slots: Optional[List[ChatSlot]] = None) -> List[Slot]:
+        """
+        Слоты чата на дату (начало, конец, максимум игроков), по времени начала
+
+        Args:
+            chat_slots: уже прочитанные слоты чата (get_chat_slots)
+        """
+        template = self.config.SCHEDULE['weekdays'].get(day.weekday())
+        if template is None:
+            if chat_slots is None:
+                chat_slots = self.db.get_chat_slots(chat_id)
+            if chat_slots:
+                return [(slot.time_start, slot.time_end, slot.max_players) for slot in chat_slots]
+            template = self.config.DEFAULT_SESSIONS
+        return sorted((start, end, self.capacity(start)) for start, end in template)
+
+    def pregenerate(self, chat_ids: Iterable[int], first_day: date,
+                    days: Optional[int] = None) -> int:
+        """
+        Сессии чатов на days дней начиная с first_day по текущим слотам (одна транзакция)
+
+        Returns:
+            int: сколько сессий создано (уже существующие не считаются)
+        """
+        days = self.config.SCHEDULE['horizon_days'] if days is None else days
+        chat_ids = list(chat_ids)
+        rows = []
+        for chat_id in chat_ids:
+            chat_slots = self.db.get_chat_slots(chat_id)
+            for offset in range(days):
+                day = first_day + timedelta(days=offset)
+                rows.extend((chat_id, day, start, end, max_players)
+                            for start, end, max_players in self.slots_for(chat_id, day, chat_slots))
+        created, removed = self.db.sync_sessions(chat_ids, first_day,
+                                                 first_day + timedelta(days=days - 1), rows)
+        self.logger.info(f"Schedule {first_day} +{days} days: {created} of {len(rows)} sessions created, "
+                         f"{removed} outdated removed")
+        return created
@@ -0,0 +1,59 @@
+# utils/workload.py
+
+import json
+import logging
+import os
+import time
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+
+class WorkloadRecorder:
+    """
+    Запись входящих обновлений в компактный JSONL-файл для последующего
+    воспроизведения (python -m loadtest.replay).
+
+    Формат строки:
+        {"t": 1738339821.84, "k": "callback", "u": 5988856792, "n": "Alex", "c": -1001931349972, "d": "join_self_2"}
+    где k - callback, command или text, d - callback_data или текст сообщения.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: путь к файлу записи
+        """
+        log_dir = os.path.dirname(path)
+        if log_dir and not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+
+        self.path = path
+        self.logger = logging.getLogger('kpg_malibu_bvb.workload')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = logging.FileHandler(path)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+
+    async def record(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Записать обновление (TypeHandler, вызывается до основных обработчиков)"""
+        if update.callback_query:
+            kind, data = 'callback', update.callback_query.data
+        elif update.message and update.message.text:
+            text = update.message.text
+            kind, data = ('command' if text.startswith('/') else 'text'), text
+        else:
+            return
+
+        user = update.effective_user
+        chat = update.effective_chat
+        self.logger.info(json.dumps({
+            't': round(time.time(), 3),
+            'k': kind,
+            'u': user.id if user else None,
+            'n': user.full_name if user else None,
+            'c': chat.id if chat else None,
+            'd': data,
+        }, ensure_ascii=False, separators=(',', ':')))